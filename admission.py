@@ -0,0 +1,113 @@
+"""Contrôle d'admission des générations vers le backend
+
+Le token d'API est partagé par toutes les sessions : plutôt que de subir les
+429 du fournisseur, le processus façonne lui-même son trafic. Un seau à jetons
+dimensionné sur le quota fixe le débit, et une file FIFO sert les demandes
+dans l'ordre d'arrivée. Une demande qui ne peut pas être admise avant sa
+date limite est refusée tout de suite, pour passer en mode hors-ligne.
+"""
+import threading
+import time
+from collections import deque
+
+
+class TokenBucket:
+    """Seau à jetons : rate jetons par seconde, au plus capacity en réserve"""
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.clock = clock
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self):
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def delay(self, position=0):
+        """Délai avant que le jeton du rang `position` de la file soit disponible"""
+        self._refill()
+        missing = position + 1 - self.tokens
+        return max(0.0, missing / self.rate)
+
+
+class Ticket:
+    """Place d'une demande dans la file d'admission"""
+
+    __slots__ = ("admitted",)
+
+    def __init__(self):
+        self.admitted = False
+
+
+class AdmissionController:
+    """File FIFO d'accès au backend, au débit d'un seau à jetons"""
+
+    def __init__(self, rate_per_minute=30.0, burst=5, max_wait=20.0, poll_interval=0.5):
+        self.bucket = TokenBucket(rate_per_minute / 60.0, burst)
+        self.max_wait = max_wait
+        self.poll_interval = poll_interval
+        self._queue = deque()
+        self._condition = threading.Condition()
+
+    def __len__(self):
+        return len(self._queue)
+
+    def enqueue(self):
+        ticket = Ticket()
+        with self._condition:
+            self._queue.append(ticket)
+        return ticket
+
+    def wait(self, ticket, timeout=None, on_update=None):
+        """Attend l'admission du ticket ; False si elle est impossible avant la date limite
+
+        on_update(position, estimated_wait) est appelé dans le thread appelant à
+        chaque changement, position comptée à partir de 1.
+        """
+        deadline = time.monotonic() + (self.max_wait if timeout is None else timeout)
+        shown = None
+        try:
+            while True:
+                with self._condition:
+                    # Seule la tête de file peut prendre un jeton : l'ordre d'arrivée est respecté
+                    if self._queue[0] is ticket and self.bucket.try_take():
+                        self._queue.popleft()
+                        ticket.admitted = True
+                        self._condition.notify_all()
+                        return True
+                    position = self._queue.index(ticket)
+                    estimate = self.bucket.delay(position)
+                    remaining = deadline - time.monotonic()
+
+                # Attente estimée au-delà de la date limite : inutile de patienter
+                if estimate > remaining:
+                    return False
+
+                if on_update is not None and (position, round(estimate)) != shown:
+                    shown = (position, round(estimate))
+                    on_update(position + 1, estimate)
+
+                with self._condition:
+                    step = min(estimate, self.poll_interval) if position == 0 else self.poll_interval
+                    self._condition.wait(max(0.01, min(step, remaining)))
+        finally:
+            # Demande refusée ou session interrompue : la place est libérée pour les suivants
+            if not ticket.admitted:
+                with self._condition:
+                    if ticket in self._queue:
+                        self._queue.remove(ticket)
+                    self._condition.notify_all()
+
+    def admit(self, timeout=None, on_update=None):
+        """Prend une place dans la file et attend son tour"""
+        return self.wait(self.enqueue(), timeout, on_update)
@@ -1,12 +1,43 @@
 import streamlit as st
-import requests
-import json
+import functools
+import io
+import logging
+import os
 import re
-from wordcloud import WordCloud
-import matplotlib.pyplot as plt
-from collections import Counter
-import pandas as pd
+import tempfile
 import time
+import uuid
+from datetime import datetime, timedelta
+from admission import AdmissionController
+from corpus_index import CorpusIndex, bin_labels, bucket_labels
+from backends import create_backend
+import offline_engine
+from single_flight import SingleFlight
+from warm_pool import WarmPool
+from story_cache import StoryCache, make_cache_key
+from story_export import FORMATS, export_rows, store_rows
+from story_record import StoryRecord
+from story_store import StoryStore
+from thinking import ThinkingStreamFilter, clean_thinking_tokens
+from retry_policy import CircuitBreaker, RetryPolicy
+from rendering import render_wordcloud_png
+from metrics import REGISTRY, STAGES
+from generation import (
+    EPOCHS,
+    GenerationBudget,
+    GenerationResult,
+    analyze_text,
+    generate_fallback_story,
+    generate_prompt,
+    generate_story,
+    stream_story_chunks,
+)
+
+logging.basicConfig(
+    level=os.environ.get("LOG_LEVEL", "INFO"),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+)
+logger = logging.getLogger("app")
 
 st.set_page_config(
     page_title="Générateur de Récits Parallèles",
@@ -17,337 +48,748 @@ st.set_page_config(
 st.title("📚 Générateur de Récits Parallèles")
 st.markdown("*Des récits alternatifs qui émergent d'une réalité statistique construite sur les vestiges de notre passé collectif.*")
 
-# Configuration des époques historiques
-EPOCHS = {
-    "Renaissance (1400-1600)": {
-        "description": "Époque de renouveau artistique et scientifique en Europe",
-        "keywords": ["art", "science", "humanisme", "exploration", "inventions"],
-        "context": "À la Renaissance, l'Europe connaît un renouveau artistique, scientifique et culturel. Les grandes découvertes transforment la vision du monde."
-    },
-    "Révolution française (1789-1799)": {
-        "description": "Période de bouleversements politiques et sociaux en France",
-        "keywords": ["révolution", "liberté", "égalité", "fraternité", "république"],
-        "context": "La Révolution française marque la fin de l'Ancien Régime et l'émergence de nouveaux idéaux démocratiques."
-    },
-    "Révolution industrielle (1760-1840)": {
-        "description": "Transformation économique et sociale par la mécanisation",
-        "keywords": ["industrie", "machines", "vapeur", "usines", "urbanisation"],
-        "context": "La révolution industrielle transforme radicalement les modes de production et la société européenne."
-    },
-    "Belle Époque (1871-1914)": {
-        "description": "Période de prospérité et d'innovations en Europe",
-        "keywords": ["progrès", "innovations", "électricité", "automobile", "cinéma"],
-        "context": "La Belle Époque est marquée par l'optimisme, les innovations techniques et l'épanouissement culturel."
-    },
-    "Années folles (1920-1929)": {
-        "description": "Décennie d'euphorie et de modernité après la Grande Guerre",
-        "keywords": ["jazz", "modernité", "libération", "économie", "arts"],
-        "context": "Les Années folles sont une période d'effervescence culturelle et de prospérité économique."
-    }
+# Valeurs par défaut des curseurs, aussi utilisées pour amorcer la pré-génération
+DEFAULT_TECH_LEVEL = 30
+DEFAULT_SOCIAL_CHANGE = 40
+DEFAULT_FANTASY_ELEMENTS = 20
+STORY_LENGTHS = ["Court (100-200 mots)", "Moyen (300-500 mots)", "Long (600-800 mots)"]
+
+def timed_fragment(stage):
+    """Fragment Streamlit dont chaque exécution est chronométrée dans l'étape `stage`"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def run():
+            with REGISTRY.timer(stage):
+                fn()
+        return st.fragment(run)
+    return decorate
+
+# Paramètres de génération : fragment, un réglage ne réexécute que la barre latérale
+@timed_fragment("ui_sidebar")
+def generation_parameters():
+    st.header("⚙️ Paramètres de génération")
+
+    # Sélection de l'époque
+    selected_epoch = st.selectbox(
+        "Choisissez une époque historique :",
+        list(EPOCHS.keys()),
+        key="selected_epoch"
+    )
+
+    st.markdown(f"**Description :** {EPOCHS[selected_epoch]['description']}")
+
+    # Paramètres de divergence
+    st.subheader("🔀 Paramètres de divergence")
+
+    st.slider(
+        "Niveau technologique alternatif",
+        min_value=0,
+        max_value=100,
+        value=DEFAULT_TECH_LEVEL,
+        help="0 = technologies de l'époque, 100 = technologies très avancées",
+        key="tech_level"
+    )
+
+    st.slider(
+        "Changements sociaux/politiques",
+        min_value=0,
+        max_value=100,
+        value=DEFAULT_SOCIAL_CHANGE,
+        help="0 = société identique, 100 = société radicalement différente",
+        key="social_change"
+    )
+
+    st.slider(
+        "Éléments fantastiques subtils",
+        min_value=0,
+        max_value=100,
+        value=DEFAULT_FANTASY_ELEMENTS,
+        help="0 = réalisme pur, 100 = éléments magiques/fantastiques",
+        key="fantasy_elements"
+    )
+
+    st.selectbox(
+        "Longueur du récit :",
+        STORY_LENGTHS,
+        key="story_length"
+    )
+
+    # Mode d'affichage de la génération
+    st.checkbox(
+        "⚡ Affichage progressif",
+        value=True,
+        help="Affiche le récit au fur et à mesure de sa génération",
+        key="streaming_enabled"
+    )
+
+with st.sidebar:
+    generation_parameters()
+
+    # Panneau de métriques (latences par étape, taux de fallback, reprises)
+    if st.secrets.get("METRICS_DEBUG_PANEL", False):
+        with st.expander("📈 Métriques de performance"):
+            snapshot = REGISTRY.snapshot()
+            rows = [
+                {
+                    "Étape": STAGES.get(name, name),
+                    "Appels": histogram["count"],
+                    "Moyenne (s)": round(histogram["sum"] / histogram["count"], 3),
+                    "p95 (s) ≤": histogram["p95"],
+                }
+                for name, histogram in snapshot["histograms"].items() if histogram["count"]
+            ]
+            if rows:
+                st.dataframe(rows, hide_index=True)
+            st.write(f"**Taux de fallback :** {REGISTRY.fallback_rate():.0%}")
+            for counter in snapshot["counters"]:
+                labels = ", ".join(f"{k}={v}" for k, v in counter["labels"].items())
+                st.caption(f"{counter['name']}{f' ({labels})' if labels else ''} : {counter['value']}")
+            st.download_button("Exporter (Prometheus)", REGISTRY.to_prometheus(), file_name="metrics.prom",
+                               on_click="ignore")
+
+# Réglages courants, lus lors d'une exécution complète de la page (clic sur "Générer")
+selected_epoch = st.session_state.selected_epoch
+tech_level = st.session_state.tech_level
+social_change = st.session_state.social_change
+fantasy_elements = st.session_state.fantasy_elements
+story_length = st.session_state.story_length
+streaming_enabled = st.session_state.streaming_enabled
+
+# Fonction pour exporter les métriques vers le fichier configuré
+def export_metrics():
+    path = st.secrets.get("METRICS_EXPORT_PATH", "")
+    if not path:
+        return
+    try:
+        REGISTRY.write(path)
+    except OSError as e:
+        logger.warning(f"⚠️ Échec export des métriques: {str(e)}")
+
+# Backend de génération : un client par processus, partagé par toutes les sessions
+@st.cache_resource
+def get_backend():
+    return create_backend(
+        st.secrets.get("GENERATION_BACKEND", "hf"),
+        api_token=st.secrets.get("HUGGINGFACE_API_TOKEN", ""),
+        model=st.secrets.get("GENERATION_MODEL", ""),
+        base_url=st.secrets.get("GENERATION_BASE_URL", ""),
+        timeout=st.secrets.get("GENERATION_TIMEOUT", 60.0),
+        max_concurrency=st.secrets.get("GENERATION_MAX_CONCURRENCY", 4)
+    )
+
+# Cache de récits partagé entre sessions et processus
+@st.cache_resource
+def get_story_cache():
+    return StoryCache(
+        st.secrets.get("STORY_CACHE_PATH", "recits/cache.sqlite3"),
+        max_stories_per_key=int(st.secrets.get("STORY_CACHE_POOL_SIZE", 5)),
+        max_keys=int(st.secrets.get("STORY_CACHE_MAX_KEYS", 2000)),
+        ttl_seconds=int(st.secrets.get("STORY_CACHE_TTL_SECONDS", 7 * 24 * 3600)),
+        policy=st.secrets.get("STORY_CACHE_POLICY", "fill")
+    )
+
+# Historique durable des récits, partagé entre sessions et processus
+@st.cache_resource
+def get_story_store():
+    return StoryStore(st.secrets.get("STORY_STORE_PATH", "recits/stories.sqlite3"))
+
+# Index du corpus, dans la base de l'historique
+@st.cache_resource
+def get_corpus_index():
+    return CorpusIndex(get_story_store().path)
+
+# Récits indexés au plus lors d'un enregistrement : un historique pas encore indexé
+# l'est à l'ouverture du panneau d'analyse du corpus ou par corpus_index.py
+CORPUS_SYNC_ON_SAVE = 20
+
+# Nombre de lignes par page d'historique
+HISTORY_PAGE_SIZE = 20
+
+# Tris proposés dans l'historique : libellé -> ordre de StoryStore.summaries
+HISTORY_ORDERS = {
+    "Plus récents": "recent",
+    "Plus anciens": "oldest",
+    "Divergence décroissante": "divergence_desc",
+    "Divergence croissante": "divergence_asc",
+    "Technologie": "tech",
+    "Société": "social",
+    "Fantastique": "fantasy",
 }
 
-# Sidebar pour les paramètres
-st.sidebar.header("⚙️ Paramètres de génération")
-
-# Sélection de l'époque
-selected_epoch = st.sidebar.selectbox(
-    "Choisissez une époque historique :",
-    list(EPOCHS.keys())
-)
-
-st.sidebar.markdown(f"**Description :** {EPOCHS[selected_epoch]['description']}")
-
-# Paramètres de divergence
-st.sidebar.subheader("🔀 Paramètres de divergence")
-
-tech_level = st.sidebar.slider(
-    "Niveau technologique alternatif",
-    min_value=0,
-    max_value=100,
-    value=30,
-    help="0 = technologies de l'époque, 100 = technologies très avancées"
-)
-
-social_change = st.sidebar.slider(
-    "Changements sociaux/politiques",
-    min_value=0,
-    max_value=100,
-    value=40,
-    help="0 = société identique, 100 = société radicalement différente"
-)
-
-fantasy_elements = st.sidebar.slider(
-    "Éléments fantastiques subtils",
-    min_value=0,
-    max_value=100,
-    value=20,
-    help="0 = réalisme pur, 100 = éléments magiques/fantastiques"
-)
-
-story_length = st.sidebar.selectbox(
-    "Longueur du récit :",
-    ["Court (100-200 mots)", "Moyen (300-500 mots)", "Long (600-800 mots)"]
-)
-
-# Configuration Hugging Face
-HF_MODEL = "HuggingFaceTB/SmolLM3-3B"
-
-# Fonction pour nettoyer les thinking tokens
-def clean_thinking_tokens(text):
-    """Extrait le contenu narratif français des thinking tokens"""
-    import re
-    if not text:
-        return text
-
-    # Chercher du contenu narratif français dans toutes les balises <think>
-    story_parts = []
-
-    # Extraire tout le contenu des balises <think>...</think>
-    think_matches = re.findall(r'<think>(.*?)</think>', text, flags=re.DOTALL)
-
-    # Si pas de balises fermées, chercher une balise ouverte
-    if not think_matches:
-        think_match = re.search(r'<think>(.*)', text, flags=re.DOTALL)
-        if think_match:
-            think_matches = [think_match.group(1)]
-
-    # Analyser chaque bloc de thinking pour extraire UNIQUEMENT les parties narratives françaises
-    for think_content in think_matches:
-        lines = think_content.split('\n')
-        french_started = False
-
-        for line in lines:
-            line = line.strip()
-
-            # Détecter le début du récit français (souvent après des analyses en anglais)
-            if not french_started:
-                # Chercher des phrases qui commencent clairement du français
-                if (len(line) > 20 and
-                    (line.startswith('À ') or line.startswith('En ') or line.startswith('Dans ') or
-                     line.startswith('Le ') or line.startswith('La ') or line.startswith('Les ') or
-                     line.startswith('Un ') or line.startswith('Une ')) and
-                    not any(eng in line.lower() for eng in ['in florence', 'check the word', 'technical aspect', 'that seems', 'need to make'])):
-                    french_started = True
-                    story_parts.append(line)
-                continue
-
-            # Une fois le français commencé, continuer tant qu'on est en français
-            if french_started:
-                # Arrêter si on retombe sur de l'anglais d'analyse
-                if any(phrase in line.lower() for phrase in ['check the word', 'word count', 'technical aspect', 'that seems', 'need to make', 'fits the time']):
-                    break
-
-                # Continuer si c'est du français narratif
-                if (len(line) > 10 and
-                    any(word in line.lower() for word in ['dans', 'était', 'sur', 'avec', 'pour', 'une', 'le', 'la', 'les', 'des', 'du', 'de', 'mais', 'alors']) and
-                    not any(phrase in line.lower() for phrase in ['i need', 'i should', 'let me', 'maybe', 'perhaps', 'i think', 'okay'])):
-                    story_parts.append(line)
-                elif line == '':  # Ligne vide acceptable
-                    story_parts.append('')
-
-    # Aussi chercher du contenu français en dehors des balises
-    outside_think = re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL)
-    outside_think = re.sub(r'<think>.*', '', outside_think, flags=re.DOTALL)
-
-    lines = outside_think.split('\n')
-    for line in lines:
-        line = line.strip()
-        if (len(line) > 30 and
-            any(word in line.lower() for word in ['dans', 'était', 'sur', 'avec', 'pour', 'une', 'le', 'la', 'les', 'des', 'du', 'de']) and
-            not any(phrase in line.lower() for phrase in ['i need', 'i should', 'let me', 'maybe', 'perhaps', 'i think', 'okay'])):
-            story_parts.append(line)
-
-    # Assembler le récit
-    if story_parts:
-        cleaned = '\n\n'.join(story_parts)
-        # Nettoyer les espaces multiples
-        cleaned = re.sub(r'  +', ' ', cleaned)
-        return cleaned.strip()
-
-    # Si rien trouvé, fallback sur l'ancien algorithme
-    cleaned = re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL)
-    cleaned = re.sub(r'<think>.*', '', cleaned, flags=re.DOTALL)
-    return cleaned.strip()
-
-# Fonction pour appeler l'API Hugging Face
-def call_huggingface_api(prompt, max_retries=3):
-    print(f"🔍 DEBUG: Début call_huggingface_api avec prompt: {prompt[:100]}...")
-
-    # Utilisation du token depuis les secrets Streamlit
-    api_token = st.secrets.get("HUGGINGFACE_API_TOKEN", "")
-    print(f"🔍 DEBUG: Token trouvé: {bool(api_token)} (longueur: {len(api_token) if api_token else 0})")
-
-    if not api_token:
-        print("❌ DEBUG: Pas de token trouvé")
-        st.error("Token Hugging Face manquant. Veuillez configurer HUGGINGFACE_API_TOKEN dans les secrets.")
+# Politique de reprise et disjoncteur partagés par toutes les sessions du processus
+@st.cache_resource
+def get_retry_policy():
+    return RetryPolicy(
+        max_retries=int(st.secrets.get("API_MAX_RETRIES", 3)),
+        base_delay=float(st.secrets.get("API_RETRY_BASE_DELAY", 1.0)),
+        max_delay=float(st.secrets.get("API_RETRY_MAX_DELAY", 8.0)),
+        max_total_wait=float(st.secrets.get("API_RETRY_MAX_TOTAL_WAIT", 15.0))
+    )
+
+@st.cache_resource
+def get_circuit_breaker():
+    return CircuitBreaker(
+        failure_threshold=int(st.secrets.get("API_BREAKER_FAILURES", 3)),
+        recovery_timeout=float(st.secrets.get("API_BREAKER_RECOVERY_SECONDS", 30.0))
+    )
+
+# File d'admission vers le backend, au débit du quota du token partagé
+@st.cache_resource
+def get_admission_controller():
+    rate_per_minute = float(st.secrets.get("ADMISSION_RATE_PER_MINUTE", 30))
+    if rate_per_minute <= 0:
         return None
-
+    return AdmissionController(
+        rate_per_minute=rate_per_minute,
+        burst=int(st.secrets.get("ADMISSION_BURST", 5)),
+        max_wait=float(st.secrets.get("ADMISSION_MAX_WAIT", 20.0))
+    )
+
+# Générations identiques en cours, partagées entre les sessions
+@st.cache_resource
+def get_single_flight():
+    return SingleFlight()
+
+# Réserve de récits pré-générés pour les réglages les plus demandés
+@st.cache_resource
+def get_warm_pool():
+    budget_per_hour = float(st.secrets.get("PREGEN_BUDGET_PER_HOUR", 60))
+    backend = get_backend()
+    if budget_per_hour <= 0 or backend.unavailable_reason():
+        return None
+    retry_policy, breaker, controller = get_retry_policy(), get_circuit_breaker(), get_admission_controller()
+
+    def admit_idle():
+        # Les demandes des utilisateurs passent d'abord : file vide et jeton libre uniquement
+        return controller is None or (not len(controller) and controller.admit(timeout=0))
+
+    def pregenerate(key):
+        prompt, story_length = key
+        if not admit_idle():
+            return None
+        # Reprises soumises à la même règle que le premier appel
+        result = generate_story(prompt, backend, retry_policy, breaker, budget=generation_budget(story_length),
+                                admit=admit_idle)
+        if result is None or result.is_fallback:
+            return None
+        return result.story
+
+    seed_keys = [
+        (generate_prompt(epoch, DEFAULT_TECH_LEVEL, DEFAULT_SOCIAL_CHANGE, DEFAULT_FANTASY_ELEMENTS, STORY_LENGTHS[0]),
+         STORY_LENGTHS[0])
+        for epoch in EPOCHS
+    ]
+    return WarmPool(
+        pregenerate,
+        stories_per_key=int(st.secrets.get("PREGEN_STORIES_PER_KEY", 2)),
+        max_keys=int(st.secrets.get("PREGEN_MAX_KEYS", 8)),
+        budget_per_hour=budget_per_hour,
+        max_age=float(st.secrets.get("PREGEN_MAX_AGE_SECONDS", 24 * 3600)),
+        seed_keys=seed_keys
+    ).start()
+
+# Moteur du mode hors-ligne : modèle chargé une seule fois par processus
+@st.cache_resource
+def get_offline_engine():
+    return offline_engine.configure(st.secrets.get("OFFLINE_MODEL_PATH") or None)
+
+# Fonction pour calculer le budget de génération d'une longueur de récit
+def generation_budget(story_length):
+    return GenerationBudget(story_length, reasoning=bool(st.secrets.get("MODEL_REASONING", False)))
+
+# Fonction pour calculer la clé de cache d'un prompt
+def story_cache_key(prompt, budget):
+    # Paramètres effectivement envoyés (max_tokens selon la longueur) et mode de réflexion
+    return make_cache_key(prompt, get_backend().label, dict(budget.params(), reasoning=budget.reasoning))
+
+# Fonction pour enregistrer un récit généré dans le cache
+def store_in_cache(prompt, budget, story):
     try:
-        # Import Hugging Face InferenceClient
-        from huggingface_hub import InferenceClient
-
-        # Création du client Hugging Face
-        client = InferenceClient(
-            provider="hf-inference",
-            api_key=api_token,
-        )
-        print(f"🔍 DEBUG: Client Hugging Face configuré avec provider hf-inference")
-
-        for attempt in range(max_retries):
+        get_story_cache().put(story_cache_key(prompt, budget), story)
+    except Exception as e:
+        logger.warning(f"⚠️ Échec écriture cache: {str(e)}")
+
+# Fonction pour attendre son tour avant d'appeler le backend
+def wait_for_admission(status_slot):
+    """Affiche la position dans la file ; False si le tour ne viendra pas avant la date limite"""
+    controller = get_admission_controller()
+    if controller is None:
+        return True
+
+    def show_position(position, estimated_wait):
+        status_slot.info(f"⏳ Position dans la file d'attente : {position} — attente estimée {estimated_wait:.0f}s")
+
+    with REGISTRY.timer("admission_wait"):
+        admitted = controller.admit(on_update=show_position)
+    status_slot.empty()
+    if not admitted:
+        REGISTRY.inc("admission_rejected_total")
+    return admitted
+
+# Fonction pour afficher les messages de l'API dans l'interface
+def notify_streamlit(level, message):
+    if level == "error":
+        st.error(message)
+    else:
+        st.warning(message)
+
+# Fonction pour appeler le backend de génération
+def call_generation_backend(prompt, budget):
+    """Appel partagé avec les sessions qui demandent le même prompt au même moment"""
+    # Ressources résolues ici : l'appel s'exécute hors du thread de la session
+    backend, retry_policy, breaker = get_backend(), get_retry_policy(), get_circuit_breaker()
+    story_cache, key = get_story_cache(), story_cache_key(prompt, budget)
+    # Reprises admises comme de nouvelles demandes, sans attendre au-delà d'un délai de reprise
+    controller = get_admission_controller()
+    admit = functools.partial(controller.admit, timeout=retry_policy.max_delay) if controller else None
+
+    def generate(notify):
+        result = generate_story(prompt, backend, retry_policy, breaker, notify=notify, budget=budget, admit=admit)
+        if result is not None and not result.is_fallback:
             try:
-                print(f"🔍 DEBUG: Tentative {attempt + 1}/{max_retries} avec le modèle {HF_MODEL}")
-
-                # Appel à l'API avec le client Hugging Face (non-streaming)
-                # Utiliser un exemple pour "apprendre" au modèle à répondre correctement
-                completion = client.chat.completions.create(
-                    model=HF_MODEL,
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": "Écris une courte histoire de 50 mots sur la Renaissance."
-                        },
-                        {
-                            "role": "assistant",
-                            "content": "<think>\nJe dois écrire une histoire courte sur la Renaissance. Je vais me concentrer sur un artiste à Florence.\n</think>\n\nEn cette année 1503 à Florence, Lorenzo observait son maître Leonardo peindre. Les pinceaux dansaient sur la toile, capturant la lumière comme jamais auparavant. \"L'art révèle la vérité\", murmura le maître. Lorenzo comprit alors que cette époque de renouveau transformait non seulement l'art, mais l'âme humaine elle-même."
-                        },
-                        {"role": "user", "content": prompt}
-                    ],
-                    max_tokens=1000,
-                    temperature=0.7,
-                    top_p=1.0,
-                    stream=False
-                )
-
-                generated = completion.choices[0].message.content
-                if generated:
-                    # Nettoyer les thinking tokens
-                    cleaned_text = clean_thinking_tokens(generated)
-
-                    if cleaned_text and len(cleaned_text) > 20:  # Vérifier qu'il y a du contenu substantiel
-                        print(f"✅ DEBUG: Texte généré: {cleaned_text[:100]}...")
-                        return cleaned_text
-                    else:
-                        print(f"⚠️ DEBUG: Texte vide ou trop court après nettoyage, utilisation du fallback")
-                        return generate_fallback_story(prompt)
-                else:
-                    print(f"⚠️ DEBUG: Réponse vide")
-
+                story_cache.put(key, result.story)
             except Exception as e:
-                print(f"💥 DEBUG: Erreur tentative {attempt + 1}: {str(e)}")
-                if "503" in str(e) or "loading" in str(e).lower():
-                    st.warning(f"Modèle en cours de chargement... Tentative {attempt + 1}/{max_retries}")
-                    time.sleep(20)
-                    continue
-                elif "429" in str(e) or "rate" in str(e).lower():
-                    st.warning(f"Limite de taux atteinte. Tentative {attempt + 1}/{max_retries}")
-                    time.sleep(30)
-                    continue
-                else:
-                    st.warning(f"Erreur: {str(e)}")
-                    if attempt == max_retries - 1:
-                        break
-                    time.sleep(5)
-
-    except ImportError:
-        print("❌ DEBUG: Module huggingface_hub non disponible")
-        st.error("Module huggingface_hub non installé. Utilisez: pip install huggingface_hub")
-        return None
-    except Exception as e:
-        print(f"💥 DEBUG: Erreur configuration client: {str(e)}")
-        st.error(f"Erreur configuration API: {str(e)}")
+                logger.warning(f"⚠️ Échec écriture cache: {str(e)}")
+        return result
+
+    return get_single_flight().do(
+        ("complete", key),
+        generate,
+        timeout=float(st.secrets.get("SINGLE_FLIGHT_TIMEOUT", 120.0)),
+        notify=notify_streamlit
+    )
+
+# Fonction pour appeler le backend de génération en streaming
+def stream_generation_backend(prompt, budget):
+    """Renvoie les fragments bruts du récit, partagés avec les sessions qui demandent le même prompt"""
+    backend, breaker = get_backend(), get_circuit_breaker()
+    return get_single_flight().stream(
+        ("stream", story_cache_key(prompt, budget)),
+        lambda: stream_story_chunks(prompt, backend, breaker, budget),
+        timeout=backend.timeout
+    )
+
+# Fonction pour afficher le récit pendant sa génération
+def render_story_stream(prompt, container, budget):
+    """Affiche progressivement le récit et renvoie le GenerationResult final"""
+    stream_filter = ThinkingStreamFilter()
+
+    with container.container():
+        st.subheader("📜 Récit généré")
+        text_slot = st.empty()
+        text_slot.caption("💭 Le modèle réfléchit...")
+
+        for chunk in stream_generation_backend(prompt, budget):
+            if stream_filter.feed(chunk):
+                text_slot.markdown(stream_filter.visible + " ▌")
+            elif stream_filter.in_think and not stream_filter.visible:
+                text_slot.caption("💭 Le modèle réfléchit...")
+
+    raw_text = stream_filter.raw_text
+    if not raw_text:
+        container.empty()
         return None
 
-    # Si tous les essais échouent, génération de fallback
-    print("🔄 DEBUG: Utilisation du fallback")
-    return generate_fallback_story(prompt)
-
-# Fonction de fallback pour générer une histoire simple
-def generate_fallback_story(prompt):
-    epoch_stories = {
-        "Renaissance": "En cette époque de renouveau, un artiste florentin découvrit dans son atelier une machine étrange, aux engrenages d'une précision inouïe. Cette invention, léguée par un mystérieux alchimiste, permettait de capturer la lumière même et de la transformer en pigments aux couleurs impossibles. Ses œuvres, d'une beauté surnaturelle, attirèrent l'attention de mécènes venus de contrées lointaines. Mais l'artiste réalisa bientôt que chaque toile peinte avec ces couleurs magiques volait un fragment de réalité au monde, créant des échos entre les dimensions.",
+    # Le texte final passe par le nettoyage complet, comme en mode non-streaming
+    with REGISTRY.timer("clean_thinking"):
+        cleaned_text = clean_thinking_tokens(raw_text)
+    container.empty()
+
+    if cleaned_text and len(cleaned_text) > 20:
+        logger.info(f"✅ Texte streamé: {cleaned_text[:100]}...")
+        store_in_cache(prompt, budget, cleaned_text)
+        return GenerationResult(cleaned_text, False)
+
+    logger.warning("⚠️ Texte streamé vide ou trop court après nettoyage, utilisation du fallback")
+    return GenerationResult(generate_fallback_story(prompt), True)
+
+# Fonction pour enregistrer un récit dans l'historique et l'afficher
+def save_story(story, is_fallback=False, generation_time=None):
+    # Analyse calculée une seule fois, partagée par l'historique et l'affichage
+    record = StoryRecord(
+        story,
+        selected_epoch,
+        tech_level,
+        social_change,
+        fantasy_elements,
+        story_length,
+        analyze_text(story),
+        is_fallback=is_fallback,
+        generation_time=generation_time
+    )
 
-        "Révolution française": "Dans les rues de Paris révolutionnaire, une imprimerie clandestine produisait des pamphlets aux propriétés extraordinaires. L'encre, mélangée avec des herbes rares trouvées dans les jardins royaux abandonnés, rendait les mots littéralement convaincants - quiconque lisait ces textes se trouvait irrésistiblement poussé à agir selon leur contenu. Les révolutionnaires utilisèrent ce pouvoir avec parcimonie, conscients que leur liberté nouvellement acquise dépendait de la volonté authentique du peuple, non de la magie de l'encre.",
+    try:
+        get_story_store().append(record, owner=session_owner())
+    except Exception as e:
+        logger.warning(f"⚠️ Échec écriture historique: {str(e)}")
+        st.warning("Le récit n'a pas pu être ajouté à l'historique")
+    else:
+        # Indexation du nouveau récit (et de quelques récits écrits par d'autres processus)
+        try:
+            get_corpus_index().sync(max_stories=CORPUS_SYNC_ON_SAVE)
+        except Exception as e:
+            logger.warning(f"⚠️ Échec indexation du corpus: {str(e)}")
+
+    REGISTRY.inc("stories_total")
+    if is_fallback:
+        REGISTRY.inc("fallback_stories_total")
+    export_metrics()
+
+    show_story(record)
+
+# Paramètre d'adresse portant le jeton de l'historique d'un visiteur non connecté
+OWNER_QUERY_PARAM = "historique"
+OWNER_TOKEN = re.compile(r"[0-9A-Za-z_-]{4,64}")
+
+# Propriétaire des récits de la session, stable d'une session à l'autre
+def session_owner():
+    # Utilisateur connecté (st.login) : son identité
+    if st.user.get("is_logged_in"):
+        return f"user:{st.user.get('email') or st.user.get('sub')}"
+    # Sinon jeton porté par l'adresse de la page : un rechargement ou un favori retrouve l'historique
+    token = st.query_params.get(OWNER_QUERY_PARAM) or st.session_state.get('owner_id')
+    if not token or not OWNER_TOKEN.fullmatch(token):
+        token = uuid.uuid4().hex
+    st.session_state.owner_id = token
+    if st.query_params.get(OWNER_QUERY_PARAM) != token:
+        st.query_params[OWNER_QUERY_PARAM] = token
+    return token
+
+# Propriétaire filtré par l'historique, l'export et l'analyse ; None : tous les récits
+def history_owner():
+    if st.secrets.get("HISTORY_SCOPE", "personal") == "all":
+        return None
+    return session_owner()
+
+# Récit affiché : la session ne garde qu'une référence vers l'historique
+def show_story(record):
+    if record.id is not None:
+        st.session_state.current_story_id = record.id
+        st.session_state.pop('current_record', None)
+    else:
+        # Écriture dans l'historique échouée : seule copie du récit
+        st.session_state.current_story_id = None
+        st.session_state.current_record = record
+
+def displayed_story():
+    story_id = st.session_state.get('current_story_id')
+    if story_id is not None:
+        record = get_story_store().get(story_id)
+        if record is not None:
+            return record
+    return st.session_state.get('current_record')
+
+# Fichier d'export préparé au clic sur le bouton de téléchargement
+def export_history(story_store, fmt, filters):
+    # Récits lus par lots et écrits sur disque, pas via la session. Streamlit lit
+    # ensuite le fichier entier en mémoire pour le servir : seul l'export en ligne
+    # de commande (story_export.py) garde une mémoire indépendante de sa taille.
+    # Fichier brut (sans tampon) : un des flux io que download_button accepte.
+    out = tempfile.TemporaryFile(buffering=0)
+    buffer = io.BufferedWriter(out)
+    count = export_rows(store_rows(story_store, **filters), fmt, buffer)
+    buffer.flush()
+    buffer.detach()
+    logger.info(f"📥 Export {fmt} : {count} récits")
+    return out
+
+def export_panel(story_store, since):
+    with st.expander("📥 Exporter l'historique"):
+        col_format, col_epoch, col_since, col_until = st.columns(4)
+        with col_format:
+            fmt = st.selectbox("Format", list(FORMATS), key="export_format")
+        with col_epoch:
+            epoch = st.selectbox("Époque", ["Toutes"] + list(EPOCHS), key="export_epoch")
+        with col_since:
+            start_date = st.date_input("Depuis le", value=None, key="export_since")
+        with col_until:
+            end_date = st.date_input("Jusqu'au", value=None, key="export_until")
+
+        # Seuls les récits du propriétaire sont exportés, hors ceux masqués par "Vider l'historique"
+        filters = {
+            'owner': history_owner(),
+            'epoch': None if epoch == "Toutes" else epoch,
+            'since': since,
+            'until': None,
+        }
+        if start_date is not None:
+            start = datetime.combine(start_date, datetime.min.time()).timestamp()
+            filters['since'] = max(start, since or start)
+        if end_date is not None:
+            filters['until'] = datetime.combine(end_date + timedelta(days=1), datetime.min.time()).timestamp()
+
+        extension, mime = FORMATS[fmt]
+        st.caption(f"{story_store.count(**filters)} récit(s) à exporter, avec leurs paramètres, analyse et durée de génération")
+        st.download_button(
+            "📥 Télécharger",
+            data=functools.partial(export_history, story_store, fmt, filters),
+            file_name=f"recits.{extension}",
+            mime=mime,
+            on_click="ignore",
+            key="export_download"
+        )
 
-        "Révolution industrielle": "Les machines à vapeur de cette Manchester alternative fonctionnaient non pas au charbon, mais aux rêves collectés dans les quartiers ouvriers. Des collecteurs nocturnes parcouraient les rues, récupérant dans des fioles de cristal les songes abandonnés par les travailleurs épuisés. Ces rêves, une fois distillés, produisaient une énergie pure et inépuisable. Mais quand les ouvriers cessèrent de rêver, privés de leurs aspirations, les machines s'arrêtèrent une à une, et la société dut repenser son rapport au progrès.",
+def clear_history():
+    st.session_state.history_cleared_at = time.time()
+    st.session_state.history_page = 1
+    st.session_state.history_expanded = None
+
+def reset_history_page():
+    # Filtres ou tri modifiés : retour à la première page
+    st.session_state.history_page = 1
+
+def toggle_history_entry(story_id):
+    # Un seul récit déplié à la fois : seul celui-ci charge son texte
+    if st.session_state.get('history_expanded') == story_id:
+        st.session_state.history_expanded = None
+    else:
+        st.session_state.history_expanded = story_id
+
+def history_filter_controls():
+    # Filtres et tri de l'historique, traduits en filtres et ordre de StoryStore
+    with st.expander("🔍 Filtrer et trier"):
+        col_epoch, col_order, col_score = st.columns([2, 2, 1])
+        with col_epoch:
+            epoch = st.selectbox("Époque", ["Toutes"] + list(EPOCHS), key="history_epoch",
+                                 on_change=reset_history_page)
+        with col_order:
+            order = st.selectbox("Trier par", list(HISTORY_ORDERS), key="history_order",
+                                 on_change=reset_history_page)
+        with col_score:
+            min_score = st.number_input("Divergence min. (%)", min_value=0.0, max_value=100.0, value=0.0,
+                                        step=0.5, key="history_min_score", on_change=reset_history_page)
+        col_tech, col_social, col_fantasy = st.columns(3)
+        with col_tech:
+            tech = st.slider("Tech", 0, 100, (0, 100), key="history_tech", on_change=reset_history_page)
+        with col_social:
+            social = st.slider("Social", 0, 100, (0, 100), key="history_social", on_change=reset_history_page)
+        with col_fantasy:
+            fantasy = st.slider("Fantasy", 0, 100, (0, 100), key="history_fantasy", on_change=reset_history_page)
+
+    filters = {
+        'epoch': None if epoch == "Toutes" else epoch,
+        'min_score': min_score or None,
+        'min_tech': tech[0] or None,
+        'max_tech': tech[1] if tech[1] < 100 else None,
+        'min_social': social[0] or None,
+        'max_social': social[1] if social[1] < 100 else None,
+        'min_fantasy': fantasy[0] or None,
+        'max_fantasy': fantasy[1] if fantasy[1] < 100 else None,
+    }
+    return filters, HISTORY_ORDERS[order]
+
+def history_entry_details(entry, displayed):
+    # Détail d'un récit déplié : paramètres comparés au récit affiché, texte et analyse
+    is_displayed = displayed is not None and displayed.id == entry.id
+    current_params = (displayed or entry).params()
+
+    st.markdown("**Paramètres utilisés :**")
+    param_cols = st.columns(4)
+    with param_cols[0]:
+        delta = None if is_displayed else entry.tech_level - current_params['tech']
+        st.metric("Tech", entry.tech_level, delta=delta)
+    with param_cols[1]:
+        delta = None if is_displayed else entry.social_change - current_params['social']
+        st.metric("Social", entry.social_change, delta=delta)
+    with param_cols[2]:
+        delta = None if is_displayed else entry.fantasy_elements - current_params['fantasy']
+        st.metric("Fantasy", entry.fantasy_elements, delta=delta)
+    with param_cols[3]:
+        st.write(f"**Longueur:** {entry.story_length}")
+        if entry.story_length != current_params['length']:
+            st.caption(f"(Récit affiché : {current_params['length']})")
+
+    # Indicateur de source
+    if entry.is_fallback:
+        st.info("🎭 Récit généré en mode hors-ligne")
+
+    # Le récit
+    st.markdown("**Récit :**")
+    st.write(entry.story)
+
+    # Mini-analyse
+    analysis = entry.analysis
+    st.markdown(f"**Analyse :** {analysis['word_count']} mots • Score de divergence : {analysis['parallel_score']:.1f}%")
+
+    # Bouton pour recharger ce récit comme actuel
+    if not is_displayed and st.button(f"🔄 Recharger ce récit", key=f"reload_{entry.id}"):
+        show_story(entry)
+        st.success("Récit rechargé dans l'affichage principal !")
+        # Le récit affiché change : exécution complète de la page
+        st.rerun()
+
+# Historique : fragment, la navigation entre pages ne réexécute que ce panneau
+@timed_fragment("ui_history")
+def history_panel():
+    # Section d'historique des récits : une page de lignes compactes, un seul récit déplié
+    story_store = get_story_store()
+    # "Vider l'historique" masque les récits antérieurs sans les supprimer du stockage
+    owner = history_owner()
+    since = st.session_state.get('history_cleared_at')
+    history_total = story_store.count(owner=owner, since=since)
+
+    if history_total:
+        st.markdown("---")
+        st.header(f"📚 Historique des récits ({history_total} récit{'s' if history_total > 1 else ''})")
 
-        "Belle Époque": "L'Exposition universelle de Paris accueillait cette année-là un pavillon secret, visible seulement à la tombée du jour. Les inventions exposées défiaient les lois de la physique : des automobiles volantes alimentées par la musique des cabarets, des téléphones permettant de converser avec les morts, des photographies capturant non pas les visages mais les émotions. Les visiteurs, ébahis, repartaient avec la certitude qu'un monde nouveau était né, où la science et la poésie ne faisaient qu'un.",
+        col_clear, col_info = st.columns([1, 3])
+        with col_clear:
+            # Rappel exécuté avant le fragment : le panneau s'affiche déjà vidé
+            st.button("🗑️ Vider l'historique", on_click=clear_history)
+        with col_info:
+            st.info("💡 Cliquez sur « Détails » pour voir le récit, ses paramètres et son analyse")
+
+        export_panel(story_store, since)
+        filters, order = history_filter_controls()
+        narrowed = any(value is not None for value in filters.values())
+        filters['owner'] = owner
+        filters['since'] = since
+        matching = story_store.count(**filters) if narrowed else history_total
+        if not matching:
+            st.write("Aucun récit ne correspond aux filtres")
+            return
+
+        page_count = (matching + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE
+        if st.session_state.get('history_page', 1) > page_count:
+            st.session_state.history_page = page_count
+        col_count, col_page = st.columns([3, 1])
+        with col_page:
+            page_number = st.number_input(
+                f"Page (sur {page_count})",
+                min_value=1,
+                max_value=page_count,
+                step=1,
+                key="history_page"
+            )
+        with col_count:
+            st.caption(f"{matching} récit{'s' if matching > 1 else ''} correspondant aux filtres")
+
+        # Le coût d'affichage ne dépend que de la taille d'une page, pas de celle de l'historique
+        displayed = displayed_story()
+        expanded_id = st.session_state.get('history_expanded')
+        summaries = story_store.summaries(page_number - 1, HISTORY_PAGE_SIZE, order, **filters)
+        for summary in summaries:
+            # Ligne compacte : paramètres et analyse, sans le texte du récit
+            if displayed is not None and summary.id == displayed.id:
+                marker = "👉"
+            else:
+                marker = "🎭" if summary.is_fallback else "📖"
+            col_row, col_toggle = st.columns([6, 1])
+            with col_row:
+                st.markdown(
+                    f"{marker} **Récit n°{summary.id}** · {summary.epoch} · "
+                    f"{time.strftime('%d/%m %H:%M', time.localtime(summary.created_at))} · "
+                    f"Tech {summary.tech_level} / Social {summary.social_change} / Fantasy {summary.fantasy_elements} · "
+                    f"{summary.word_count} mots · divergence {summary.parallel_score:.1f}%"
+                )
+            with col_toggle:
+                st.button(
+                    "Masquer" if summary.id == expanded_id else "Détails",
+                    key=f"expand_{summary.id}",
+                    on_click=toggle_history_entry,
+                    args=(summary.id,)
+                )
 
-        "Années folles": "Dans les clubs de jazz de Montmartre, la musique avait acquis des propriétés alchimiques. Les notes de saxophone transformaient littéralement l'atmosphère, rendant l'air plus léger, permettant aux danseurs de défier la gravité quelques instants. Les musiciens, conscients de leur pouvoir, créaient des mélodies capables d'effacer temporairement les traumatismes de la Grande Guerre. Mais ils découvrirent bientôt que cette magie avait un prix : elle consumait lentement leur propre mémoire, les condamnant à rejouer éternellement les mêmes airs."
-    }
+            # Texte et métriques chargés pour le seul récit déplié
+            if summary.id == expanded_id:
+                entry = story_store.get(summary.id)
+                if entry is not None:
+                    with st.container(border=True):
+                        history_entry_details(entry, displayed)
+
+# Regroupements proposés dans l'analyse du corpus
+CORPUS_DIMENSIONS = {
+    "Époque": "epoch",
+    "Technologie": "tech",
+    "Société": "social",
+    "Fantastique": "fantasy",
+    "Longueur": "length",
+}
 
-    # Retourne une histoire prédéfinie selon l'époque
-    for epoch_key, story in epoch_stories.items():
-        if epoch_key.lower() in prompt.lower():
-            return story
+# Caractères de la mini-distribution des scores de divergence
+SPARK_BLOCKS = "▁▂▃▄▅▆▇█"
 
-    return epoch_stories["Renaissance"]  # Histoire par défaut
+def sparkline(counts):
+    peak = max(counts) or 1
+    # Une classe non vide reste visible, même très minoritaire
+    return "".join(
+        SPARK_BLOCKS[max(1, round(count / peak * (len(SPARK_BLOCKS) - 1))) if count else 0] for count in counts
+    )
 
-# Fonction pour générer le prompt
-def generate_prompt(epoch, tech, social, fantasy, length):
-    epoch_data = EPOCHS[epoch]
+# Analyse du corpus : fragment, l'index n'est interrogé que si le panneau est ouvert
+@timed_fragment("ui_corpus")
+def corpus_panel():
+    st.markdown("---")
+    if not st.toggle("📈 Analyse du corpus", key="corpus_panel_open"):
+        return
 
-    length_instruction = {
-        "Court (100-200 mots)": "un court récit de 100 à 200 mots",
-        "Moyen (300-500 mots)": "un récit de 300 à 500 mots",
-        "Long (600-800 mots)": "un récit détaillé de 600 à 800 mots"
+    corpus_index = get_corpus_index()
+    try:
+        # Récits écrits par d'autres processus (lots, autres instances), ou historique pas encore indexé
+        with st.spinner("Indexation du corpus..."):
+            corpus_index.sync()
+    except Exception as e:
+        logger.warning(f"⚠️ Échec indexation du corpus: {str(e)}")
+    # Statistiques et recherche limitées aux récits du propriétaire
+    owner = history_owner()
+    summary = corpus_index.summary(owner)
+    if not summary['stories']:
+        st.info("Aucun récit indexé pour l'instant")
+        return
+    st.caption(f"{summary['stories']} récits • {summary['words']} mots • vocabulaire de {summary['vocabulary']} mots")
+
+    # Distribution du score de divergence par groupe, lue dans les agrégats de l'index
+    dimension_label = st.radio("Regrouper par", list(CORPUS_DIMENSIONS), horizontal=True, key="corpus_dimension")
+    dimension = CORPUS_DIMENSIONS[dimension_label]
+    levels = bucket_labels()
+    distribution = corpus_index.divergence_distribution(dimension, owner)
+    names = {
+        entry['value']: (f"{dimension_label} {levels[int(entry['value'])]}"
+                         if dimension in ("tech", "social", "fantasy") else entry['value'])
+        for entry in distribution
     }
-
-    tech_description = ""
-    if tech > 70:
-        tech_description = "avec des technologies très avancées pour l'époque"
-    elif tech > 40:
-        tech_description = "avec quelques innovations technologiques"
-    elif tech > 10:
-        tech_description = "avec de légères améliorations techniques"
-
-    social_description = ""
-    if social > 70:
-        social_description = "dans une société aux structures radicalement différentes"
-    elif social > 40:
-        social_description = "avec des changements sociaux notables"
-    elif social > 10:
-        social_description = "avec quelques modifications sociales"
-
-    fantasy_description = ""
-    if fantasy > 70:
-        fantasy_description = "intégrant des éléments magiques subtils"
-    elif fantasy > 40:
-        fantasy_description = "avec des phénomènes inexpliqués"
-    elif fantasy > 10:
-        fantasy_description = "avec une légère touche de mystère"
-
-    prompt = f"""Histoire: {length_instruction[length]} se déroulant pendant {epoch.split('(')[0].strip()} {tech_description} {social_description} {fantasy_description}.
-
-Contexte: {epoch_data['context']}
-
-Récit:"""
-
-    return prompt
-
-# Fonction pour analyser le texte généré
-def analyze_text(text):
-    # Comptage des mots
-    words = re.findall(r'\b\w+\b', text.lower())
-    word_count = len(words)
-
-    # Mots les plus fréquents
-    word_freq = Counter(words)
-    common_words = word_freq.most_common(10)
-
-    # Détection d'éléments "parallèles" vs réalistes
-    parallel_indicators = [
-        'alternative', 'différent', 'inhabituel', 'étrange', 'mystérieux',
-        'inexpliqué', 'nouveau', 'révolutionnaire', 'impossible', 'magique'
+    table = [
+        "| Groupe | Récits | Mots (moy.) | Divergence | Distribution |",
+        "|---|---:|---:|---:|---|",
     ]
+    for entry in distribution:
+        table.append(
+            f"| {names[entry['value']]} | {entry['stories']} | {entry['mean_words']:.0f} "
+            f"| {entry['mean']:.2f}% ± {entry['stdev']:.2f} | {sparkline(entry['histogram'])} |"
+        )
+    st.markdown("\n".join(table))
+    st.caption("Distribution du score : " + " • ".join(bin_labels()))
+
+    # Mots caractéristiques de chaque groupe par rapport au reste du corpus
+    if dimension != "length":
+        st.markdown("**Mots caractéristiques (TF-IDF) :**")
+        for entry in distribution:
+            terms = corpus_index.top_terms(dimension, entry['value'], 8, owner)
+            st.write(f"• **{names[entry['value']]}** : {', '.join(term for term, _ in terms)}")
+
+    # Recherche plein texte dans l'historique du propriétaire
+    query = st.text_input("🔎 Rechercher dans les récits", key="corpus_query")
+    if query:
+        results = corpus_index.search(query, limit=10, owner=owner)
+        if not results:
+            st.write("Aucun récit trouvé")
+        story_store = get_story_store()
+        for story_id, score in results:
+            record = story_store.get(story_id)
+            if record is None:
+                continue
+            excerpt = record.story[:200] + ("…" if len(record.story) > 200 else "")
+            st.markdown(f"**Récit n°{story_id}** - {record.epoch} • pertinence {score:.2f}")
+            st.caption(excerpt)
+            if st.button("🔄 Afficher ce récit", key=f"search_{story_id}"):
+                show_story(record)
+                # Le récit affiché change : exécution complète de la page
+                st.rerun()
 
-    parallel_score = sum(1 for word in words if word in parallel_indicators)
-    parallel_percentage = (parallel_score / word_count) * 100 if word_count > 0 else 0
-
-    return {
-        'word_count': word_count,
-        'common_words': common_words,
-        'parallel_score': parallel_percentage
-    }
+# Mode hors-ligne prêt dès le premier affichage : aucun chargement au moment d'une panne
+get_offline_engine()
+# Jeton d'historique placé dans l'adresse dès le premier affichage
+session_owner()
 
 # Interface principale
 col1, col2 = st.columns([2, 1])
@@ -356,175 +798,115 @@ with col1:
     st.header("📖 Génération de récit")
 
     if st.button("🎲 Générer un récit parallèle", type="primary"):
+        # Zone d'affichage progressif du récit en cours de génération
+        stream_area = st.empty()
+        # Durée de génération conservée avec le récit, pour les exports
+        generation_started = time.perf_counter()
+
         with st.spinner("Génération du récit en cours..."):
             try:
-                print(f"🚀 DEBUG: Bouton cliqué - Génération démarrée")
-                print(f"🔍 DEBUG: Paramètres - Époque: {selected_epoch}, Tech: {tech_level}, Social: {social_change}, Fantasy: {fantasy_elements}")
-
-                prompt = generate_prompt(selected_epoch, tech_level, social_change, fantasy_elements, story_length)
-                print(f"📝 DEBUG: Prompt généré: {prompt[:200]}...")
+                logger.debug("🚀 Bouton cliqué - Génération démarrée")
+                logger.debug(f"🔍 Paramètres - Époque: {selected_epoch}, Tech: {tech_level}, Social: {social_change}, Fantasy: {fantasy_elements}")
 
-                # Appel à l'API Hugging Face ou fallback
-                print("🌐 DEBUG: Appel de l'API Hugging Face...")
-                generated_story = call_huggingface_api(prompt)
-
-                if not generated_story:
-                    print("⚠️ DEBUG: API a retourné None, utilisation du fallback")
+                with REGISTRY.timer("prompt_build"):
+                    prompt = generate_prompt(selected_epoch, tech_level, social_change, fantasy_elements, story_length)
+                logger.debug(f"📝 Prompt généré: {prompt[:200]}...")
+                budget = generation_budget(story_length)
+
+                # Récit frais de la réserve pré-générée, reconstituée en arrière-plan
+                result = None
+                warm_pool = get_warm_pool()
+                if warm_pool is not None:
+                    pooled_story = warm_pool.take((prompt, story_length))
+                    if pooled_story:
+                        logger.info("⚡ Récit servi depuis la réserve pré-générée")
+                        result = GenerationResult(pooled_story, False)
+
+                # Récit déjà généré pour ce prompt dans le cache partagé
+                cached_story = None
+                if result is None:
+                    try:
+                        cached_story = get_story_cache().get(story_cache_key(prompt, budget))
+                    except Exception as e:
+                        logger.warning(f"⚠️ Cache indisponible: {str(e)}")
+                if cached_story:
+                    logger.info("⚡ Récit servi depuis le cache")
+                    REGISTRY.inc("story_cache_hits_total")
+                    result = GenerationResult(cached_story, False)
+
+                # File d'admission, sauf pour rejoindre une génération identique déjà en cours
+                if result is None:
+                    flight_key = ("stream" if streaming_enabled else "complete", story_cache_key(prompt, budget))
+                    if flight_key not in get_single_flight() and not wait_for_admission(stream_area):
+                        logger.warning("⏳ Admission impossible avant la date limite, utilisation du fallback")
+                        result = GenerationResult(generate_fallback_story(prompt), True)
+                        st.info("🎭 Trop de demandes en cours : histoire générée en mode hors-ligne")
+
+                # Appel à l'API Hugging Face (streaming si activé) ou fallback
+                if result is None and streaming_enabled:
+                    logger.debug("🌐 Appel de l'API Hugging Face en streaming...")
+                    try:
+                        result = render_story_stream(prompt, stream_area, budget)
+                    except Exception as stream_error:
+                        logger.error(f"💥 Erreur streaming, bascule en mode classique: {str(stream_error)}")
+                        stream_area.empty()
+
+                    # Jeton consommé par le flux : la bascule en mode classique repasse par la file
+                    if result is None and ("complete", story_cache_key(prompt, budget)) not in get_single_flight() \
+                            and not wait_for_admission(stream_area):
+                        logger.warning("⏳ Admission impossible avant la date limite, utilisation du fallback")
+                        result = GenerationResult(generate_fallback_story(prompt), True)
+                        st.info("🎭 Trop de demandes en cours : histoire générée en mode hors-ligne")
+
+                if result is None:
+                    logger.debug("🌐 Appel de l'API Hugging Face...")
+                    result = call_generation_backend(prompt, budget)
+
+                if result is None:
+                    logger.warning("⚠️ API a retourné None, utilisation du fallback")
                     # Si l'API échoue, utilise le fallback
-                    generated_story = generate_fallback_story(prompt)
+                    result = GenerationResult(generate_fallback_story(prompt), True)
                     st.info("🎭 Histoire générée en mode hors-ligne (API Hugging Face indisponible)")
                 else:
-                    print(f"✅ DEBUG: Histoire générée avec succès: {len(generated_story)} caractères")
-
-                # Stockage dans la session avec historique
-                print("💾 DEBUG: Stockage dans la session...")
-
-                # Initialiser l'historique s'il n'existe pas
-                if 'story_history' not in st.session_state:
-                    st.session_state.story_history = []
-
-                # Créer l'entrée d'historique
-                story_entry = {
-                    'story': generated_story,
-                    'epoch': selected_epoch,
-                    'tech_level': tech_level,
-                    'social_change': social_change,
-                    'fantasy_elements': fantasy_elements,
-                    'story_length': story_length,
-                    'timestamp': pd.Timestamp.now(),
-                    'analysis': analyze_text(generated_story)
-                }
-
-                # Ajouter au début de l'historique (le plus récent en premier)
-                st.session_state.story_history.insert(0, story_entry)
+                    logger.info(f"✅ Histoire générée avec succès: {len(result.story)} caractères")
 
-                # Limiter l'historique à 10 récits pour éviter l'encombrement
-                if len(st.session_state.story_history) > 10:
-                    st.session_state.story_history = st.session_state.story_history[:10]
-
-                # Garder les variables pour l'affichage principal
-                st.session_state.current_story = generated_story
-                st.session_state.current_analysis = analyze_text(generated_story)
-                print("✅ DEBUG: Génération terminée avec succès")
+                # Stockage dans l'historique durable
+                logger.debug("💾 Stockage dans l'historique...")
+                save_story(result.story, result.is_fallback, time.perf_counter() - generation_started)
+                logger.info("✅ Génération terminée avec succès")
 
             except Exception as e:
-                print(f"💥 DEBUG: Exception dans le bouton: {str(e)}")
-                import traceback
-                print(f"📍 DEBUG: Traceback complet: {traceback.format_exc()}")
+                logger.exception(f"💥 Exception dans le bouton: {str(e)}")
 
                 st.error(f"Erreur lors de la génération : {str(e)}")
                 # Génération de fallback en cas d'erreur
                 try:
                     prompt = generate_prompt(selected_epoch, tech_level, social_change, fantasy_elements, story_length)
-                    generated_story = generate_fallback_story(prompt)
-
-                    # Initialiser l'historique s'il n'existe pas
-                    if 'story_history' not in st.session_state:
-                        st.session_state.story_history = []
-
-                    # Créer l'entrée d'historique pour le fallback
-                    story_entry = {
-                        'story': generated_story,
-                        'epoch': selected_epoch,
-                        'tech_level': tech_level,
-                        'social_change': social_change,
-                        'fantasy_elements': fantasy_elements,
-                        'story_length': story_length,
-                        'timestamp': pd.Timestamp.now(),
-                        'analysis': analyze_text(generated_story),
-                        'is_fallback': True
-                    }
-
-                    st.session_state.story_history.insert(0, story_entry)
-
-                    if len(st.session_state.story_history) > 10:
-                        st.session_state.story_history = st.session_state.story_history[:10]
-
-                    st.session_state.current_story = generated_story
-                    st.session_state.current_analysis = analyze_text(generated_story)
+                    save_story(generate_fallback_story(prompt), is_fallback=True,
+                               generation_time=time.perf_counter() - generation_started)
                     st.info("🎭 Histoire générée en mode hors-ligne")
-                    print("🔄 DEBUG: Fallback appliqué avec succès")
+                    logger.info("🔄 Fallback appliqué avec succès")
                 except Exception as fallback_error:
-                    print(f"💥 DEBUG: Erreur même dans le fallback: {str(fallback_error)}")
+                    logger.error(f"💥 Erreur même dans le fallback: {str(fallback_error)}")
                     st.error(f"Erreur critique: {str(fallback_error)}")
 
     # Affichage du récit généré
-    if hasattr(st.session_state, 'current_story'):
+    displayed = displayed_story()
+    if displayed is not None:
         st.subheader("📜 Récit généré")
-        st.write(st.session_state.current_story)
-
-    # Section d'historique des récits
-    if hasattr(st.session_state, 'story_history') and st.session_state.story_history:
-        st.markdown("---")
-        st.header(f"📚 Historique des récits ({len(st.session_state.story_history)} récit{'s' if len(st.session_state.story_history) > 1 else ''})")
+        st.write(displayed.story)
 
-        # Boutons de gestion
-        col_clear, col_info, col_spacer = st.columns([1, 2, 1])
-        with col_clear:
-            if st.button("🗑️ Vider l'historique"):
-                st.session_state.story_history = []
-                st.success("Historique vidé !")
-                st.rerun()
-        with col_info:
-            st.info("💡 Cliquez sur un récit pour voir ses détails et paramètres")
-
-        # Affichage de l'historique
-        for i, entry in enumerate(st.session_state.story_history):
-            # Créer un titre avec emoji indicateur de nouveauté
-            title_emoji = "🆕" if i == 0 else "📖"
-            title = f"{title_emoji} Récit {i+1} - {entry['epoch']} ({entry['timestamp'].strftime('%H:%M')})"
-
-            with st.expander(title):
-                # Affichage des paramètres avec comparaison
-                st.markdown("**Paramètres utilisés :**")
-                param_cols = st.columns(4)
-
-                # Comparaison avec les paramètres actuels
-                current_params = {
-                    'tech': tech_level,
-                    'social': social_change,
-                    'fantasy': fantasy_elements,
-                    'length': story_length
-                }
+    history_panel()
+    corpus_panel()
 
-                with param_cols[0]:
-                    delta = entry['tech_level'] - current_params['tech'] if i > 0 else None
-                    st.metric("Tech", entry['tech_level'], delta=delta)
-                with param_cols[1]:
-                    delta = entry['social_change'] - current_params['social'] if i > 0 else None
-                    st.metric("Social", entry['social_change'], delta=delta)
-                with param_cols[2]:
-                    delta = entry['fantasy_elements'] - current_params['fantasy'] if i > 0 else None
-                    st.metric("Fantasy", entry['fantasy_elements'], delta=delta)
-                with param_cols[3]:
-                    st.write(f"**Longueur:** {entry['story_length']}")
-                    if entry['story_length'] != current_params['length']:
-                        st.caption(f"(Actuel: {current_params['length']})")
-
-                # Indicateur de source
-                if entry.get('is_fallback', False):
-                    st.info("🎭 Récit généré en mode hors-ligne")
-
-                # Le récit
-                st.markdown("**Récit :**")
-                st.write(entry['story'])
-
-                # Mini-analyse
-                analysis = entry['analysis']
-                st.markdown(f"**Analyse :** {analysis['word_count']} mots • Score de divergence : {analysis['parallel_score']:.1f}%")
-
-                # Bouton pour recharger ce récit comme actuel
-                if st.button(f"🔄 Recharger ce récit", key=f"reload_{i}"):
-                    st.session_state.current_story = entry['story']
-                    st.session_state.current_analysis = entry['analysis']
-                    st.success("Récit rechargé dans l'affichage principal !")
-                    st.rerun()
-
-with col2:
+# Analyse : fragment, redessiné seulement quand le récit affiché change
+@timed_fragment("ui_analysis")
+def analysis_panel():
     st.header("📊 Analyse du texte")
 
-    if hasattr(st.session_state, 'current_analysis'):
-        analysis = st.session_state.current_analysis
+    displayed = displayed_story()
+    if displayed is not None:
+        analysis = displayed.analysis
 
         # Métriques
         st.metric("Nombre de mots", analysis['word_count'])
@@ -536,23 +918,17 @@ with col2:
             st.write(f"• **{word}** : {count}")
 
         # Nuage de mots
-        if hasattr(st.session_state, 'current_story') and len(st.session_state.current_story) > 50:
+        if len(displayed.story) > 50:
             st.subheader("☁️ Nuage de mots")
             try:
-                wordcloud = WordCloud(
-                    width=300,
-                    height=200,
-                    background_color='white',
-                    colormap='viridis'
-                ).generate(st.session_state.current_story)
-
-                fig, ax = plt.subplots(figsize=(6, 4))
-                ax.imshow(wordcloud, interpolation='bilinear')
-                ax.axis('off')
-                st.pyplot(fig)
+                # Rendu mis en cache : les reruns réutilisent l'image PNG déjà calculée
+                st.image(render_wordcloud_png(displayed.story))
             except Exception as e:
                 st.write("Nuage de mots non disponible")
 
+with col2:
+    analysis_panel()
+
 # Footer
 st.markdown("---")
 st.markdown("*Application développée avec Streamlit et Ollama - Exploration des mondes parallèles littéraires*")
\ No newline at end of file
@@ -0,0 +1,272 @@
+"""Backends de génération interchangeables
+
+Chaque backend garde un client unique par processus (connexions HTTP
+réutilisées), limite le nombre d'appels simultanés et applique un délai
+maximal par appel. Trois implémentations : l'API d'inférence Hugging Face, un
+serveur local compatible OpenAI (Ollama, llama.cpp, serveur de test) et un
+backend déterministe en mémoire.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Modèle par défaut, servi par l'API Hugging Face
+DEFAULT_MODEL = "HuggingFaceTB/SmolLM3-3B"
+
+
+class BackendBusyError(TimeoutError):
+    """Aucun emplacement d'appel libéré avant la fin du délai"""
+
+
+def read_usage(usage, reported):
+    """Copie dans usage les tokens générés rapportés par le serveur (champ usage de l'API)"""
+    if not reported or reported.get("completion_tokens") is None:
+        return
+    usage["completion_tokens"] = int(reported["completion_tokens"])
+    details = reported.get("completion_tokens_details") or {}
+    if details.get("reasoning_tokens") is not None:
+        usage["reasoning_tokens"] = int(details["reasoning_tokens"])
+
+
+class GenerationBackend:
+    """Interface commune : complete() renvoie le texte brut, stream() ses fragments
+
+    Le dictionnaire usage éventuel reçoit les tokens générés rapportés par le
+    serveur (completion_tokens, et reasoning_tokens s'il les détaille) ; il
+    reste vide si le serveur ne les rapporte pas.
+    """
+
+    name = "base"
+
+    def __init__(self, model=DEFAULT_MODEL, timeout=60.0, max_concurrency=4):
+        self.model = model
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def label(self):
+        """Identifiant backend + modèle, utilisé dans les clés de cache"""
+        return f"{self.name}:{self.model}"
+
+    def unavailable_reason(self):
+        """Message d'erreur si le backend n'est pas configuré, None sinon"""
+        return None
+
+    def client(self):
+        """Client créé au premier appel puis réutilisé par toutes les sessions"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._create_client()
+        return self._client
+
+    def _create_client(self):
+        return None
+
+    @contextmanager
+    def slot(self):
+        """Réserve un des max_concurrency emplacements d'appel"""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise BackendBusyError(f"Backend {self.name} saturé : aucun emplacement libre après {self.timeout}s")
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+    def complete(self, messages, params, usage=None):
+        with self.slot():
+            return self._complete(self.client(), messages, params, {} if usage is None else usage)
+
+    def stream(self, messages, params, usage=None):
+        with self.slot():
+            for content in self._stream(self.client(), messages, params, {} if usage is None else usage):
+                yield content
+
+    def _complete(self, client, messages, params, usage):
+        raise NotImplementedError
+
+    def _stream(self, client, messages, params, usage):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class HuggingFaceBackend(GenerationBackend):
+    """API d'inférence Hugging Face via InferenceClient"""
+
+    name = "hf"
+
+    def __init__(self, api_token, model=DEFAULT_MODEL, provider="hf-inference", base_url=None, **options):
+        super().__init__(model, **options)
+        self.api_token = api_token
+        self.provider = provider
+        self.base_url = base_url
+
+    def unavailable_reason(self):
+        if not self.api_token:
+            return "Token Hugging Face manquant. Veuillez configurer HUGGINGFACE_API_TOKEN dans les secrets."
+        return None
+
+    def _create_client(self):
+        from huggingface_hub import InferenceClient
+
+        # model et base_url sont exclusifs : le modèle est alors passé à chaque appel
+        if self.base_url:
+            return InferenceClient(base_url=self.base_url, api_key=self.api_token, timeout=self.timeout)
+        return InferenceClient(provider=self.provider, api_key=self.api_token, timeout=self.timeout)
+
+    def _complete(self, client, messages, params, usage):
+        completion = client.chat.completions.create(model=self.model, messages=messages, stream=False, **params)
+        read_usage(usage, completion.usage)
+        return completion.choices[0].message.content
+
+    def _stream(self, client, messages, params, usage):
+        stream = client.chat.completions.create(model=self.model, messages=messages, stream=True,
+                                                stream_options={"include_usage": True}, **params)
+        for chunk in stream:
+            # Dernier fragment : compteurs de tokens, sans texte
+            read_usage(usage, getattr(chunk, "usage", None))
+            if not chunk.choices:
+                continue
+            content = chunk.choices[0].delta.content
+            if content:
+                yield content
+
+
+class OpenAICompatibleBackend(GenerationBackend):
+    """Serveur exposant /v1/chat/completions (Ollama, llama.cpp, vLLM...)"""
+
+    name = "openai"
+
+    def __init__(self, base_url="http://127.0.0.1:11434/v1", model=DEFAULT_MODEL, api_key="", **options):
+        super().__init__(model, **options)
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+
+    def _create_client(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        # Une connexion keep-alive par emplacement d'appel
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        if self.api_key:
+            session.headers["Authorization"] = f"Bearer {self.api_key}"
+        return session
+
+    @contextmanager
+    def _request(self, client, messages, params, stream):
+        import requests
+
+        payload = dict(params, model=self.model, messages=messages, stream=stream)
+        if stream:
+            payload["stream_options"] = {"include_usage": True}
+        try:
+            response = client.post(f"{self.base_url}/chat/completions", json=payload,
+                                   timeout=self.timeout, stream=stream)
+            response.raise_for_status()
+        except requests.Timeout as e:
+            # Exceptions standard : classify_error les reconnaît comme erreurs réseau
+            raise TimeoutError(f"Délai dépassé ({self.timeout}s) : {e}") from e
+        except requests.ConnectionError as e:
+            raise ConnectionError(f"Connexion impossible à {self.base_url} : {e}") from e
+        try:
+            yield response
+        finally:
+            response.close()
+
+    def _complete(self, client, messages, params, usage):
+        with self._request(client, messages, params, stream=False) as response:
+            completion = response.json()
+            read_usage(usage, completion.get("usage"))
+            return completion["choices"][0]["message"]["content"]
+
+    def _stream(self, client, messages, params, usage):
+        with self._request(client, messages, params, stream=True) as response:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                # Dernier fragment : compteurs de tokens, sans texte
+                read_usage(usage, chunk.get("usage"))
+                choices = chunk.get("choices")
+                if not choices:
+                    continue
+                content = (choices[0].get("delta") or {}).get("content")
+                if content:
+                    yield content
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+
+
+class MockBackend(GenerationBackend):
+    """Backend en mémoire : même prompt, même réponse, sans réseau"""
+
+    name = "mock"
+
+    def __init__(self, model="mock", latency=0.0, **options):
+        super().__init__(model, **options)
+        self.latency = latency
+
+    def _respond(self, messages):
+        from generation import generate_fallback_story
+
+        prompt = messages[-1]["content"]
+        seed = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16], 16)
+        story = generate_fallback_story(prompt, seed=seed)
+        return f"<think>\nJe dois écrire un récit à partir de ce prompt.\n</think>\n\n{story}"
+
+    def _complete(self, client, messages, params, usage):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._respond(messages)
+
+    def _stream(self, client, messages, params, usage):
+        text = self._respond(messages)
+        words = text.split(" ")
+        delay = self.latency / len(words) if self.latency else 0.0
+        for index, word in enumerate(words):
+            if delay:
+                time.sleep(delay)
+            yield word if index == len(words) - 1 else word + " "
+
+
+BACKENDS = {
+    HuggingFaceBackend.name: HuggingFaceBackend,
+    OpenAICompatibleBackend.name: OpenAICompatibleBackend,
+    MockBackend.name: MockBackend,
+}
+
+
+def create_backend(name="hf", api_token="", model=None, base_url=None, timeout=60.0, max_concurrency=4):
+    """Construit un backend à partir de la configuration (secrets ou ligne de commande)"""
+    if name not in BACKENDS:
+        raise ValueError(f"Backend inconnu : {name} (disponibles : {', '.join(BACKENDS)})")
+
+    options = {"timeout": float(timeout), "max_concurrency": int(max_concurrency)}
+    if model:
+        options["model"] = model
+
+    if name == HuggingFaceBackend.name:
+        return HuggingFaceBackend(api_token, base_url=base_url or None, **options)
+    if name == OpenAICompatibleBackend.name:
+        if base_url:
+            options["base_url"] = base_url
+        return OpenAICompatibleBackend(api_key=api_token, **options)
+    return MockBackend(**options)
@@ -0,0 +1,300 @@
+"""Génération de récits en lot, sans interface Streamlit
+
+Parcourt une grille époques × niveaux tech/social/fantastique × longueurs, génère
+les récits sur un pool de threads borné et les écrit au fil de l'eau dans un
+fichier JSONL. Relancer la même commande reprend là où le lot s'était arrêté.
+
+Usage : python batch.py --output recits/lot.jsonl --concurrency 4
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import product
+
+from backends import BACKENDS, create_backend
+from generation import (
+    EPOCHS,
+    HF_MODEL,
+    GenerationBudget,
+    analyze_text,
+    generate_fallback_story,
+    generate_prompt,
+    generate_story,
+)
+from metrics import REGISTRY
+from retry_policy import CircuitBreaker, RetryPolicy
+
+LENGTHS = ["Court (100-200 mots)", "Moyen (300-500 mots)", "Long (600-800 mots)"]
+
+# Un représentant par palier de generate_prompt (seuils 10 / 40 / 70)
+DEFAULT_LEVELS = [0, 25, 55, 85]
+
+SECRETS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".streamlit", "secrets.toml")
+
+
+def load_api_token():
+    """Lit le token depuis l'environnement, puis depuis .streamlit/secrets.toml"""
+    token = os.environ.get("HUGGINGFACE_API_TOKEN")
+    if token:
+        return token
+    try:
+        import tomllib
+    except ImportError:
+        return ""
+    try:
+        with open(SECRETS_PATH, "rb") as f:
+            return tomllib.load(f).get("HUGGINGFACE_API_TOKEN", "")
+    except (OSError, ValueError):
+        return ""
+
+
+def job_id(epoch, tech, social, fantasy, length, repeat, model=HF_MODEL, backend="hf", reasoning=False):
+    """Identifiant stable d'une génération, utilisé pour la reprise
+
+    Il dépend aussi du backend, du modèle et du mode de réflexion : relancer
+    le lot avec d'autres réglages génère de nouveaux récits au lieu de
+    reprendre ceux des réglages précédents.
+    """
+    payload = json.dumps([epoch, tech, social, fantasy, length, repeat, model, backend, bool(reasoning)],
+                         ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def build_jobs(epochs, tech_levels, social_levels, fantasy_levels, lengths, repeats, model=HF_MODEL,
+               backend="hf", reasoning=False):
+    for epoch, tech, social, fantasy, length, repeat in product(
+            epochs, tech_levels, social_levels, fantasy_levels, lengths, range(repeats)):
+        yield {
+            "job_id": job_id(epoch, tech, social, fantasy, length, repeat, model, backend, reasoning),
+            "epoch": epoch,
+            "tech_level": tech,
+            "social_change": social,
+            "fantasy_elements": fantasy,
+            "story_length": length,
+            "repeat": repeat,
+        }
+
+
+def load_completed(path, retry_fallbacks=False):
+    """Identifiants déjà présents dans le fichier de sortie"""
+    completed = set()
+    if not os.path.exists(path):
+        return completed
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Dernière ligne tronquée par une interruption : elle sera régénérée
+                continue
+            if retry_fallbacks and record.get("is_fallback"):
+                continue
+            completed.add(record["job_id"])
+    return completed
+
+
+def compact_output(path):
+    """Réécrit le fichier de sortie avec un seul enregistrement par identifiant, le plus récent
+
+    Un récit régénéré (--retry-fallbacks, ou lot interrompu puis repris)
+    remplace l'ancien. Les lignes tronquées sont supprimées. Le fichier n'est
+    réécrit que s'il y a des lignes à retirer, via un fichier temporaire du
+    même dossier et os.replace : une interruption laisse l'ancien fichier
+    intact. Renvoie le nombre de lignes retirées.
+    """
+    if not os.path.exists(path):
+        return 0
+    # Première lecture : numéro de la dernière ligne de chaque identifiant
+    latest = {}
+    lines = 0
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f):
+            lines += 1
+            try:
+                latest[json.loads(line)["job_id"]] = number
+            except (ValueError, KeyError):
+                continue
+    kept = set(latest.values())
+    if len(kept) == lines:
+        return 0
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=".lot-", suffix=".jsonl", dir=directory)
+    try:
+        with open(path, encoding="utf-8") as f, os.fdopen(fd, "w", encoding="utf-8") as out:
+            for number, line in enumerate(f):
+                if number in kept:
+                    out.write(line if line.endswith("\n") else line + "\n")
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return lines - len(kept)
+
+
+def run_job(job, backend, retry_policy, breaker, reasoning=False):
+    """Génère un récit pour un point de la grille et renvoie l'enregistrement JSONL"""
+    started = time.perf_counter()
+
+    start = time.perf_counter()
+    prompt = generate_prompt(job["epoch"], job["tech_level"], job["social_change"],
+                             job["fantasy_elements"], job["story_length"])
+    prompt_time = time.perf_counter() - start
+    REGISTRY.observe("prompt_build", prompt_time)
+
+    start = time.perf_counter()
+    budget = GenerationBudget(job["story_length"], reasoning)
+    result = generate_story(prompt, backend, retry_policy, breaker, budget=budget)
+    generation_time = time.perf_counter() - start
+
+    if result is None:
+        story, is_fallback, attempts, call_timings = generate_fallback_story(prompt), True, 0, {}
+    else:
+        story, is_fallback, attempts, call_timings = result.story, result.is_fallback, result.attempts, result.timings
+
+    start = time.perf_counter()
+    analysis = analyze_text(story)
+    analysis_time = time.perf_counter() - start
+
+    REGISTRY.inc("stories_total")
+    if is_fallback:
+        REGISTRY.inc("fallback_stories_total")
+
+    record = dict(job)
+    record.update({
+        "backend": backend.name,
+        "model": backend.model,
+        "reasoning": bool(reasoning),
+        "story": story,
+        "is_fallback": is_fallback,
+        "attempts": attempts,
+        "analysis": analysis,
+        "timings": {
+            "prompt": prompt_time,
+            "generation": generation_time,
+            "upstream": call_timings.get("upstream", 0.0),
+            "retry_wait": call_timings.get("retry_wait", 0.0),
+            "clean": call_timings.get("clean", 0.0),
+            "analysis": analysis_time,
+            "total": time.perf_counter() - started,
+        },
+        "created_at": time.time(),
+    })
+    return record
+
+
+def run_batch(jobs, output, concurrency, backend, retry_policy, breaker, reasoning=False, log=print):
+    """Exécute les générations avec au plus `concurrency` appels en vol"""
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    # Écritures dans le seul thread principal, au fil des générations terminées
+    done = fallbacks = 0
+    jobs = iter(jobs)
+
+    with open(output, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        pending = set()
+        exhausted = False
+        while pending or not exhausted:
+            # Fenêtre bornée : on ne soumet pas toute la grille d'un coup
+            while not exhausted and len(pending) < concurrency * 2:
+                job = next(jobs, None)
+                if job is None:
+                    exhausted = True
+                    break
+                pending.add(pool.submit(run_job, job, backend, retry_policy, breaker, reasoning))
+            if not pending:
+                break
+
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                try:
+                    record = future.result()
+                except Exception as e:
+                    log(f"💥 Génération échouée : {e}")
+                    continue
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                done += 1
+                fallbacks += record["is_fallback"]
+                log(f"✅ {done} récit(s) écrit(s) — {record['epoch']} "
+                    f"({record['timings']['total']:.1f}s{', hors-ligne' if record['is_fallback'] else ''})")
+
+    return done, fallbacks
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default="recits/lot.jsonl", help="fichier JSONL de sortie (repris s'il existe)")
+    parser.add_argument("--epochs", nargs="+", default=list(EPOCHS), choices=list(EPOCHS), metavar="EPOQUE",
+                        help="époques à parcourir (toutes par défaut)")
+    parser.add_argument("--tech", nargs="+", type=int, default=DEFAULT_LEVELS, help="niveaux technologiques")
+    parser.add_argument("--social", nargs="+", type=int, default=DEFAULT_LEVELS, help="niveaux de changement social")
+    parser.add_argument("--fantasy", nargs="+", type=int, default=DEFAULT_LEVELS, help="niveaux fantastiques")
+    parser.add_argument("--lengths", nargs="+", default=LENGTHS, choices=LENGTHS, metavar="LONGUEUR",
+                        help="longueurs de récit (toutes par défaut)")
+    parser.add_argument("--repeat", type=int, default=1, help="nombre de récits par point de la grille")
+    parser.add_argument("--concurrency", type=int, default=4, help="nombre maximal d'appels simultanés")
+    parser.add_argument("--backend", default="hf", choices=list(BACKENDS), help="backend de génération")
+    parser.add_argument("--model", default="", help="modèle à utiliser (celui du backend par défaut)")
+    parser.add_argument("--base-url", default="", help="adresse d'un serveur compatible OpenAI (backend openai)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="délai maximal d'un appel (s)")
+    parser.add_argument("--reasoning", action="store_true",
+                        help="laisse le modèle produire son bloc de réflexion <think> (désactivé par défaut)")
+    parser.add_argument("--retry-fallbacks", action="store_true",
+                        help="régénère les récits précédemment obtenus en mode hors-ligne")
+    parser.add_argument("--metrics", default="",
+                        help="fichier où écrire les métriques en fin de lot (.json ou format Prometheus)")
+    parser.add_argument("--log-level", default="WARNING", help="niveau de journalisation")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    concurrency = max(1, args.concurrency)
+    backend = create_backend(args.backend, api_token=load_api_token(), model=args.model, base_url=args.base_url,
+                             timeout=args.timeout, max_concurrency=concurrency)
+    reason = backend.unavailable_reason()
+    if reason:
+        print(f"⚠️ {reason} Les récits seront générés en mode hors-ligne", file=sys.stderr)
+
+    # Ligne tronquée par une interruption retirée avant d'écrire à la suite
+    compact_output(args.output)
+    completed = load_completed(args.output, args.retry_fallbacks)
+    grid = list(build_jobs(args.epochs, args.tech, args.social, args.fantasy, args.lengths, args.repeat,
+                           backend.model, backend.name, args.reasoning))
+    jobs = [job for job in grid if job["job_id"] not in completed]
+    print(f"📋 {len(jobs)} récit(s) à générer ({len(grid) - len(jobs)} déjà présent(s) dans {args.output} "
+          f"pour {backend.label}{', avec réflexion' if args.reasoning else ''})")
+
+    started = time.perf_counter()
+    done, fallbacks = run_batch(
+        jobs,
+        args.output,
+        concurrency,
+        backend,
+        RetryPolicy(),
+        CircuitBreaker(),
+        args.reasoning,
+    )
+    backend.close()
+    print(f"🏁 {done} récit(s) en {time.perf_counter() - started:.1f}s, dont {fallbacks} en mode hors-ligne")
+    replaced = compact_output(args.output)
+    if replaced:
+        print(f"🧹 {replaced} ligne(s) remplacée(s) ou tronquée(s) retirée(s) de {args.output}")
+    if args.metrics:
+        REGISTRY.write(args.metrics)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""Micro-benchmark du nettoyage des thinking tokens
+
+Vérifie que clean_thinking_tokens donne exactement la même sortie que l'ancienne
+implémentation sur le corpus de réponses SmolLM3, puis mesure le débit (Mo/s)
+des deux versions sur de longues entrées à blocs <think> multiples.
+
+Usage : python benchmarks/bench_clean_thinking.py [--size-mb 4] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from thinking import clean_thinking_tokens  # noqa: E402
+
+FIXTURES = os.path.join(ROOT, "benchmarks", "fixtures", "smollm3_responses.jsonl")
+
+
+# Ancienne implémentation, conservée telle quelle comme référence
+def legacy_clean_thinking_tokens(text):
+    """Extrait le contenu narratif français des thinking tokens"""
+    import re
+    if not text:
+        return text
+
+    # Chercher du contenu narratif français dans toutes les balises <think>
+    story_parts = []
+
+    # Extraire tout le contenu des balises <think>...</think>
+    think_matches = re.findall(r'<think>(.*?)</think>', text, flags=re.DOTALL)
+
+    # Si pas de balises fermées, chercher une balise ouverte
+    if not think_matches:
+        think_match = re.search(r'<think>(.*)', text, flags=re.DOTALL)
+        if think_match:
+            think_matches = [think_match.group(1)]
+
+    # Analyser chaque bloc de thinking pour extraire UNIQUEMENT les parties narratives françaises
+    for think_content in think_matches:
+        lines = think_content.split('\n')
+        french_started = False
+
+        for line in lines:
+            line = line.strip()
+
+            # Détecter le début du récit français (souvent après des analyses en anglais)
+            if not french_started:
+                # Chercher des phrases qui commencent clairement du français
+                if (len(line) > 20 and
+                    (line.startswith('À ') or line.startswith('En ') or line.startswith('Dans ') or
+                     line.startswith('Le ') or line.startswith('La ') or line.startswith('Les ') or
+                     line.startswith('Un ') or line.startswith('Une ')) and
+                    not any(eng in line.lower() for eng in ['in florence', 'check the word', 'technical aspect', 'that seems', 'need to make'])):
+                    french_started = True
+                    story_parts.append(line)
+                continue
+
+            # Une fois le français commencé, continuer tant qu'on est en français
+            if french_started:
+                # Arrêter si on retombe sur de l'anglais d'analyse
+                if any(phrase in line.lower() for phrase in ['check the word', 'word count', 'technical aspect', 'that seems', 'need to make', 'fits the time']):
+                    break
+
+                # Continuer si c'est du français narratif
+                if (len(line) > 10 and
+                    any(word in line.lower() for word in ['dans', 'était', 'sur', 'avec', 'pour', 'une', 'le', 'la', 'les', 'des', 'du', 'de', 'mais', 'alors']) and
+                    not any(phrase in line.lower() for phrase in ['i need', 'i should', 'let me', 'maybe', 'perhaps', 'i think', 'okay'])):
+                    story_parts.append(line)
+                elif line == '':  # Ligne vide acceptable
+                    story_parts.append('')
+
+    # Aussi chercher du contenu français en dehors des balises
+    outside_think = re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL)
+    outside_think = re.sub(r'<think>.*', '', outside_think, flags=re.DOTALL)
+
+    lines = outside_think.split('\n')
+    for line in lines:
+        line = line.strip()
+        if (len(line) > 30 and
+            any(word in line.lower() for word in ['dans', 'était', 'sur', 'avec', 'pour', 'une', 'le', 'la', 'les', 'des', 'du', 'de']) and
+            not any(phrase in line.lower() for phrase in ['i need', 'i should', 'let me', 'maybe', 'perhaps', 'i think', 'okay'])):
+            story_parts.append(line)
+
+    # Assembler le récit
+    if story_parts:
+        cleaned = '\n\n'.join(story_parts)
+        # Nettoyer les espaces multiples
+        cleaned = re.sub(r'  +', ' ', cleaned)
+        return cleaned.strip()
+
+    # Si rien trouvé, fallback sur l'ancien algorithme
+    cleaned = re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL)
+    cleaned = re.sub(r'<think>.*', '', cleaned, flags=re.DOTALL)
+    return cleaned.strip()
+
+
+def load_fixtures():
+    with open(FIXTURES, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def check_equivalence(fixtures):
+    mismatches = [
+        fixture["id"] for fixture in fixtures
+        if clean_thinking_tokens(fixture["text"]) != legacy_clean_thinking_tokens(fixture["text"])
+    ]
+    for fixture_id in mismatches:
+        print(f"❌ Sortie différente pour la fixture : {fixture_id}")
+    return not mismatches
+
+
+def build_large_input(fixtures, size_mb):
+    # Concatène les réponses en un long texte à blocs <think> multiples
+    texts = [fixture["text"] for fixture in fixtures if fixture["text"]]
+    target = int(size_mb * 1024 * 1024)
+    parts = []
+    total = 0
+    while total < target:
+        for text in texts:
+            parts.append(text)
+            total += len(text.encode("utf-8"))
+    return "\n".join(parts)
+
+
+def measure(function, text, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=4.0, help="taille de l'entrée de benchmark")
+    parser.add_argument("--repeat", type=int, default=5, help="nombre de mesures (on garde la meilleure)")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures()
+    if not check_equivalence(fixtures):
+        return 1
+    print(f"✅ Sorties identiques sur {len(fixtures)} fixtures")
+
+    text = build_large_input(fixtures, args.size_mb)
+    if clean_thinking_tokens(text) != legacy_clean_thinking_tokens(text):
+        print("❌ Sortie différente sur l'entrée de benchmark")
+        return 1
+
+    size_mb = len(text.encode("utf-8")) / (1024 * 1024)
+    legacy_time = measure(legacy_clean_thinking_tokens, text, args.repeat)
+    new_time = measure(clean_thinking_tokens, text, args.repeat)
+
+    print(f"Entrée : {size_mb:.1f} Mo, {text.count('<think>')} blocs <think>")
+    print(f"Ancienne implémentation : {size_mb / legacy_time:8.1f} Mo/s")
+    print(f"Implémentation actuelle : {size_mb / new_time:8.1f} Mo/s (x{legacy_time / new_time:.1f})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
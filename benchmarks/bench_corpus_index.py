@@ -0,0 +1,110 @@
+"""Benchmark de l'index du corpus : coût d'une insertion et des requêtes
+
+Remplit un historique temporaire de récits du moteur hors-ligne par paliers
+de taille. À chaque palier, mesure l'indexation d'un seul nouveau récit
+(qui doit rester constante quand le corpus grandit) et les requêtes servies
+par les agrégats (distribution de divergence, TF-IDF, recherche), comparées
+à un recalcul complet depuis la table des récits.
+
+Usage :
+    python benchmarks/bench_corpus_index.py --sizes 100 1000 3000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from corpus_index import CorpusIndex, query_stems  # noqa: E402
+from generation import EPOCHS, WORD_RANGES, divergence_bucket  # noqa: E402
+from offline_engine import get_engine  # noqa: E402
+from story_record import StoryRecord  # noqa: E402
+from story_store import StoryStore  # noqa: E402
+from text_analysis import analyze, content_frequencies, divergence_score, stem, word_frequencies  # noqa: E402
+
+
+def make_record(rng):
+    epoch = rng.choice(list(EPOCHS))
+    levels = [rng.randint(0, 100) for _ in range(3)]
+    story_length = rng.choice(list(WORD_RANGES))
+    buckets = tuple(divergence_bucket(level) for level in levels)
+    story = get_engine().generate(epoch, buckets, story_length, rng)
+    return StoryRecord(story, epoch, *levels, story_length, analyze(story))
+
+
+def recompute(store, epoch, query):
+    """Sans index : divergence par époque, mots d'une époque et recherche en reparcourant tout"""
+    scores = {}
+    terms = Counter()
+    doc_freqs = Counter()
+    matches = []
+    stems = set(query_stems(query))
+    rows = store._connection().execute("SELECT id, epoch, story FROM stories").fetchall()
+    for story_id, story_epoch, story in rows:
+        frequencies = word_frequencies(story)
+        content = content_frequencies(frequencies)
+        scores.setdefault(story_epoch, []).append(divergence_score(frequencies))
+        doc_freqs.update(content.keys())
+        if story_epoch == epoch:
+            terms.update(content)
+        if any(stem(word) in stems for word in content):
+            matches.append(story_id)
+    return scores, terms.most_common(10), matches
+
+
+def timed(fn, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 3000], help="tailles de corpus")
+    parser.add_argument("--inserts", type=int, default=20, help="insertions mesurées à chaque palier")
+    parser.add_argument("--query", default="machine étrange", help="requête plein texte mesurée")
+    parser.add_argument("--seed", type=int, default=0, help="graine des récits")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rng = random.Random(args.seed)
+    epoch = next(iter(EPOCHS))
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "stories.sqlite3")
+        store = StoryStore(path)
+        index = CorpusIndex(path)
+        print(f"{'récits':>7} | {'insertion':>10} | {'divergence':>10} | {'tf-idf':>8} | "
+              f"{'recherche':>9} | {'recalcul':>9}")
+        for size in sorted(args.sizes):
+            # Remplissage jusqu'au palier, indexé par lots
+            while store.count() < size - args.inserts:
+                store.append(make_record(rng))
+            index.sync()
+
+            # Insertion d'un récit puis indexation de ce seul récit
+            insert = 0.0
+            for _ in range(args.inserts):
+                store.append(make_record(rng))
+                insert += timed(index.sync)
+            insert /= args.inserts
+
+            distribution = timed(lambda: index.divergence_distribution("epoch"), 5)
+            top_terms = timed(lambda: index.top_terms("epoch", epoch, 10), 5)
+            search = timed(lambda: index.search(args.query), 5)
+            full = timed(lambda: recompute(store, epoch, args.query))
+            print(f"{store.count():>7} | {insert * 1000:>7.2f} ms | {distribution * 1000:>7.2f} ms | "
+                  f"{top_terms * 1000:>5.1f} ms | {search * 1000:>6.1f} ms | {full * 1000:>6.0f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
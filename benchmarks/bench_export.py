@@ -0,0 +1,95 @@
+"""Benchmark de l'export des récits : débit et mémoire selon la taille de l'export
+
+Remplit un historique temporaire de récits du moteur hors-ligne, puis
+exporte tout l'historique dans chaque format en mesurant la durée et le pic
+de mémoire Python (tracemalloc). L'ancienne approche (tous les récits
+chargés en mémoire avant l'écriture) est mesurée pour comparaison : son pic
+grandit avec l'export, celui de l'export par lots reste stable.
+
+Usage :
+    python benchmarks/bench_export.py --sizes 1000 5000
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from generation import EPOCHS, WORD_RANGES, divergence_bucket  # noqa: E402
+from offline_engine import get_engine  # noqa: E402
+from story_export import FORMATS, export_rows, store_rows  # noqa: E402
+from story_record import StoryRecord  # noqa: E402
+from story_store import StoryStore  # noqa: E402
+from text_analysis import analyze  # noqa: E402
+
+
+def fill(store, size, rng, stories):
+    while store.count() < size:
+        epoch = rng.choice(list(EPOCHS))
+        levels = [rng.randint(0, 100) for _ in range(3)]
+        story_length = rng.choice(list(WORD_RANGES))
+        key = (epoch, tuple(divergence_bucket(level) for level in levels), story_length)
+        if key not in stories:
+            stories[key] = get_engine().generate(*key, rng)
+        story = stories[key]
+        store.append(StoryRecord(story, epoch, *levels, story_length, analyze(story),
+                                 generation_time=rng.uniform(1, 20)))
+
+
+def load_all(store, out):
+    """Ancienne approche : la liste complète des récits en mémoire, puis un seul document JSON"""
+    rows = [row for row in store_rows(store)]
+    out.write(json.dumps(rows, ensure_ascii=False).encode("utf-8"))
+    return len(rows)
+
+
+def measure(fn, path):
+    tracemalloc.start()
+    start = time.perf_counter()
+    with open(path, "wb") as out:
+        count = fn(out)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return count, elapsed, peak, os.path.getsize(path)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000], help="tailles d'historique")
+    parser.add_argument("--formats", nargs="+", choices=list(FORMATS), default=list(FORMATS))
+    parser.add_argument("--seed", type=int, default=0, help="graine des récits")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rng = random.Random(args.seed)
+    stories = {}
+    if "parquet" in args.formats:
+        # Import et initialisation de pyarrow hors mesure
+        export_rows(iter(()), "parquet", io.BytesIO())
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = StoryStore(os.path.join(directory, "stories.sqlite3"))
+        print(f"{'récits':>7} | {'export':<12} | {'durée':>9} | {'récits/s':>9} | {'pic mémoire':>11} | {'fichier':>9}")
+        for size in sorted(args.sizes):
+            fill(store, size, rng, stories)
+            runs = [(fmt, lambda out, fmt=fmt: export_rows(store_rows(store), fmt, out)) for fmt in args.formats]
+            runs.append(("tout charger", lambda out: load_all(store, out)))
+            for name, fn in runs:
+                count, elapsed, peak, file_size = measure(fn, os.path.join(directory, "export"))
+                print(f"{count:>7} | {name:<12} | {elapsed * 1000:>6.0f} ms | {count / elapsed:>9.0f} | "
+                      f"{peak / 1e6:>8.1f} Mo | {file_size / 1e6:>6.1f} Mo")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
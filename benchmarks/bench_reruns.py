@@ -0,0 +1,158 @@
+"""Benchmark des réexécutions de l'interface, interaction par interaction
+
+Streamlit réexécute le script à chaque interaction : app.py est découpé en
+fragments (paramètres, historique, analyse) pour qu'un réglage ne réexécute
+que son panneau. AppTest, lui, réexécute toujours la page entière : chaque
+fragment chronomètre donc ses exécutions (étapes ui_*), et le coût d'une
+interaction limitée à un fragment est la durée mesurée pour ce fragment.
+La durée de la page entière est rapportée à titre de comparaison.
+
+Usage :
+    python benchmarks/bench_reruns.py
+    python benchmarks/bench_reruns.py --check --scale 3   # en CI, budgets élargis
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import streamlit as st
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+from generation import EPOCHS, analyze_text, generate_fallback_story  # noqa: E402
+from metrics import REGISTRY  # noqa: E402
+from story_record import StoryRecord  # noqa: E402
+from story_store import StoryStore  # noqa: E402
+
+# Budget de réexécution par interaction (ms) et fragment concerné (None : page entière)
+INTERACTIONS = {
+    "first_run": (None, 1500),
+    "generate": (None, 1500),
+    "slider": ("ui_sidebar", 50),
+    "epoch": ("ui_sidebar", 50),
+    "story_length": ("ui_sidebar", 50),
+    "history_page": ("ui_history", 150),
+    "history_sort": ("ui_history", 150),
+    "history_filter": ("ui_history", 150),
+    "history_expand": ("ui_history", 150),
+    "reload": (None, 1000),
+}
+
+HISTORY_SIZE = 25
+
+# Session propriétaire de l'historique pré-rempli : l'application n'affiche que ses récits
+OWNER = "bench"
+
+
+def seed_history(path, size):
+    store = StoryStore(path)
+    epochs = list(EPOCHS)
+    for index in range(size):
+        story = generate_fallback_story(f"Récit {index}")
+        store.append(StoryRecord(
+            story,
+            epochs[index % len(epochs)],
+            (index * 7) % 100,
+            (index * 13) % 100,
+            (index * 17) % 100,
+            "Court (100-200 mots)",
+            analyze_text(story),
+        ), owner=OWNER)
+
+
+def make_app(directory):
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=120)
+    at.secrets["STORY_STORE_PATH"] = os.path.join(directory, "stories.sqlite3")
+    at.secrets["STORY_CACHE_PATH"] = os.path.join(directory, "cache.sqlite3")
+    at.secrets["STORY_CACHE_POLICY"] = "off"
+    at.secrets["GENERATION_BACKEND"] = "mock"
+    at.secrets["PREGEN_BUDGET_PER_HOUR"] = 0
+    at.secrets["ADMISSION_RATE_PER_MINUTE"] = 0
+    at.query_params["historique"] = OWNER
+    return at
+
+
+def actions(at, round_index):
+    """Interactions jouées dans l'ordre, chacune suivie d'une exécution"""
+    epochs = list(EPOCHS)
+    return [
+        ("first_run", lambda: at),
+        ("generate", lambda: at.button[0].click()),
+        ("slider", lambda: at.slider(key="tech_level").set_value(10 + round_index % 80)),
+        ("epoch", lambda: at.selectbox(key="selected_epoch").set_value(epochs[round_index % len(epochs)])),
+        ("story_length", lambda: at.selectbox(key="story_length").set_value("Moyen (300-500 mots)")),
+        ("history_page", lambda: at.number_input(key="history_page").set_value(2)),
+        ("history_sort", lambda: at.selectbox(key="history_order").set_value("Divergence décroissante")),
+        ("history_filter", lambda: at.slider(key="history_tech").set_value((0, 80))),
+        ("history_expand", lambda: next(b for b in at.button if b.key and b.key.startswith("expand_")).click()),
+        ("reload", lambda: next(b for b in at.button if b.key and b.key.startswith("reload_")).click()),
+    ]
+
+
+def measure_round(round_index, history_size=HISTORY_SIZE):
+    """Durées (s) de chaque interaction : page entière et partie réexécutée par Streamlit"""
+    timings = {}
+    # Ressources partagées (stockage, backend) : recréées pour chaque dossier temporaire
+    st.cache_resource.clear()
+    with tempfile.TemporaryDirectory() as directory:
+        seed_history(os.path.join(directory, "stories.sqlite3"), history_size)
+        at = make_app(directory)
+        for name, action in actions(at, round_index):
+            action()
+            REGISTRY.reset()
+            start = time.perf_counter()
+            at.run()
+            full = time.perf_counter() - start
+            if at.exception:
+                raise RuntimeError(f"{name} : {at.exception[0].value}")
+            stage = INTERACTIONS[name][0]
+            histogram = REGISTRY.snapshot()["histograms"].get(stage) if stage else None
+            timings[name] = {"full": full, "rerun": histogram["sum"] if histogram else full}
+    return timings
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="nombre de mesures (médiane retenue)")
+    parser.add_argument("--check", action="store_true", help="code de sortie 1 si un budget est dépassé")
+    parser.add_argument("--scale", type=float, default=1.0, help="facteur appliqué aux budgets (machines lentes)")
+    parser.add_argument("--history-size", type=int, default=HISTORY_SIZE,
+                        help="récits dans l'historique (le coût de l'historique ne doit pas en dépendre)")
+    parser.add_argument("--output", default="", help="fichier JSON où écrire les mesures")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rounds = [measure_round(index, args.history_size) for index in range(max(1, args.repeat))]
+
+    report = {}
+    print(f"{'Interaction':15s} {'Fragment':12s} {'Page (ms)':>10s} {'Rerun (ms)':>11s} {'Budget (ms)':>12s}")
+    for name, (stage, budget) in INTERACTIONS.items():
+        full = statistics.median(run[name]["full"] for run in rounds) * 1000
+        rerun = statistics.median(run[name]["rerun"] for run in rounds) * 1000
+        budget *= args.scale
+        report[name] = {"fragment": stage, "full_ms": full, "rerun_ms": rerun, "budget_ms": budget}
+        flag = "" if rerun <= budget else "  ❌"
+        print(f"{name:15s} {stage or 'page':12s} {full:10.1f} {rerun:11.1f} {budget:12.0f}{flag}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    over = [name for name, entry in report.items() if entry["rerun_ms"] > entry["budget_ms"]]
+    if args.check and over:
+        print(f"❌ Budget dépassé : {', '.join(over)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""Benchmark de la mémoire retenue par session Streamlit
+
+Simule N sessions avec AppTest : chacune génère quelques récits (backend
+mock) puis recharge un récit de l'historique. Mesure ensuite la taille de
+session_state de chaque session, objets partagés comptés une seule fois,
+et celle du cache de récits du stockage, commun à toutes les sessions.
+L'ancien format (récit, analyse et paramètres copiés dans la session) est
+reconstitué sur les mêmes récits pour comparaison.
+
+Usage :
+    python benchmarks/bench_session_memory.py --sessions 50
+    python benchmarks/bench_session_memory.py --check --max-bytes-per-session 4096
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+
+import streamlit as st
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+from generation import EPOCHS, analyze_text  # noqa: E402
+from story_store import StoryStore  # noqa: E402
+
+
+def deep_size(obj, seen):
+    """Taille (octets) de obj et de ce qu'il référence, hors objets déjà vus"""
+    if id(obj) in seen or isinstance(obj, type):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(key, seen) + deep_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen) for item in obj)
+    else:
+        for slot in getattr(type(obj), "__slots__", ()):
+            size += deep_size(getattr(obj, slot, None), seen)
+        if hasattr(obj, "__dict__"):
+            size += deep_size(vars(obj), seen)
+    return size
+
+
+def legacy_state(record):
+    """Contenu de session_state dans l'ancien format, pour le même récit affiché"""
+    story = "".join(list(record.story))  # copie distincte, comme un récit reçu du modèle
+    return {
+        'current_story': story,
+        'current_analysis': analyze_text(story),
+        'current_params': {
+            'tech': record.tech_level,
+            'social': record.social_change,
+            'fantasy': record.fantasy_elements,
+            'length': record.story_length,
+        },
+    }
+
+
+def simulate(directory, sessions, clicks):
+    """Sessions AppTest ayant chacune généré `clicks` récits"""
+    apps = []
+    epochs = list(EPOCHS)
+    for index in range(sessions):
+        rng = random.Random(index)
+        at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=120)
+        at.secrets["STORY_STORE_PATH"] = os.path.join(directory, "stories.sqlite3")
+        at.secrets["STORY_CACHE_PATH"] = os.path.join(directory, "cache.sqlite3")
+        at.secrets["STORY_CACHE_POLICY"] = "off"
+        at.secrets["GENERATION_BACKEND"] = "mock"
+        at.secrets["PREGEN_BUDGET_PER_HOUR"] = 0
+        at.secrets["ADMISSION_RATE_PER_MINUTE"] = 0
+        at.run()
+        for _ in range(clicks):
+            at.selectbox(key="selected_epoch").set_value(rng.choice(epochs))
+            at.slider(key="tech_level").set_value(rng.randint(0, 100))
+            at.button[0].click().run()
+        # Rechargement d'un récit de l'historique, après l'avoir déplié
+        expand = [button for button in at.button if button.key and button.key.startswith("expand_")]
+        if expand:
+            rng.choice(expand).click().run()
+        reload = [button for button in at.button if button.key and button.key.startswith("reload_")]
+        if reload:
+            reload[0].click().run()
+        if at.exception:
+            raise RuntimeError(at.exception[0].value)
+        apps.append(at)
+    return apps
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=20, help="nombre de sessions simulées")
+    parser.add_argument("--clicks", type=int, default=3, help="récits générés par session")
+    parser.add_argument("--check", action="store_true", help="code de sortie 1 si le maximum est dépassé")
+    parser.add_argument("--max-bytes-per-session", type=int, default=4096,
+                        help="taille maximale de session_state par session (octets)")
+    parser.add_argument("--output", default="", help="fichier JSON où écrire les mesures")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    st.cache_resource.clear()
+
+    with tempfile.TemporaryDirectory() as directory:
+        apps = simulate(directory, args.sessions, args.clicks)
+
+        # Stockage partagé par les sessions (st.cache_resource), retrouvé parmi les objets vivants
+        store = next(obj for obj in gc.get_objects() if isinstance(obj, StoryStore))
+
+        seen = set()
+        states = [app.session_state.to_dict() for app in apps]
+        session_bytes = sum(deep_size(state, seen) for state in states)
+        shared_bytes = deep_size(list(store._records.values()), seen)
+
+        legacy_seen = set()
+        legacy_bytes = 0
+        for state in states:
+            record = store.get(state.get('current_story_id'))
+            if record is not None:
+                widgets = {key: value for key, value in state.items() if key != 'current_story_id'}
+                legacy_bytes += deep_size(dict(widgets, **legacy_state(record)), legacy_seen)
+
+    sessions = max(1, len(apps))
+    report = {
+        "sessions": len(apps),
+        "session_state_bytes_per_session": session_bytes / sessions,
+        "shared_record_cache_bytes": shared_bytes,
+        "legacy_session_state_bytes_per_session": legacy_bytes / sessions,
+    }
+    print(f"Sessions : {len(apps)} ({args.clicks} récits chacune)")
+    print(f"session_state : {report['session_state_bytes_per_session']:.0f} octets par session")
+    print(f"Cache de récits partagé : {shared_bytes / 1024:.1f} Ko pour tout le processus")
+    print(f"Ancien format : {report['legacy_session_state_bytes_per_session']:.0f} octets par session")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.check and report["session_state_bytes_per_session"] > args.max_bytes_per_session:
+        print(f"❌ Plus de {args.max_bytes_per_session} octets par session")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""Benchmark du démarrage à froid : temps d'import et premier affichage
+
+Chaque mesure tourne dans un interpréteur neuf. La première partie relève,
+avec `python -X importtime`, le coût d'import de chaque module du projet
+(Streamlit déjà chargé, puisqu'il l'est toujours). La seconde exécute une
+première fois app.py avec AppTest, comme au premier affichage d'une page, et
+vérifie qu'aucune bibliothèque lourde inutile au premier écran n'a été chargée.
+
+Usage :
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --check --max-first-run 5   # en CI
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules importés par app.py
+PROJECT_MODULES = [
+    "metrics", "thinking", "retry_policy", "backends", "generation", "story_cache", "story_record", "story_store",
+    "text_analysis", "rendering", "admission", "single_flight", "warm_pool", "offline_engine",
+    "corpus_index", "story_export",
+]
+
+# Bibliothèques qui ne doivent pas être chargées avant le premier récit
+LAZY_MODULES = ["matplotlib", "wordcloud", "pandas", "huggingface_hub"]
+
+FIRST_RUN_SCRIPT = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({app!r}, default_timeout=120)
+at.secrets["STORY_STORE_PATH"] = {store!r}
+at.secrets["STORY_CACHE_PATH"] = {cache!r}
+at.secrets["PREGEN_BUDGET_PER_HOUR"] = 0
+start = time.perf_counter()
+at.run()
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "exception": [str(e.value) for e in at.exception],
+    "loaded": [name for name in {lazy!r} if name in sys.modules],
+}}))
+"""
+
+
+def parse_importtime(stderr):
+    """Temps cumulé (s) de chaque import de premier niveau, d'après -X importtime"""
+    timings = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Les imports imbriqués sont indentés : seuls ceux de premier niveau sont gardés
+        if name.startswith("  "):
+            continue
+        timings[name.strip()] = int(cumulative) / 1e6
+    return timings
+
+
+def measure_imports(modules):
+    """Coût d'import de chaque module du projet, Streamlit étant déjà chargé"""
+    code = "import streamlit\n" + "".join(f"import {module}\n" for module in modules)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    timings = parse_importtime(result.stderr)
+    return {
+        "streamlit": timings.get("streamlit"),
+        "modules": {module: timings.get(module, 0.0) for module in modules},
+    }
+
+
+def measure_first_run():
+    with tempfile.TemporaryDirectory() as directory:
+        script = FIRST_RUN_SCRIPT.format(
+            app=os.path.join(ROOT, "app.py"),
+            store=os.path.join(directory, "stories.sqlite3"),
+            cache=os.path.join(directory, "cache.sqlite3"),
+            lazy=LAZY_MODULES,
+        )
+        result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(f"Échec du premier affichage :\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="nombre de mesures (médiane retenue)")
+    parser.add_argument("--check", action="store_true",
+                        help="code de sortie 1 si une bibliothèque lourde est chargée au premier affichage")
+    parser.add_argument("--max-first-run", type=float, default=0.0,
+                        help="durée maximale du premier affichage (s), 0 pour ne pas la vérifier")
+    parser.add_argument("--output", default="", help="fichier JSON où écrire les mesures")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    repeat = max(1, args.repeat)
+
+    imports = [measure_imports(PROJECT_MODULES) for _ in range(repeat)]
+    streamlit_time = statistics.median(run["streamlit"] for run in imports)
+    module_times = {
+        module: statistics.median(run["modules"][module] for run in imports) for module in PROJECT_MODULES
+    }
+    print(f"Import de streamlit : {streamlit_time * 1000:.0f} ms")
+    for module, seconds in sorted(module_times.items(), key=lambda item: -item[1]):
+        print(f"  {module:15s} {seconds * 1000:8.1f} ms")
+    print(f"Modules du projet : {sum(module_times.values()) * 1000:.0f} ms")
+
+    first_runs = [measure_first_run() for _ in range(repeat)]
+    first_run = statistics.median(run["seconds"] for run in first_runs)
+    loaded = sorted(set(name for run in first_runs for name in run["loaded"]))
+    exceptions = [message for run in first_runs for message in run["exception"]]
+    print(f"Premier affichage (AppTest) : {first_run:.3f} s")
+    print(f"Bibliothèques lourdes chargées : {', '.join(loaded) if loaded else 'aucune'}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "streamlit_import": streamlit_time,
+                "module_imports": module_times,
+                "first_run": first_run,
+                "lazy_modules_loaded": loaded,
+            }, f, ensure_ascii=False, indent=2)
+
+    failures = []
+    if exceptions:
+        failures.append(f"exception au premier affichage : {exceptions[0]}")
+    if args.check and loaded:
+        failures.append(f"chargées au premier affichage : {', '.join(loaded)}")
+    if args.max_first_run and first_run > args.max_first_run:
+        failures.append(f"premier affichage en {first_run:.2f} s (maximum {args.max_first_run} s)")
+    for failure in failures:
+        print(f"❌ {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
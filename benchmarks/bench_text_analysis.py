@@ -0,0 +1,97 @@
+"""Benchmark de l'analyse de texte : tokenisation partagée et analyse par lots
+
+Compare, sur des récits du moteur hors-ligne, l'ancienne chaîne (analyse
+puis seconde tokenisation par WordCloud.process_text) à la table de
+fréquences unique de text_analysis.py, et mesure le débit de l'analyse par
+lots utilisée pour recalculer un historique.
+
+Usage :
+    python benchmarks/bench_text_analysis.py --stories 500
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from generation import EPOCHS, WORD_RANGES  # noqa: E402
+from offline_engine import get_engine  # noqa: E402
+from text_analysis import analyze_many, content_frequencies, summarize, word_frequencies  # noqa: E402
+
+_LEGACY_PATTERN = re.compile(r'\b\w+\b')
+_LEGACY_INDICATORS = ['alternative', 'différent', 'inhabituel', 'étrange', 'mystérieux',
+                      'inexpliqué', 'nouveau', 'révolutionnaire', 'impossible', 'magique']
+
+
+def legacy_analysis(text):
+    """Analyse d'origine : liste d'indicateurs reconstruite à chaque appel, mots vides compris"""
+    words = _LEGACY_PATTERN.findall(text.lower())
+    indicators = list(_LEGACY_INDICATORS)
+    score = sum(1 for word in words if word in indicators)
+    return {
+        'word_count': len(words),
+        'common_words': Counter(words).most_common(10),
+        'parallel_score': (score / len(words)) * 100 if words else 0,
+    }
+
+
+def make_corpus(size, seed):
+    rng = random.Random(seed)
+    engine = get_engine()
+    epochs = list(EPOCHS)
+    lengths = list(WORD_RANGES)
+    return [
+        engine.generate(rng.choice(epochs), tuple(rng.randint(0, 3) for _ in range(3)), rng.choice(lengths), rng)
+        for _ in range(size)
+    ]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stories", type=int, default=300, help="nombre de récits analysés")
+    parser.add_argument("--seed", type=int, default=0, help="graine du corpus")
+    parser.add_argument("--no-wordcloud", action="store_true", help="sans la tokenisation de WordCloud")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    corpus = make_corpus(args.stories, args.seed)
+    words = sum(len(text.split()) for text in corpus)
+    print(f"Corpus : {len(corpus)} récits, {words} mots")
+
+    legacy = timed(lambda: [legacy_analysis(text) for text in corpus])
+    shared = timed(lambda: [summarize(word_frequencies(text)) for text in corpus])
+    batch = timed(lambda: analyze_many(corpus))
+    print(f"Analyse d'origine      : {legacy * 1000:8.1f} ms ({len(corpus) / legacy:8.0f} récits/s)")
+    print(f"Table de fréquences    : {shared * 1000:8.1f} ms ({len(corpus) / shared:8.0f} récits/s)")
+    print(f"Analyse par lots       : {batch * 1000:8.1f} ms ({len(corpus) / batch:8.0f} récits/s)")
+
+    if not args.no_wordcloud:
+        from wordcloud import WordCloud
+        cloud = WordCloud()
+        # Avant : WordCloud retokenisait chaque récit ; après : fréquences tirées de la table de l'analyse
+        tokenize = timed(lambda: [cloud.process_text(text) for text in corpus])
+        reuse = timed(lambda: [content_frequencies(word_frequencies(text)) for text in corpus])
+        print(f"Nuage, process_text    : {tokenize * 1000:8.1f} ms")
+        print(f"Nuage, table partagée  : {reuse * 1000:8.1f} ms")
+        top = Counter(cloud.process_text(corpus[0])).most_common(5)
+        print(f"  mots du nuage avant : {', '.join(word for word, _ in top)}")
+        top = Counter(content_frequencies(word_frequencies(corpus[0]))).most_common(5)
+        print(f"  mots du nuage après : {', '.join(word for word, _ in top)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
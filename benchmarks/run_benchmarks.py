@@ -0,0 +1,297 @@
+"""Suite de benchmarks du parcours de génération complet
+
+Lance le serveur de test local, puis simule N sessions concurrentes qui
+enchaînent generate_prompt → appel du modèle → clean_thinking_tokens →
+analyze_text → nuage de mots. Rapporte les latences p50/p95/p99 par clic servi
+par le modèle (les clics passés en mode hors-ligne à part), le débit et la
+mémoire retenue par session, et compare au fichier de référence.
+
+Usage :
+    python benchmarks/run_benchmarks.py --sessions 8 --clicks 5
+    python benchmarks/run_benchmarks.py --save-baseline        # enregistre la référence
+    python benchmarks/run_benchmarks.py --fail-on-regression   # code de sortie 1 si régression
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_server import StubConfig, StubServer  # noqa: E402
+
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+# Sens de chaque indicateur : True si une valeur plus basse est meilleure
+INDICATORS = {
+    "latency_p50": True,
+    "latency_p95": True,
+    "latency_p99": True,
+    "ttft_p50": True,
+    "throughput": False,
+    "memory_per_session_kb": True,
+}
+
+
+def percentile(values, q):
+    """Percentile par interpolation linéaire"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def simulate_session(session_index, clicks, streaming, wordcloud, backend, retry_policy, breaker, results, retained):
+    """Une session : plusieurs clics successifs, résultats conservés comme dans session_state"""
+    from generation import (EPOCHS, GenerationBudget, analyze_text, generate_prompt, generate_story,
+                            stream_story_chunks)
+    from thinking import ThinkingStreamFilter, clean_thinking_tokens
+
+    rng = random.Random(session_index)
+    lengths = ["Court (100-200 mots)", "Moyen (300-500 mots)", "Long (600-800 mots)"]
+    session_state = []
+
+    for _ in range(clicks):
+        start = time.perf_counter()
+        length = rng.choice(lengths)
+        prompt = generate_prompt(rng.choice(list(EPOCHS)), rng.randint(0, 100), rng.randint(0, 100),
+                                 rng.randint(0, 100), length)
+        budget = GenerationBudget(length)
+        ttft = None
+        is_fallback = False
+
+        if streaming:
+            stream_filter = ThinkingStreamFilter()
+            try:
+                for chunk in stream_story_chunks(prompt, backend, breaker, budget):
+                    if ttft is None:
+                        ttft = time.perf_counter() - start
+                    stream_filter.feed(chunk)
+                story = clean_thinking_tokens(stream_filter.raw_text) or ""
+            except Exception:
+                story = ""
+            if len(story) <= 20:
+                result = generate_story(prompt, backend, retry_policy, breaker, budget=budget)
+                story, is_fallback = result.story, result.is_fallback
+        else:
+            result = generate_story(prompt, backend, retry_policy, breaker, budget=budget)
+            story, is_fallback = result.story, result.is_fallback
+
+        analysis = analyze_text(story)
+        png = None
+        if wordcloud:
+            from rendering import render_wordcloud_png
+            png = render_wordcloud_png(story)
+
+        results.append({
+            "latency": time.perf_counter() - start,
+            "ttft": ttft,
+            "is_fallback": is_fallback,
+        })
+        session_state.append((story, analysis, png))
+
+    retained[session_index] = session_state
+
+
+def run_suite(args):
+    from backends import create_backend
+    from metrics import REGISTRY
+    from retry_policy import CircuitBreaker, RetryPolicy
+
+    config = StubConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        token_latency=args.token_latency,
+        error_503=args.error_503,
+        error_429=args.error_429,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+
+    with StubServer(config) as server:
+        backend = create_backend(args.backend, api_token="stub-token", base_url=server.base_url,
+                                 max_concurrency=args.sessions)
+        REGISTRY.reset()
+        retry_policy = RetryPolicy(base_delay=0.05, max_delay=max(1.0, args.retry_after), max_total_wait=5.0)
+        breaker = CircuitBreaker()
+
+        # Échauffement : imports et premier client hors mesure
+        simulate_session(-1, 1, args.stream, args.wordcloud, backend, retry_policy, breaker, [], {})
+        REGISTRY.reset()
+
+        results = []
+        retained = {}
+        tracemalloc.start()
+        baseline_memory = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+
+        threads = [
+            threading.Thread(target=simulate_session, args=(
+                index, args.clicks, args.stream, args.wordcloud, backend, retry_policy, breaker, results, retained))
+            for index in range(args.sessions)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        wall_time = time.perf_counter() - started
+        retained_memory = tracemalloc.get_traced_memory()[0] - baseline_memory
+        tracemalloc.stop()
+        upstream_requests = config.requests
+        backend.close()
+
+    # Latences du modèle seul : les fixtures qui se nettoient en un texte trop court
+    # (only_reasoning_english, recombined_tag) passent par le moteur hors-ligne
+    latencies = [r["latency"] for r in results if not r["is_fallback"]]
+    fallback_latencies = [r["latency"] for r in results if r["is_fallback"]]
+    ttfts = [r["ttft"] for r in results if r["ttft"] is not None]
+    stages = {
+        name: {"count": h["count"], "mean": h["sum"] / h["count"] if h["count"] else None}
+        for name, h in REGISTRY.snapshot()["histograms"].items()
+    }
+
+    return {
+        "config": {
+            "backend": args.backend,
+            "sessions": args.sessions,
+            "clicks": args.clicks,
+            "stream": args.stream,
+            "wordcloud": args.wordcloud,
+            "latency": args.latency,
+            "token_latency": args.token_latency,
+            "error_503": args.error_503,
+            "error_429": args.error_429,
+            "retry_after": args.retry_after,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "commit": current_commit(),
+        },
+        "results": {
+            "requests": len(results),
+            "upstream_requests": upstream_requests,
+            "fallbacks": sum(r["is_fallback"] for r in results),
+            "latency_p50": percentile(latencies, 0.50),
+            "latency_p95": percentile(latencies, 0.95),
+            "latency_p99": percentile(latencies, 0.99),
+            "fallback_latency_p50": percentile(fallback_latencies, 0.50),
+            "ttft_p50": percentile(ttfts, 0.50),
+            "throughput": len(results) / wall_time if wall_time else None,
+            "memory_per_session_kb": retained_memory / 1024 / max(1, args.sessions),
+        },
+        "stages": stages,
+    }
+
+
+def current_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline, tolerance):
+    """Liste des régressions au-delà de la tolérance relative"""
+    regressions = []
+    for name, lower_is_better in INDICATORS.items():
+        current = report["results"].get(name)
+        reference = baseline["results"].get(name)
+        if current is None or not reference:
+            continue
+        change = (current - reference) / reference
+        worse = change > tolerance if lower_is_better else change < -tolerance
+        marker = "❌" if worse else "  "
+        print(f"{marker} {name:24s} {reference:12.4f} → {current:12.4f} ({change:+.1%})")
+        if worse:
+            regressions.append(name)
+    return regressions
+
+
+def print_report(report):
+    results = report["results"]
+    print(f"Sessions : {report['config']['sessions']} × {report['config']['clicks']} clics "
+          f"({'streaming' if report['config']['stream'] else 'classique'})")
+    print(f"Latence par clic (modèle) : p50 {results['latency_p50']:.3f}s · p95 {results['latency_p95']:.3f}s "
+          f"· p99 {results['latency_p99']:.3f}s")
+    if results["fallback_latency_p50"] is not None:
+        print(f"Latence par clic (hors-ligne) : p50 {results['fallback_latency_p50']:.3f}s "
+              f"sur {results['fallbacks']} clic(s)")
+    if results["ttft_p50"] is not None:
+        print(f"Premier fragment : p50 {results['ttft_p50']:.3f}s")
+    print(f"Débit : {results['throughput']:.2f} clics/s · {results['upstream_requests']} appels au serveur "
+          f"· {results['fallbacks']} fallback(s)")
+    print(f"Mémoire retenue : {results['memory_per_session_kb']:.1f} Ko par session")
+    for name, stage in sorted(report["stages"].items()):
+        if stage["mean"] is not None:
+            print(f"  {name:18s} {stage['count']:5d} × {stage['mean'] * 1000:9.2f} ms")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=8, help="sessions simultanées simulées")
+    parser.add_argument("--clicks", type=int, default=5, help="générations par session")
+    parser.add_argument("--backend", default="hf", choices=["hf", "openai"],
+                        help="client utilisé contre le serveur de test")
+    parser.add_argument("--stream", action="store_true", help="utilise le mode streaming")
+    parser.add_argument("--no-wordcloud", dest="wordcloud", action="store_false", help="sans rendu du nuage de mots")
+    parser.add_argument("--latency", type=float, default=0.2, help="latence du serveur de test (s)")
+    parser.add_argument("--jitter", type=float, default=0.05, help="variation aléatoire de la latence (s)")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="délai entre fragments (s)")
+    parser.add_argument("--error-503", type=float, default=0.0, help="proportion de réponses 503")
+    parser.add_argument("--error-429", type=float, default=0.0, help="proportion de réponses 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After renvoyé avec les erreurs (s)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="", help="fichier JSON où écrire le rapport")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="fichier de référence à comparer")
+    parser.add_argument("--save-baseline", action="store_true", help="enregistre ce rapport comme référence")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="écart relatif toléré avant régression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.CRITICAL)
+
+    report = run_suite(args)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Référence enregistrée dans {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != report["config"]:
+            print("⚠️ Configuration différente de la référence : comparaison indicative")
+        print(f"Comparaison avec la référence ({baseline['environment'].get('commit')}) :")
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions and args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
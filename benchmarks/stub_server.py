@@ -0,0 +1,210 @@
+"""Serveur local imitant l'API chat-completions de Hugging Face
+
+Rejoue des réponses SmolLM3 enregistrées (blocs <think> compris), en mode
+classique ou en streaming SSE, avec une latence et des erreurs 503/429
+configurables. Sert de cible aux benchmarks, sans token ni accès réseau.
+
+Usage : python benchmarks/stub_server.py --port 8089 --latency 0.5 --error-503 0.1
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "smollm3_responses.jsonl")
+
+# Découpage en fragments proche de celui d'un tokenizer : un mot et ses espaces
+_TOKEN_PATTERN = re.compile(r"\S+\s*|\s+")
+
+
+def load_responses(path=FIXTURES):
+    with open(path, encoding="utf-8") as f:
+        responses = [json.loads(line)["text"] for line in f if line.strip()]
+    return [text for text in responses if text]
+
+
+class StubConfig:
+    """Comportement du serveur : latences (secondes) et taux d'erreurs (0 à 1)"""
+
+    def __init__(self, latency=0.2, jitter=0.0, token_latency=0.0, error_503=0.0, error_429=0.0,
+                 retry_after=1, seed=None, responses=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.token_latency = token_latency
+        self.error_503 = error_503
+        self.error_429 = error_429
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.responses = itertools.cycle(responses or load_responses())
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def next_outcome(self):
+        # Tirage sous verrou : le serveur traite les requêtes dans plusieurs threads
+        with self.lock:
+            self.requests += 1
+            roll = self.random.random()
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            if roll < self.error_503:
+                return 503, delay, None
+            if roll < self.error_503 + self.error_429:
+                return 429, delay, None
+            return 200, delay, next(self.responses)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": f"Route inconnue : {self.path}"})
+            return
+
+        config = self.server.config
+        status, delay, text = config.next_outcome()
+        time.sleep(delay)
+
+        if status == 503:
+            self._send_json(503, {"error": "Model is currently loading", "estimated_time": config.retry_after},
+                            {"Retry-After": str(config.retry_after)})
+            return
+        if status == 429:
+            self._send_json(429, {"error": "Rate limit reached"}, {"Retry-After": str(config.retry_after)})
+            return
+
+        model = request.get("model", "stub")
+        if request.get("stream"):
+            include_usage = bool((request.get("stream_options") or {}).get("include_usage"))
+            self._stream(model, text, config.token_latency, include_usage)
+        else:
+            self._send_json(200, {
+                "id": "stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "system_fingerprint": "stub",
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(_TOKEN_PATTERN.findall(text)),
+                          "total_tokens": 0},
+            })
+
+    def _stream(self, model, text, token_latency, include_usage=False):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        created = int(time.time())
+        tokens = _TOKEN_PATTERN.findall(text)
+        for token in tokens:
+            chunk = {
+                "id": "stub",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "system_fingerprint": "stub",
+                "choices": [{"index": 0, "delta": {"role": "assistant", "content": token}, "finish_reason": None}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            if token_latency:
+                time.sleep(token_latency)
+        if include_usage:
+            # Comme l'API : un dernier fragment sans choix, avec les compteurs de tokens
+            chunk = {
+                "id": "stub",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "system_fingerprint": "stub",
+                "choices": [],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": 0},
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class StubServer:
+    """Serveur de test lancé dans un thread d'arrière-plan"""
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.httpd = ThreadingHTTPServer((host, port), StubHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.config = config or StubConfig()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.2, help="délai avant la réponse (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="délai aléatoire ajouté (s)")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="délai entre fragments en streaming (s)")
+    parser.add_argument("--error-503", type=float, default=0.0, help="proportion de réponses 503")
+    parser.add_argument("--error-429", type=float, default=0.0, help="proportion de réponses 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="valeur de l'en-tête Retry-After (s)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = StubConfig(args.latency, args.jitter, args.token_latency, args.error_503, args.error_429,
+                        args.retry_after, args.seed)
+    server = StubServer(config, args.host, args.port)
+    print(f"Serveur de test sur {server.base_url} (GENERATION_BASE_URL = \"{server.base_url}\")")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,475 @@
+"""Analyse du corpus : index inversé et statistiques tenus à jour à l'insertion
+
+Les tables vivent dans la base de l'historique (story_store.py). Chaque
+récit est indexé une seule fois, dans l'ordre des identifiants : ses mots
+porteurs de sens alimentent l'index inversé (recherche plein texte, TF-IDF
+entre récits) et les compteurs de son époque et des paliers de ses curseurs,
+avec l'histogramme de son score de divergence. Indexer un récit ne coûte que
+sa propre taille ; les requêtes lisent les agrégats sans reparcourir le
+corpus. Les agrégats sont tenus pour tout le corpus et pour la session
+propriétaire de chaque récit : l'interface ne montre à une session que ses
+propres récits.
+
+Indexer un historique existant, ou reconstruire l'index :
+    python corpus_index.py --store recits/stories.sqlite3 [--rebuild]
+"""
+import argparse
+import bisect
+import math
+import sqlite3
+import sys
+import threading
+from collections import Counter, defaultdict
+
+from generation import DIVERGENCE_THRESHOLDS, EPOCHS, WORD_RANGES, divergence_bucket
+from text_analysis import WORD_PATTERN, content_frequencies, divergence_score, stem, word_frequencies
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS corpus_state (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS corpus_documents (
+    story_id INTEGER PRIMARY KEY,
+    owner TEXT NOT NULL,
+    content_words INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS corpus_terms (
+    term TEXT PRIMARY KEY,
+    stem TEXT NOT NULL,
+    doc_freq INTEGER NOT NULL,
+    occurrences INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_corpus_terms_stem ON corpus_terms (stem);
+
+CREATE TABLE IF NOT EXISTS corpus_postings (
+    term TEXT NOT NULL,
+    story_id INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (term, story_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_corpus_postings_story ON corpus_postings (story_id);
+
+CREATE TABLE IF NOT EXISTS corpus_groups (
+    owner TEXT NOT NULL,
+    dimension TEXT NOT NULL,
+    value TEXT NOT NULL,
+    stories INTEGER NOT NULL,
+    words INTEGER NOT NULL,
+    content_words INTEGER NOT NULL,
+    divergence_sum REAL NOT NULL,
+    divergence_sq_sum REAL NOT NULL,
+    PRIMARY KEY (owner, dimension, value)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS corpus_group_terms (
+    owner TEXT NOT NULL,
+    dimension TEXT NOT NULL,
+    value TEXT NOT NULL,
+    term TEXT NOT NULL,
+    occurrences INTEGER NOT NULL,
+    PRIMARY KEY (owner, dimension, value, term)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS corpus_divergence_bins (
+    owner TEXT NOT NULL,
+    dimension TEXT NOT NULL,
+    value TEXT NOT NULL,
+    bin INTEGER NOT NULL,
+    stories INTEGER NOT NULL,
+    PRIMARY KEY (owner, dimension, value, bin)
+) WITHOUT ROWID;
+"""
+
+TABLES = ("corpus_state", "corpus_documents", "corpus_terms", "corpus_postings",
+          "corpus_groups", "corpus_group_terms", "corpus_divergence_bins")
+
+# Propriétaire des agrégats de tout le corpus (les récits sans session n'y comptent que là)
+ALL_OWNERS = ""
+
+# Regroupements des statistiques : le corpus entier, l'époque, le palier de chaque curseur, la longueur
+DIMENSIONS = ("corpus", "epoch", "tech", "social", "fantasy", "length")
+# Regroupements dont on garde les fréquences de mots (TF-IDF par groupe)
+TERM_DIMENSIONS = ("epoch", "tech", "social", "fantasy")
+
+# Bornes (en %) de l'histogramme des scores de divergence
+DIVERGENCE_BINS = (0.25, 0.5, 1.0, 2.0, 4.0)
+
+# Paramètres du classement BM25 de la recherche plein texte
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def bucket_labels():
+    """Libellé de chaque palier de curseur, d'après les seuils de divergence"""
+    bounds = (0,) + tuple(threshold + 1 for threshold in DIVERGENCE_THRESHOLDS) + (101,)
+    return tuple(f"{low}-{high - 1}" for low, high in zip(bounds, bounds[1:]))
+
+
+def bin_labels():
+    """Libellé de chaque classe de l'histogramme de divergence"""
+    labels = [f"< {DIVERGENCE_BINS[0]:g} %"]
+    labels += [f"{low:g}-{high:g} %" for low, high in zip(DIVERGENCE_BINS, DIVERGENCE_BINS[1:])]
+    labels.append(f">= {DIVERGENCE_BINS[-1]:g} %")
+    return tuple(labels)
+
+
+def dimension_values(dimension):
+    """Valeurs d'un regroupement, dans leur ordre d'affichage"""
+    if dimension == "corpus":
+        return ("",)
+    if dimension == "epoch":
+        return tuple(EPOCHS)
+    if dimension == "length":
+        return tuple(WORD_RANGES)
+    if dimension in ("tech", "social", "fantasy"):
+        return tuple(str(bucket) for bucket in range(len(DIVERGENCE_THRESHOLDS) + 1))
+    raise ValueError(f"Regroupement inconnu : {dimension}")
+
+
+def query_stems(query):
+    """Racines des mots porteurs de sens d'une requête"""
+    words = content_frequencies(Counter(WORD_PATTERN.findall(query.lower())))
+    return sorted({stem(word) for word in words})
+
+
+def _idf(documents, doc_freq):
+    # IDF lissée : un mot présent dans tous les récits garde un poids positif
+    return math.log((1 + documents) / (1 + doc_freq)) + 1
+
+
+def _story_groups(row):
+    _, epoch, tech, social, fantasy, story_length, _, _ = row
+    return {
+        "corpus": "",
+        "epoch": epoch,
+        "tech": str(divergence_bucket(tech)),
+        "social": str(divergence_bucket(social)),
+        "fantasy": str(divergence_bucket(fantasy)),
+        "length": story_length,
+    }
+
+
+class CorpusIndex:
+    """Index inversé et statistiques du corpus de l'historique, mis à jour récit par récit"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connection()
+        # Index créé avant les agrégats par session : supprimé puis reconstruit par sync()
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(corpus_groups)")}
+        if columns and "owner" not in columns:
+            for table in TABLES:
+                conn.execute(f"DROP TABLE IF EXISTS {table}")
+        conn.executescript(SCHEMA)
+
+    def _connection(self):
+        # Une connexion par thread, comme l'historique dont l'index partage la base
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+        return conn
+
+    def _watermark(self, conn):
+        row = conn.execute("SELECT value FROM corpus_state WHERE key = 'last_story_id'").fetchone()
+        return row[0] if row else 0
+
+    def pending(self):
+        """Nombre de récits de l'historique pas encore indexés"""
+        conn = self._connection()
+        return conn.execute("SELECT COUNT(*) FROM stories WHERE id > ?", (self._watermark(conn),)).fetchone()[0]
+
+    def sync(self, batch_size=500, max_stories=None):
+        """Indexe les récits ajoutés depuis la dernière synchronisation et renvoie leur nombre
+
+        max_stories borne le travail d'un appel : les récits restants sont
+        indexés par les appels suivants.
+        """
+        total = 0
+        while max_stories is None or total < max_stories:
+            size = batch_size if max_stories is None else min(batch_size, max_stories - total)
+            indexed = self._index_batch(size)
+            if indexed is None:
+                break
+            total += indexed
+        return total
+
+    def _index_batch(self, batch_size):
+        conn = self._connection()
+        watermark = self._watermark(conn)
+        rows = conn.execute(
+            "SELECT id, epoch, tech_level, social_change, fantasy_elements, story_length, story, owner "
+            "FROM stories WHERE id > ? ORDER BY id LIMIT ?", (watermark, batch_size)
+        ).fetchall()
+        if not rows:
+            return None
+
+        # Tokenisation hors transaction : le verrou d'écriture n'est tenu que pour les mises à jour
+        documents = []
+        terms = Counter()
+        doc_freqs = Counter()
+        groups = defaultdict(lambda: [0, 0, 0, 0.0, 0.0])
+        group_terms = Counter()
+        bins = Counter()
+        postings = []
+        for row in rows:
+            frequencies = word_frequencies(row[6])
+            word_count = sum(frequencies.values())
+            content = content_frequencies(frequencies)
+            content_words = sum(content.values())
+            score = divergence_score(frequencies, word_count)
+            owner = row[7] or ALL_OWNERS
+            documents.append((row[0], owner, content_words))
+            postings.extend((term, row[0], tf) for term, tf in content.items())
+            terms.update(content)
+            doc_freqs.update(content.keys())
+            # Agrégats de tout le corpus, et de la session propriétaire du récit
+            owners = (ALL_OWNERS, owner) if owner != ALL_OWNERS else (ALL_OWNERS,)
+            for dimension, value in _story_groups(row).items():
+                for scope in owners:
+                    totals = groups[scope, dimension, value]
+                    totals[0] += 1
+                    totals[1] += word_count
+                    totals[2] += content_words
+                    totals[3] += score
+                    totals[4] += score * score
+                    bins[scope, dimension, value, bisect.bisect_right(DIVERGENCE_BINS, score)] += 1
+                    if dimension in TERM_DIMENSIONS:
+                        for term, tf in content.items():
+                            group_terms[scope, dimension, value, term] += tf
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Un autre processus a pu indexer ces récits entre-temps
+            if self._watermark(conn) != watermark:
+                conn.execute("ROLLBACK")
+                return 0
+            conn.executemany(
+                "INSERT INTO corpus_documents (story_id, owner, content_words) VALUES (?, ?, ?)", documents
+            )
+            conn.executemany("INSERT INTO corpus_postings (term, story_id, tf) VALUES (?, ?, ?)", postings)
+            conn.executemany(
+                "INSERT INTO corpus_terms (term, stem, doc_freq, occurrences) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (term) DO UPDATE SET doc_freq = doc_freq + excluded.doc_freq, "
+                "occurrences = occurrences + excluded.occurrences",
+                [(term, stem(term), doc_freqs[term], count) for term, count in terms.items()]
+            )
+            conn.executemany(
+                "INSERT INTO corpus_groups (owner, dimension, value, stories, words, content_words, "
+                "divergence_sum, divergence_sq_sum) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (owner, dimension, value) DO UPDATE SET stories = stories + excluded.stories, "
+                "words = words + excluded.words, content_words = content_words + excluded.content_words, "
+                "divergence_sum = divergence_sum + excluded.divergence_sum, "
+                "divergence_sq_sum = divergence_sq_sum + excluded.divergence_sq_sum",
+                [key + tuple(totals) for key, totals in groups.items()]
+            )
+            conn.executemany(
+                "INSERT INTO corpus_group_terms (owner, dimension, value, term, occurrences) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (owner, dimension, value, term) DO UPDATE SET occurrences = occurrences + excluded.occurrences",
+                [key + (count,) for key, count in group_terms.items()]
+            )
+            conn.executemany(
+                "INSERT INTO corpus_divergence_bins (owner, dimension, value, bin, stories) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (owner, dimension, value, bin) DO UPDATE SET stories = stories + excluded.stories",
+                [key + (count,) for key, count in bins.items()]
+            )
+            conn.execute(
+                "INSERT INTO corpus_state (key, value) VALUES ('last_story_id', ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = excluded.value", (rows[-1][0],)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return len(rows)
+
+    def rebuild(self, batch_size=500):
+        """Vide l'index puis réindexe tout l'historique"""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for table in TABLES:
+                conn.execute(f"DELETE FROM {table}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.sync(batch_size)
+
+    def summary(self, owner=None):
+        """Taille du corpus indexé, ou des récits d'une session : récits, mots et vocabulaire"""
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT stories, words, content_words FROM corpus_groups WHERE owner = ? AND dimension = 'corpus'",
+            (owner or ALL_OWNERS,)
+        ).fetchone() or (0, 0, 0)
+        if owner:
+            vocabulary = conn.execute(
+                "SELECT COUNT(*) FROM corpus_group_terms WHERE owner = ? AND dimension = 'epoch'", (owner,)
+            ).fetchone()[0]
+        else:
+            vocabulary = conn.execute("SELECT COUNT(*) FROM corpus_terms").fetchone()[0]
+        return {'stories': row[0], 'words': row[1], 'content_words': row[2], 'vocabulary': vocabulary}
+
+    def divergence_distribution(self, dimension, owner=None):
+        """Distribution du score de divergence pour chaque valeur d'un regroupement
+
+        Chaque entrée donne le nombre de récits, leur longueur moyenne, la
+        moyenne et l'écart-type du score, et l'effectif de chaque classe de
+        l'histogramme (bin_labels()). owner limite la distribution aux
+        récits d'une session.
+        """
+        values = dimension_values(dimension)
+        conn = self._connection()
+        totals = {
+            row[0]: row[1:] for row in conn.execute(
+                "SELECT value, stories, words, divergence_sum, divergence_sq_sum "
+                "FROM corpus_groups WHERE owner = ? AND dimension = ?", (owner or ALL_OWNERS, dimension)
+            )
+        }
+        histograms = defaultdict(lambda: [0] * (len(DIVERGENCE_BINS) + 1))
+        for value, index, stories in conn.execute(
+            "SELECT value, bin, stories FROM corpus_divergence_bins WHERE owner = ? AND dimension = ?",
+            (owner or ALL_OWNERS, dimension)
+        ):
+            histograms[value][index] = stories
+
+        distribution = []
+        for value in values:
+            if value not in totals:
+                continue
+            stories, words, total, total_sq = totals[value]
+            mean = total / stories
+            distribution.append({
+                'value': value,
+                'stories': stories,
+                'mean_words': words / stories,
+                'mean': mean,
+                'stdev': math.sqrt(max(0.0, total_sq / stories - mean * mean)),
+                'histogram': histograms[value],
+            })
+        return distribution
+
+    def top_terms(self, dimension, value, limit=10, owner=None):
+        """Mots les plus caractéristiques d'un groupe de récits (TF-IDF entre récits)
+
+        owner limite le groupe aux récits d'une session ; les fréquences
+        documentaires restent celles de tout le corpus.
+        """
+        conn = self._connection()
+        documents = self.summary()['stories']
+        scope = owner or ALL_OWNERS
+        row = conn.execute(
+            "SELECT content_words FROM corpus_groups WHERE owner = ? AND dimension = ? AND value = ?",
+            (scope, dimension, str(value))
+        ).fetchone()
+        if not row or not row[0]:
+            return []
+        rows = conn.execute(
+            "SELECT g.term, g.occurrences, t.doc_freq FROM corpus_group_terms g "
+            "JOIN corpus_terms t ON t.term = g.term WHERE g.owner = ? AND g.dimension = ? AND g.value = ?",
+            (scope, dimension, str(value))
+        ).fetchall()
+        scores = [(term, occurrences / row[0] * _idf(documents, doc_freq)) for term, occurrences, doc_freq in rows]
+        scores.sort(key=lambda item: (-item[1], item[0]))
+        return scores[:limit]
+
+    def story_terms(self, story_id, limit=10):
+        """Mots les plus caractéristiques d'un récit par rapport au reste du corpus (TF-IDF)"""
+        conn = self._connection()
+        documents = self.summary()['stories']
+        row = conn.execute("SELECT content_words FROM corpus_documents WHERE story_id = ?", (story_id,)).fetchone()
+        if not row or not row[0]:
+            return []
+        rows = conn.execute(
+            "SELECT p.term, p.tf, t.doc_freq FROM corpus_postings p "
+            "JOIN corpus_terms t ON t.term = p.term WHERE p.story_id = ?", (story_id,)
+        ).fetchall()
+        scores = [(term, tf / row[0] * _idf(documents, doc_freq)) for term, tf, doc_freq in rows]
+        scores.sort(key=lambda item: (-item[1], item[0]))
+        return scores[:limit]
+
+    def search(self, query, limit=10, epoch=None, owner=None):
+        """Recherche plein texte : (identifiant, score) des récits les plus pertinents (BM25)
+
+        Les mots de la requête sont comparés par racine : « machines » trouve
+        aussi « machine ». owner limite la recherche aux récits d'une session.
+        """
+        stems = query_stems(query)
+        if not stems:
+            return []
+        conn = self._connection()
+        summary = self.summary(owner)
+        if not summary['stories']:
+            return []
+        average_length = summary['content_words'] / summary['stories']
+
+        joins, join_values = "", []
+        if owner:
+            joins, join_values = " AND d.owner = ?", [owner]
+        if epoch is not None:
+            joins += " JOIN stories s ON s.id = p.story_id AND s.epoch = ?"
+            join_values.append(epoch)
+
+        scores = Counter()
+        for query_stem in stems:
+            rows = conn.execute(
+                "SELECT p.story_id, SUM(p.tf), d.content_words FROM corpus_terms t "
+                "JOIN corpus_postings p ON p.term = t.term "
+                "JOIN corpus_documents d ON d.story_id = p.story_id"
+                f"{joins} WHERE t.stem = ? GROUP BY p.story_id",
+                join_values + [query_stem]
+            ).fetchall()
+            # Fréquence documentaire de la racine, toutes formes fléchies réunies
+            idf = math.log(1 + (summary['stories'] - len(rows) + 0.5) / (len(rows) + 0.5))
+            for story_id, tf, length in rows:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                scores[story_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores.most_common(limit)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Indexe le corpus d'un historique de récits")
+    parser.add_argument("--store", required=True, help="historique SQLite (story_store.py)")
+    parser.add_argument("--rebuild", action="store_true", help="vide l'index avant de tout réindexer")
+    parser.add_argument("--batch-size", type=int, default=500, help="récits indexés par transaction")
+    parser.add_argument("--search", default="", help="requête plein texte à exécuter après l'indexation")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from story_store import StoryStore
+
+    args = parse_args(argv)
+    # Crée la table des récits si l'historique n'existe pas encore
+    StoryStore(args.store)
+    index = CorpusIndex(args.store)
+    indexed = index.rebuild(args.batch_size) if args.rebuild else index.sync(args.batch_size)
+    summary = index.summary()
+    print(f"{indexed} récits indexés ; corpus : {summary['stories']} récits, "
+          f"{summary['words']} mots, vocabulaire de {summary['vocabulary']} mots")
+
+    labels = bin_labels()
+    for entry in index.divergence_distribution("epoch"):
+        terms = ", ".join(term for term, _ in index.top_terms("epoch", entry['value'], 5))
+        print(f"- {entry['value']} : {entry['stories']} récits, divergence {entry['mean']:.2f} % "
+              f"(écart-type {entry['stdev']:.2f}) ; {terms}")
+        print("    " + " | ".join(f"{label} : {count}" for label, count in zip(labels, entry['histogram'])))
+
+    if args.search:
+        for story_id, score in index.search(args.search):
+            print(f"  récit {story_id} : {score:.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,468 @@
+import logging
+import random
+import re
+import time
+
+from backends import DEFAULT_MODEL, BackendBusyError
+from metrics import REGISTRY
+from retry_policy import ERROR_LOADING, ERROR_RATE_LIMIT, classify_error
+from text_analysis import analyze
+from thinking import ThinkingStreamFilter, clean_thinking_tokens
+
+logger = logging.getLogger(__name__)
+
+
+# Configuration des époques historiques
+EPOCHS = {
+    "Renaissance (1400-1600)": {
+        "description": "Époque de renouveau artistique et scientifique en Europe",
+        "keywords": ["art", "science", "humanisme", "exploration", "inventions"],
+        "context": "À la Renaissance, l'Europe connaît un renouveau artistique, scientifique et culturel. Les grandes découvertes transforment la vision du monde."
+    },
+    "Révolution française (1789-1799)": {
+        "description": "Période de bouleversements politiques et sociaux en France",
+        "keywords": ["révolution", "liberté", "égalité", "fraternité", "république"],
+        "context": "La Révolution française marque la fin de l'Ancien Régime et l'émergence de nouveaux idéaux démocratiques."
+    },
+    "Révolution industrielle (1760-1840)": {
+        "description": "Transformation économique et sociale par la mécanisation",
+        "keywords": ["industrie", "machines", "vapeur", "usines", "urbanisation"],
+        "context": "La révolution industrielle transforme radicalement les modes de production et la société européenne."
+    },
+    "Belle Époque (1871-1914)": {
+        "description": "Période de prospérité et d'innovations en Europe",
+        "keywords": ["progrès", "innovations", "électricité", "automobile", "cinéma"],
+        "context": "La Belle Époque est marquée par l'optimisme, les innovations techniques et l'épanouissement culturel."
+    },
+    "Années folles (1920-1929)": {
+        "description": "Décennie d'euphorie et de modernité après la Grande Guerre",
+        "keywords": ["jazz", "modernité", "libération", "économie", "arts"],
+        "context": "Les Années folles sont une période d'effervescence culturelle et de prospérité économique."
+    }
+}
+
+
+# Modèle par défaut (voir backends.py pour le choix du backend)
+HF_MODEL = DEFAULT_MODEL
+
+
+# Paramètres d'échantillonnage envoyés au modèle
+GENERATION_PARAMS = {
+    "max_tokens": 1000,
+    "temperature": 0.7,
+    "top_p": 1.0
+}
+
+
+# Exemple few-shot pour "apprendre" au modèle à répondre correctement
+FEW_SHOT_MESSAGES = [
+    {
+        "role": "user",
+        "content": "Écris une courte histoire de 50 mots sur la Renaissance."
+    },
+    {
+        "role": "assistant",
+        "content": "<think>\nJe dois écrire une histoire courte sur la Renaissance. Je vais me concentrer sur un artiste à Florence.\n</think>\n\nEn cette année 1503 à Florence, Lorenzo observait son maître Leonardo peindre. Les pinceaux dansaient sur la toile, capturant la lumière comme jamais auparavant. \"L'art révèle la vérité\", murmura le maître. Lorenzo comprit alors que cette époque de renouveau transformait non seulement l'art, mais l'âme humaine elle-même."
+    }
+]
+
+
+# Même exemple sans bloc de réflexion ; /no_think désactive le raisonnement de SmolLM3
+NO_THINK_MESSAGES = [
+    {"role": "system", "content": "/no_think"},
+    FEW_SHOT_MESSAGES[0],
+    {
+        "role": "assistant",
+        "content": FEW_SHOT_MESSAGES[1]["content"].split("</think>", 1)[1].strip()
+    }
+]
+
+
+# Fonction pour construire les messages envoyés au modèle
+def build_messages(prompt, reasoning=True):
+    examples = FEW_SHOT_MESSAGES if reasoning else NO_THINK_MESSAGES
+    return examples + [{"role": "user", "content": prompt}]
+
+
+# Nombre de mots demandé pour chaque longueur de récit
+WORD_RANGES = {
+    "Court (100-200 mots)": (100, 200),
+    "Moyen (300-500 mots)": (300, 500),
+    "Long (600-800 mots)": (600, 800)
+}
+
+# Tokens par mot français (tokenizer SmolLM3), marge au-delà de la borne haute, réserve de réflexion
+TOKENS_PER_WORD = 1.6
+LENGTH_MARGIN = 1.25
+REASONING_TOKENS = 400
+
+# Fin de phrase, éventuellement suivie d'une fermeture de guillemets
+_SENTENCE_END = re.compile(r"[.!?…][\s»\"”')]*$")
+
+
+class GenerationBudget:
+    """Budget d'un récit : max_tokens déduit de la longueur demandée, réflexion ou non"""
+
+    __slots__ = ("min_words", "max_words", "reasoning", "max_tokens")
+
+    def __init__(self, story_length, reasoning=False):
+        self.min_words, self.max_words = WORD_RANGES[story_length]
+        self.reasoning = reasoning
+        self.max_tokens = int(self.max_words * TOKENS_PER_WORD * LENGTH_MARGIN)
+        if reasoning:
+            self.max_tokens += REASONING_TOKENS
+
+    def params(self):
+        return dict(GENERATION_PARAMS, max_tokens=self.max_tokens)
+
+    def messages(self, prompt):
+        return build_messages(prompt, self.reasoning)
+
+
+class NarrativeLimit:
+    """Signale en streaming que le récit visible a atteint max_words sur une fin de phrase"""
+
+    def __init__(self, max_words):
+        self.max_words = max_words
+        self.filter = ThinkingStreamFilter()
+
+    def feed(self, chunk):
+        visible_chunk = self.filter.feed(chunk)
+        # Comptage des mots seulement quand le fragment termine une phrase
+        if not visible_chunk or not _SENTENCE_END.search(self.filter.visible):
+            return False
+        return len(self.filter.visible.split()) >= self.max_words
+
+
+def estimate_tokens(text):
+    """Estimation du nombre de tokens d'un texte, à partir de son nombre de mots"""
+    return int(len(text.split()) * TOKENS_PER_WORD) if text else 0
+
+
+# Fonction pour mesurer les tokens générés puis jetés au nettoyage (réflexion, balises)
+def record_reasoning_waste(raw_text, cleaned_text, usage=None):
+    """Tokens rapportés par le serveur (usage), estimés d'après le nombre de mots à défaut"""
+    usage = usage or {}
+    source = "usage" if usage.get("completion_tokens") is not None else "estimate"
+    generated = usage["completion_tokens"] if source == "usage" else estimate_tokens(raw_text)
+    if usage.get("reasoning_tokens") is not None:
+        wasted = usage["reasoning_tokens"]
+    else:
+        # Part des mots bruts jetée au nettoyage, appliquée aux tokens générés
+        raw_words = len(raw_text.split())
+        kept = int(generated * len(cleaned_text.split()) / raw_words) if raw_words else 0
+        wasted = max(0, generated - kept)
+    REGISTRY.inc("completion_tokens_total", generated, source=source)
+    REGISTRY.inc("reasoning_tokens_wasted_total", wasted, source=source)
+    return wasted
+
+
+class GenerationResult:
+    """Résultat d'une génération : le récit, son origine et les mesures de l'appel"""
+
+    __slots__ = ("story", "is_fallback", "attempts", "timings")
+
+    def __init__(self, story, is_fallback, attempts=0, timings=None):
+        self.story = story
+        self.is_fallback = is_fallback
+        self.attempts = attempts
+        self.timings = timings or {}
+
+
+def _notify(notify, level, message):
+    # Remonte un message à l'interface appelante ("error" ou "warning")
+    if notify is not None:
+        notify(level, message)
+
+
+# Fonction pour enregistrer l'issue d'un appel dans le disjoncteur
+def record_api_error(error, breaker):
+    if isinstance(error, BackendBusyError):
+        # Saturation locale, pas une panne du point d'accès : la sonde éventuelle est rendue
+        REGISTRY.inc("api_errors_total", kind="busy")
+        breaker.release()
+        return classify_error(error)
+    classified = classify_error(error)
+    REGISTRY.inc("api_errors_total", kind=classified.kind)
+    if classified.retryable:
+        breaker.record_failure()
+    elif classified.status is not None and 400 <= classified.status < 500:
+        # L'API a répondu (erreur de requête) : le point d'accès n'est pas en panne
+        breaker.record_success()
+    else:
+        # Exception locale, sans réponse de l'API : aucun verdict, la sonde éventuelle est rendue
+        breaker.release()
+    return classified
+
+
+# Fonction pour générer un récit via le backend configuré
+def generate_story(prompt, backend, retry_policy, breaker, notify=None, budget=None, admit=None):
+    """Appelle le backend avec reprises ; renvoie None si le backend est inutilisable
+
+    Les attentes entre reprises bloquent le thread appelant : l'interface
+    l'appelle dans le thread de l'appel partagé (single_flight.py), jamais
+    dans celui de la session, qui relaie les messages de notify pendant ce temps.
+    La première tentative est admise par l'appelant ; admit() est appelé avant
+    chaque reprise, qui ne part que s'il renvoie True (jeton d'admission obtenu).
+    """
+    logger.debug(f"🔍 Début generate_story ({backend.label}) avec prompt: {prompt[:100]}...")
+
+    reason = backend.unavailable_reason()
+    if reason:
+        logger.error(f"❌ {reason}")
+        _notify(notify, "error", reason)
+        return None
+
+    timings = {"upstream": 0.0, "clean": 0.0, "retry_wait": 0.0}
+    attempts = 0
+    messages = budget.messages(prompt) if budget else build_messages(prompt)
+    params = budget.params() if budget else GENERATION_PARAMS
+
+    try:
+        # Client partagé : seul le premier appel du processus le crée réellement
+        with REGISTRY.timer("client_setup"):
+            backend.client()
+
+        max_retries = retry_policy.max_retries
+
+        for attempt in range(max_retries):
+            # Chaque reprise consomme le quota comme une nouvelle demande
+            if attempt and admit is not None and not admit():
+                logger.info("⏳ Reprise refusée par la file d'admission, utilisation du fallback")
+                REGISTRY.inc("admission_rejected_total")
+                break
+
+            # Disjoncteur ouvert : l'API est en panne, inutile d'attendre
+            if not breaker.allow_request():
+                logger.info("⚡ Disjoncteur ouvert, utilisation directe du fallback")
+                REGISTRY.inc("circuit_open_total")
+                break
+
+            attempts += 1
+            if attempt:
+                REGISTRY.inc("retries_total")
+            start = time.perf_counter()
+            try:
+                logger.debug(f"🔍 Tentative {attempt + 1}/{max_retries} avec {backend.label}")
+
+                # Appel non-streaming, limité par les emplacements du backend
+                usage = {}
+                generated = backend.complete(messages, params, usage)
+                elapsed = time.perf_counter() - start
+                timings["upstream"] += elapsed
+                REGISTRY.observe("upstream_total", elapsed)
+
+                breaker.record_success()
+                if generated:
+                    # Nettoyer les thinking tokens
+                    start = time.perf_counter()
+                    cleaned_text = clean_thinking_tokens(generated)
+                    timings["clean"] = time.perf_counter() - start
+                    REGISTRY.observe("clean_thinking", timings["clean"])
+                    record_reasoning_waste(generated, cleaned_text, usage)
+
+                    if cleaned_text and len(cleaned_text) > 20:  # Vérifier qu'il y a du contenu substantiel
+                        logger.info(f"✅ Texte généré: {cleaned_text[:100]}...")
+                        return GenerationResult(cleaned_text, False, attempts, timings)
+                    else:
+                        logger.warning("⚠️ Texte vide ou trop court après nettoyage, utilisation du fallback")
+                        return GenerationResult(generate_fallback_story(prompt), True, attempts, timings)
+                else:
+                    logger.warning("⚠️ Réponse vide")
+
+            except Exception as e:
+                elapsed = time.perf_counter() - start
+                timings["upstream"] += elapsed
+                REGISTRY.observe("upstream_total", elapsed)
+                logger.error(f"💥 Erreur tentative {attempt + 1}: {str(e)}")
+                classified = record_api_error(e, breaker)
+                delay = retry_policy.next_delay(attempt, classified, timings["retry_wait"])
+
+                if classified.kind == ERROR_LOADING:
+                    _notify(notify, "warning", f"Modèle en cours de chargement... Tentative {attempt + 1}/{max_retries}")
+                elif classified.kind == ERROR_RATE_LIMIT:
+                    _notify(notify, "warning", f"Limite de taux atteinte. Tentative {attempt + 1}/{max_retries}")
+                else:
+                    _notify(notify, "warning", f"Erreur: {str(e)}")
+
+                # Délai trop long ou budget d'attente épuisé : on dégrade tout de suite
+                if delay is None:
+                    break
+                logger.debug(f"⏳ Nouvelle tentative dans {delay:.1f}s")
+                time.sleep(delay)
+                timings["retry_wait"] += delay
+                REGISTRY.observe("retry_sleep", delay)
+
+    except ImportError as e:
+        logger.error(f"❌ Module non disponible pour le backend {backend.name}: {e.name}")
+        _notify(notify, "error", f"Module {e.name} non installé. Utilisez: pip install {e.name}")
+        return None
+    except Exception as e:
+        logger.error(f"💥 Erreur configuration client: {str(e)}")
+        _notify(notify, "error", f"Erreur configuration API: {str(e)}")
+        return None
+
+    # Si tous les essais échouent, génération de fallback
+    logger.info("🔄 Utilisation du fallback")
+    return GenerationResult(generate_fallback_story(prompt), True, attempts, timings)
+
+
+# Fonction pour générer un récit en streaming via le backend configuré
+def stream_story_chunks(prompt, backend, breaker, budget=None):
+    """Renvoie les fragments bruts du récit au fur et à mesure de leur génération
+
+    Avec un budget, le flux s'arrête dès que le récit dépasse la borne haute de
+    mots sur une fin de phrase.
+    """
+    reason = backend.unavailable_reason()
+    if reason:
+        logger.error(f"❌ {reason} (streaming)")
+        return
+
+    if not breaker.allow_request():
+        logger.info("⚡ Disjoncteur ouvert, streaming ignoré")
+        REGISTRY.inc("circuit_open_total")
+        return
+
+    try:
+        with REGISTRY.timer("client_setup"):
+            backend.client()
+        logger.debug(f"🔍 Streaming avec {backend.label}")
+
+        messages = budget.messages(prompt) if budget else build_messages(prompt)
+        params = budget.params() if budget else GENERATION_PARAMS
+        limit = NarrativeLimit(budget.max_words) if budget else None
+        raw_chunks = []
+        # Rempli par le dernier fragment, absent si le flux est interrompu avant la fin
+        usage = {}
+
+        start = time.perf_counter()
+        first_chunk = True
+        chunks = backend.stream(messages, params, usage)
+        try:
+            for content in chunks:
+                if first_chunk:
+                    REGISTRY.observe("upstream_ttft", time.perf_counter() - start)
+                    first_chunk = False
+                raw_chunks.append(content)
+                yield content
+                if limit is not None and limit.feed(content):
+                    # Longueur atteinte : inutile de payer et d'attendre la suite
+                    logger.info(f"✂️ Arrêt anticipé à {budget.max_words} mots")
+                    REGISTRY.inc("early_stops_total")
+                    break
+        finally:
+            chunks.close()
+        REGISTRY.observe("upstream_total", time.perf_counter() - start)
+        breaker.record_success()
+
+        raw_text = "".join(raw_chunks)
+        record_reasoning_waste(raw_text, clean_thinking_tokens(raw_text), usage)
+    except Exception as e:
+        record_api_error(e, breaker)
+        raise
+    except GeneratorExit:
+        # Flux abandonné en cours de route : libérer la sonde du disjoncteur
+        breaker.release()
+        raise
+
+
+# Histoires prédéfinies par époque, corpus de départ du moteur hors-ligne (offline_engine.py)
+FALLBACK_STORIES = {
+    "Renaissance": "En cette époque de renouveau, un artiste florentin découvrit dans son atelier une machine étrange, aux engrenages d'une précision inouïe. Cette invention, léguée par un mystérieux alchimiste, permettait de capturer la lumière même et de la transformer en pigments aux couleurs impossibles. Ses œuvres, d'une beauté surnaturelle, attirèrent l'attention de mécènes venus de contrées lointaines. Mais l'artiste réalisa bientôt que chaque toile peinte avec ces couleurs magiques volait un fragment de réalité au monde, créant des échos entre les dimensions.",
+
+    "Révolution française": "Dans les rues de Paris révolutionnaire, une imprimerie clandestine produisait des pamphlets aux propriétés extraordinaires. L'encre, mélangée avec des herbes rares trouvées dans les jardins royaux abandonnés, rendait les mots littéralement convaincants - quiconque lisait ces textes se trouvait irrésistiblement poussé à agir selon leur contenu. Les révolutionnaires utilisèrent ce pouvoir avec parcimonie, conscients que leur liberté nouvellement acquise dépendait de la volonté authentique du peuple, non de la magie de l'encre.",
+
+    "Révolution industrielle": "Les machines à vapeur de cette Manchester alternative fonctionnaient non pas au charbon, mais aux rêves collectés dans les quartiers ouvriers. Des collecteurs nocturnes parcouraient les rues, récupérant dans des fioles de cristal les songes abandonnés par les travailleurs épuisés. Ces rêves, une fois distillés, produisaient une énergie pure et inépuisable. Mais quand les ouvriers cessèrent de rêver, privés de leurs aspirations, les machines s'arrêtèrent une à une, et la société dut repenser son rapport au progrès.",
+
+    "Belle Époque": "L'Exposition universelle de Paris accueillait cette année-là un pavillon secret, visible seulement à la tombée du jour. Les inventions exposées défiaient les lois de la physique : des automobiles volantes alimentées par la musique des cabarets, des téléphones permettant de converser avec les morts, des photographies capturant non pas les visages mais les émotions. Les visiteurs, ébahis, repartaient avec la certitude qu'un monde nouveau était né, où la science et la poésie ne faisaient qu'un.",
+
+    "Années folles": "Dans les clubs de jazz de Montmartre, la musique avait acquis des propriétés alchimiques. Les notes de saxophone transformaient littéralement l'atmosphère, rendant l'air plus léger, permettant aux danseurs de défier la gravité quelques instants. Les musiciens, conscients de leur pouvoir, créaient des mélodies capables d'effacer temporairement les traumatismes de la Grande Guerre. Mais ils découvrirent bientôt que cette magie avait un prix : elle consumait lentement leur propre mémoire, les condamnant à rejouer éternellement les mêmes airs."
+}
+
+
+# Fonction de fallback : récit composé sur place par le moteur hors-ligne
+def generate_fallback_story(prompt, seed=None):
+    # Époque, paliers et longueur sont retrouvés dans le prompt (voir parse_prompt)
+    from offline_engine import get_engine
+
+    rng = random.Random(seed) if seed is not None else None
+    return get_engine().generate_from_prompt(prompt, rng)
+
+
+# Consigne de longueur insérée dans le prompt
+LENGTH_INSTRUCTIONS = {
+    "Court (100-200 mots)": "un court récit de 100 à 200 mots",
+    "Moyen (300-500 mots)": "un récit de 300 à 500 mots",
+    "Long (600-800 mots)": "un récit détaillé de 600 à 800 mots"
+}
+
+
+# Paliers des curseurs de divergence : un curseur au-delà du seuil i est au palier i + 1
+DIVERGENCE_THRESHOLDS = (10, 40, 70)
+
+# Formulation de chaque palier dans le prompt (palier 0 : rien n'est précisé)
+TECH_DESCRIPTIONS = (
+    "",
+    "avec de légères améliorations techniques",
+    "avec quelques innovations technologiques",
+    "avec des technologies très avancées pour l'époque"
+)
+SOCIAL_DESCRIPTIONS = (
+    "",
+    "avec quelques modifications sociales",
+    "avec des changements sociaux notables",
+    "dans une société aux structures radicalement différentes"
+)
+FANTASY_DESCRIPTIONS = (
+    "",
+    "avec une légère touche de mystère",
+    "avec des phénomènes inexpliqués",
+    "intégrant des éléments magiques subtils"
+)
+
+
+def divergence_bucket(level):
+    """Palier (0 à 3) d'un curseur de divergence"""
+    return sum(1 for threshold in DIVERGENCE_THRESHOLDS if level > threshold)
+
+
+# Fonction pour générer le prompt
+def generate_prompt(epoch, tech, social, fantasy, length):
+    epoch_data = EPOCHS[epoch]
+
+    tech_description = TECH_DESCRIPTIONS[divergence_bucket(tech)]
+    social_description = SOCIAL_DESCRIPTIONS[divergence_bucket(social)]
+    fantasy_description = FANTASY_DESCRIPTIONS[divergence_bucket(fantasy)]
+
+    prompt = f"""Histoire: {LENGTH_INSTRUCTIONS[length]} se déroulant pendant {epoch.split('(')[0].strip()} {tech_description} {social_description} {fantasy_description}.
+
+Contexte: {epoch_data['context']}
+
+Récit:"""
+
+    return prompt
+
+
+def parse_prompt(prompt):
+    """Époque, paliers (tech, social, fantasy) et longueur retrouvés dans un prompt de generate_prompt
+
+    Les éléments absents du prompt prennent une valeur par défaut : première
+    époque citée (Renaissance sinon), palier 0, récit court.
+    """
+    lowered = prompt.lower()
+    epoch = next((name for name in EPOCHS if name.split('(')[0].strip().lower() in lowered), list(EPOCHS)[0])
+    length = next((name for name, instruction in LENGTH_INSTRUCTIONS.items() if instruction in prompt),
+                  list(LENGTH_INSTRUCTIONS)[0])
+    buckets = tuple(
+        max((level for level, description in enumerate(descriptions) if description and description in prompt),
+            default=0)
+        for descriptions in (TECH_DESCRIPTIONS, SOCIAL_DESCRIPTIONS, FANTASY_DESCRIPTIONS)
+    )
+    return epoch, buckets, length
+
+
+# Fonction pour analyser le texte généré (voir text_analysis.py)
+def analyze_text(text):
+    with REGISTRY.timer("analyze_text"):
+        return analyze(text)
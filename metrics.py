@@ -0,0 +1,173 @@
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Bornes des histogrammes de latence, en secondes
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, math.inf)
+
+# Étapes mesurées et leur description (reprise dans l'export Prometheus)
+STAGES = {
+    "prompt_build": "Construction du prompt",
+    "admission_wait": "Attente dans la file d'admission",
+    "client_setup": "Création du client d'inférence",
+    "upstream_ttft": "Délai avant le premier fragment du modèle",
+    "upstream_total": "Durée totale d'un appel au modèle",
+    "retry_sleep": "Attente avant une nouvelle tentative",
+    "clean_thinking": "Nettoyage des thinking tokens",
+    "analyze_text": "Analyse du texte généré",
+    "wordcloud_render": "Rendu du nuage de mots",
+    "pregeneration": "Pré-génération d'un récit en arrière-plan",
+    "offline_generation": "Composition d'un récit par le moteur hors-ligne",
+    "ui_sidebar": "Exécution du panneau des paramètres",
+    "ui_history": "Exécution du panneau d'historique",
+    "ui_analysis": "Exécution du panneau d'analyse",
+    "ui_corpus": "Exécution du panneau d'analyse du corpus",
+}
+
+METRIC_PREFIX = "recits"
+
+
+class Histogram:
+    """Histogramme cumulatif à bornes fixes"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+
+    def quantile(self, q):
+        """Estimation d'un quantile : borne supérieure du premier seau qui l'atteint"""
+        if not self.count:
+            return None
+        threshold = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= threshold:
+                return bound
+        return self.buckets[-1]
+
+
+class MetricsRegistry:
+    """Histogrammes et compteurs partagés par toutes les sessions du processus"""
+
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    @contextmanager
+    def timer(self, name):
+        """Mesure la durée du bloc et l'ajoute à l'histogramme de l'étape"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self):
+        """Copie cohérente des métriques, sous forme de dictionnaire"""
+        with self._lock:
+            histograms = {
+                name: {
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                    "p50": histogram.quantile(0.5),
+                    "p95": histogram.quantile(0.95),
+                    "p99": histogram.quantile(0.99),
+                    "buckets": list(zip(histogram.buckets, histogram.counts)),
+                }
+                for name, histogram in self._histograms.items()
+            }
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in self._counters.items()
+            ]
+        return {"histograms": histograms, "counters": counters}
+
+    def fallback_rate(self):
+        """Part des récits servis en mode hors-ligne"""
+        with self._lock:
+            total = sum(v for (name, _), v in self._counters.items() if name == "stories_total")
+            fallbacks = sum(v for (name, _), v in self._counters.items() if name == "fallback_stories_total")
+        return fallbacks / total if total else 0.0
+
+    def to_json(self):
+        snapshot = self.snapshot()
+        for histogram in snapshot["histograms"].values():
+            histogram["buckets"] = [["+Inf" if math.isinf(b) else b, c] for b, c in histogram["buckets"]]
+        snapshot["fallback_rate"] = self.fallback_rate()
+        return json.dumps(snapshot, ensure_ascii=False, indent=2)
+
+    def to_prometheus(self):
+        """Export au format texte de Prometheus"""
+        snapshot = self.snapshot()
+        lines = []
+
+        for name, histogram in sorted(snapshot["histograms"].items()):
+            metric = f"{METRIC_PREFIX}_{name}_seconds"
+            lines.append(f"# HELP {metric} {STAGES.get(name, name)}")
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, count in histogram["buckets"]:
+                cumulative += count
+                label = "+Inf" if math.isinf(bound) else repr(bound)
+                lines.append(f'{metric}_bucket{{le="{label}"}} {cumulative}')
+            lines.append(f"{metric}_sum {histogram['sum']}")
+            lines.append(f"{metric}_count {histogram['count']}")
+
+        declared = set()
+        for counter in sorted(snapshot["counters"], key=lambda c: (c["name"], sorted(c["labels"].items()))):
+            metric = f"{METRIC_PREFIX}_{counter['name']}"
+            if metric not in declared:
+                lines.append(f"# TYPE {metric} counter")
+                declared.add(metric)
+            labels = ",".join(f'{k}="{v}"' for k, v in sorted(counter["labels"].items()))
+            lines.append(f"{metric}{{{labels}}} {counter['value']}" if labels else f"{metric} {counter['value']}")
+
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Écrit les métriques dans un fichier (JSON si l'extension est .json, Prometheus sinon)"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        content = self.to_json() if path.endswith(".json") else self.to_prometheus()
+        # Écriture atomique : un collecteur ne lit jamais un fichier à moitié écrit
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(temporary, path)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+# Registre unique du processus
+REGISTRY = MetricsRegistry()
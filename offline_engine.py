@@ -0,0 +1,650 @@
+"""Moteur local de récits pour le mode hors-ligne
+
+Quand l'API est lente ou indisponible, les récits sont composés sur place,
+en quelques millisecondes, par une grammaire de gabarits : un personnage, un
+lieu et une année tirés du lexique de l'époque, puis des phrases choisies
+selon le palier de chaque curseur de divergence, jusqu'à atteindre la
+longueur demandée. Le modèle précalculé (data/offline_model.json) y ajoute
+des phrases tirées des récits déjà générés, indexées par époque et par
+paliers ; il est borné et chargé une seule fois par processus.
+
+Reconstruire le modèle à partir de l'historique et des lots :
+    python offline_engine.py --store recits/stories.sqlite3 --batch recits/lot.jsonl
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+
+from generation import EPOCHS, FALLBACK_STORIES, WORD_RANGES, divergence_bucket, parse_prompt
+from metrics import REGISTRY
+from text_analysis import count_words
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "offline_model.json")
+
+MODEL_VERSION = 1
+
+# Bornes du modèle précalculé
+MAX_SENTENCES_PER_KEY = 40
+MAX_SENTENCES_PER_EPOCH = 400
+MIN_SENTENCE_WORDS = 6
+MAX_SENTENCE_WORDS = 45
+
+# Phrases par paragraphe
+PARAGRAPH_SENTENCES = 4
+
+
+# Lexique de chaque époque : personnages (prénom, rôle, pronom), lieux, objets et merveilles
+LEXICON = {
+    "Renaissance (1400-1600)": {
+        "era": "la Renaissance",
+        "years": (1450, 1590),
+        "characters": [
+            ("Giulia", "apprentie verrière", "elle"),
+            ("Lorenzo", "copiste au service d'un banquier", "il"),
+            ("Bianca", "fille d'un cartographe", "elle"),
+            ("Matteo", "jeune peintre sans commande", "il"),
+        ],
+        "places": ["à Florence", "dans un atelier de Venise", "sur les quais de Gênes",
+                   "dans les faubourgs de Milan", "dans une imprimerie de Lyon"],
+        "objects": ["une presse à imprimer", "un astrolabe de laiton", "une lentille polie",
+                    "une carte marine", "un métier à tisser"],
+        "inventions": ["une presse capable d'imprimer en couleurs", "une lunette aux verres taillés en Flandre",
+                       "une horloge de poche à ressort", "un moulin à eau qui actionnait des scies"],
+        "marvels": ["des automates à ressorts qui recopiaient les manuscrits",
+                    "des lunettes capables de lire une lettre à une lieue",
+                    "des machines volantes sorties des carnets de Léonard",
+                    "des horloges qui annonçaient la pluie trois jours à l'avance"],
+        "institutions": ["la guilde des peintres", "le conseil de la cité", "la banque des Médicis",
+                         "la confrérie des imprimeurs"],
+        "crowds": ["les marchands", "les apprentis", "les bourgeois de la ville", "les mécènes"],
+        "omens": ["une fresque changeait de couleurs les soirs d'orage",
+                  "une cloche sonnait parfois seule à minuit",
+                  "les pages d'un vieux traité se réécrivaient pendant la nuit"],
+        "wonders": ["les pigments prenaient la couleur des pensées de celui qui peignait",
+                    "les statues du jardin se tournaient vers ceux qui disaient la vérité",
+                    "certaines cartes montraient des terres qui n'existaient pas encore"],
+    },
+    "Révolution française (1789-1799)": {
+        "era": "la Révolution",
+        "years": (1789, 1799),
+        "characters": [
+            ("Louise", "imprimeuse rue de la Harpe", "elle"),
+            ("Antoine", "clerc auprès d'un député", "il"),
+            ("Margot", "blanchisseuse du faubourg Saint-Antoine", "elle"),
+            ("Étienne", "horloger du Palais-Royal", "il"),
+        ],
+        "places": ["à Paris", "dans le faubourg Saint-Antoine", "sur les quais de la Seine",
+                   "dans une section du Marais", "à Lyon"],
+        "objects": ["une presse à bras", "une lanterne à huile", "une cocarde tricolore",
+                    "un registre de section", "un pamphlet fraîchement imprimé"],
+        "inventions": ["un télégraphe à bras qui reliait Paris aux frontières", "une presse mécanique à cylindre",
+                       "des ballons captifs pour observer la ville", "une horloge décimale"],
+        "marvels": ["des presses à vapeur qui tiraient un journal par heure",
+                    "des machines à calculer chargées de compter les suffrages",
+                    "des ballons dirigeables qui portaient les nouvelles aux provinces",
+                    "des lanternes électriques qui éclairaient les assemblées toute la nuit"],
+        "institutions": ["l'Assemblée", "le club des Jacobins", "la Commune de Paris", "la section du quartier"],
+        "crowds": ["les sans-culottes", "les artisans", "les femmes des halles", "les députés"],
+        "omens": ["les affiches collées la veille disparaissaient au matin",
+                  "une voix chantait la Marseillaise dans les caves vides",
+                  "l'encre des décrets pâlissait quand on y lisait un mensonge"],
+        "wonders": ["l'encre de certaines presses rendait les mots littéralement convaincants",
+                    "les pavés de la Bastille gardaient la mémoire de ceux qui les avaient foulés",
+                    "les bonnets phrygiens chuchotaient à l'oreille de ceux qui les portaient"],
+    },
+    "Révolution industrielle (1760-1840)": {
+        "era": "la révolution industrielle",
+        "years": (1765, 1840),
+        "characters": [
+            ("Mary", "fileuse dans une manufacture", "elle"),
+            ("Thomas", "mécanicien de locomotive", "il"),
+            ("Ada", "fille d'un maître de forges", "elle"),
+            ("Samuel", "contremaître d'une filature", "il"),
+        ],
+        "places": ["à Manchester", "dans une filature de Lille", "près des forges du Creusot",
+                   "sur les docks de Liverpool", "dans un faubourg de Birmingham"],
+        "objects": ["une machine à vapeur", "un métier à tisser mécanique", "une lampe à gaz",
+                    "une locomotive", "une pompe à balancier"],
+        "inventions": ["un métier à tisser programmé par cartes perforées", "un télégraphe électrique",
+                       "une machine à coudre", "des bateaux à vapeur à hélice"],
+        "marvels": ["des machines à différences qui tenaient les comptes de toute la ville",
+                    "des trains qui reliaient Londres à Paris sous la mer",
+                    "des usines entièrement conduites par des automates",
+                    "des fiacres à vapeur qui circulaient sans cocher"],
+        "institutions": ["la direction de la manufacture", "le syndicat des fileuses",
+                         "la compagnie des chemins de fer", "le conseil municipal"],
+        "crowds": ["les ouvriers", "les fileuses", "les ingénieurs", "les enfants des filatures"],
+        "omens": ["une machine arrêtée depuis des années se remettait parfois en marche",
+                  "la fumée des cheminées dessinait des visages dans le ciel",
+                  "les horloges de l'usine avançaient toutes de la même minute"],
+        "wonders": ["les machines fonctionnaient aux rêves collectés dans les quartiers ouvriers",
+                    "la vapeur des chaudières portait les voix des disparus",
+                    "certains rouages tournaient à rebours pour réparer le temps perdu"],
+    },
+    "Belle Époque (1871-1914)": {
+        "era": "la Belle Époque",
+        "years": (1875, 1913),
+        "characters": [
+            ("Suzanne", "opératrice de cinématographe", "elle"),
+            ("Henri", "photographe de boulevard", "il"),
+            ("Camille", "électricienne de l'Exposition", "elle"),
+            ("Gaston", "mécanicien d'automobiles", "il"),
+        ],
+        "places": ["à Paris", "sur les Grands Boulevards", "à l'Exposition universelle",
+                   "dans un café de Montmartre", "à Lyon"],
+        "objects": ["une lampe électrique", "un phonographe", "une bicyclette", "un appareil photographique",
+                    "une automobile"],
+        "inventions": ["un cinématographe en couleurs", "un téléphone public dans chaque quartier",
+                       "un métropolitain électrique", "des aéroplanes de plaisance"],
+        "marvels": ["des automobiles volantes qui survolaient la Seine",
+                    "des téléphones capables de transmettre les images",
+                    "des tours électriques qui éclairaient la ville comme en plein jour",
+                    "des machines parlantes qui traduisaient toutes les langues"],
+        "institutions": ["la Chambre des députés", "l'Académie des sciences", "le comité de l'Exposition",
+                         "la presse du matin"],
+        "crowds": ["les badauds", "les inventeurs", "les ouvrières", "les artistes"],
+        "omens": ["les photographies montraient parfois des passants absents de la scène",
+                  "un phonographe rejouait des conversations que personne n'avait enregistrées",
+                  "les réverbères s'éteignaient au passage de certaines personnes"],
+        "wonders": ["les photographies capturaient les émotions plutôt que les visages",
+                    "les téléphones permettaient de converser avec les morts",
+                    "la musique des cabarets faisait tourner les moteurs"],
+    },
+    "Années folles (1920-1929)": {
+        "era": "les Années folles",
+        "years": (1920, 1929),
+        "characters": [
+            ("Joséphine", "danseuse de revue", "elle"),
+            ("Paul", "saxophoniste d'un club de jazz", "il"),
+            ("Madeleine", "aviatrice", "elle"),
+            ("Louis", "peintre de Montparnasse", "il"),
+        ],
+        "places": ["à Montmartre", "dans un club de jazz de Pigalle", "à Montparnasse",
+                   "sur la Côte d'Azur", "dans un dancing des Champs-Élysées"],
+        "objects": ["un gramophone", "un poste de radio", "une automobile décapotable", "un saxophone",
+                    "un appareil de cinéma"],
+        "inventions": ["le cinéma parlant", "la radio dans chaque foyer", "des avions de ligne",
+                       "des réfrigérateurs électriques"],
+        "marvels": ["des postes de télévision dans chaque café",
+                    "des avions qui traversaient l'Atlantique en une nuit",
+                    "des machines qui composaient du jazz à la demande",
+                    "des taxis aériens qui se posaient sur les toits"],
+        "institutions": ["le gouvernement", "la Bourse de Paris", "la direction du music-hall",
+                         "le syndicat des musiciens"],
+        "crowds": ["les danseurs", "les musiciens", "les noctambules", "les anciens combattants"],
+        "omens": ["certaines notes de saxophone faisaient trembler les verres sans raison",
+                  "une danseuse apparaissait chaque nuit dans les miroirs du club",
+                  "les disques rayés jouaient des airs qui n'avaient jamais été composés"],
+        "wonders": ["les notes de jazz rendaient l'air plus léger et les danseurs défiaient la gravité",
+                    "certaines mélodies effaçaient pour un soir les souvenirs de la guerre",
+                    "les cocktails d'un bar de Pigalle faisaient voir l'avenir"],
+    },
+}
+
+
+# Gabarits de phrases. Emplacements : {name}, {role}, {pronoun}, {object_pronoun} (le/la), {e} (accord féminin), {place}, {year}, {era}, {object},
+# {invention}, {marvel}, {institution}, {crowd}, {omen}, {wonder}, {keyword}
+OPENINGS = [
+    "En {year}, {place}, {name}, {role}, commençait sa journée sans se douter que le monde avait déjà "
+    "légèrement dévié de sa course.",
+    "{place}, en cette année {year}, {name} observait {crowd} avec la curiosité de ceux qui pressentent "
+    "un changement.",
+    "Personne, {place}, n'aurait su dire quand tout avait commencé, mais {name}, {role}, se souvenait "
+    "précisément de ce printemps {year}.",
+    "C'était {era}, ou presque : {place}, en {year}, les choses ressemblaient à celles que racontent "
+    "les livres d'histoire, à quelques détails près.",
+    "{name}, {role}, vivait {place} en {year}, à une époque que l'on appellerait plus tard {era}.",
+]
+
+# Phrases par palier (0 à 3) de chaque curseur
+TECH_SENTENCES = [
+    [
+        "Les outils restaient ceux de l'époque, et {name} ne leur demandait rien de plus que ce qu'ils "
+        "savaient faire.",
+        "{crowd} travaillaient comme leurs parents avant eux, avec {object} et beaucoup de patience.",
+    ],
+    [
+        "Une petite amélioration avait pourtant changé bien des choses : {object}, dont le réglage avait "
+        "été repris par un artisan obstiné, faisait gagner à {crowd} des heures chaque semaine.",
+        "Chaque matin, {name} vérifiait {object} que l'on venait de perfectionner, un détail que les "
+        "chroniques officielles ne mentionneraient jamais.",
+        "Ce n'était presque rien, un engrenage en plus, une vis mieux taillée, mais {crowd} en parlaient "
+        "déjà comme d'un progrès.",
+    ],
+    [
+        "Plusieurs inventions étaient apparues {place} avant leur temps, et {crowd} s'y étaient habitués "
+        "plus vite qu'on ne l'aurait cru.",
+        "On y utilisait {invention}, une nouveauté que les autres villes regardaient avec un mélange "
+        "d'envie et de méfiance.",
+        "{name} passait de longues soirées à étudier {invention} pour en comprendre le principe.",
+    ],
+    [
+        "Dans les rues, on croisait {marvel}, et les voyageurs restaient bouche bée devant ce que la "
+        "ville tenait pour ordinaire.",
+        "Surtout, il existait {marvel}, des technologies très en avance sur l'époque que plus personne "
+        "ne trouvait extraordinaires.",
+        "{name} savait que {marvel} auraient dû appartenir à un autre siècle ; {pronoun} se demandait "
+        "parfois qui avait ouvert cette porte.",
+    ],
+]
+
+SOCIAL_SENTENCES = [
+    [
+        "L'ordre social restait celui que l'on connaît : {institution} décidait, et {crowd} obéissaient.",
+    ],
+    [
+        "Quelques règles avaient pourtant changé : {institution} acceptait désormais d'entendre {crowd}, "
+        "au moins une fois par mois.",
+        "On murmurait que {institution} avait assoupli ses usages, et {name} en avait profité plus "
+        "d'une fois.",
+    ],
+    [
+        "Les changements sociaux étaient notables : {crowd} siégeaient aux côtés des notables, et leurs "
+        "voix comptaient autant.",
+        "Depuis quelques années, {institution} élisait ses membres à main levée, une coutume qui aurait "
+        "fait scandale partout ailleurs.",
+        "Les femmes et les apprentis prenaient la parole en public sans que personne ne s'en offusque.",
+    ],
+    [
+        "La société elle-même avait pris une autre forme : il n'y avait plus ni maîtres ni serviteurs, "
+        "seulement des assemblées où chacun parlait à son tour.",
+        "Ce que les livres appellent {institution} n'existait plus ; à sa place, {crowd} gouvernaient "
+        "ensemble, par tirage au sort.",
+        "{name} avait du mal à imaginer un monde où quelques-uns décideraient pour tous, tant cette idée "
+        "paraissait ancienne.",
+    ],
+]
+
+FANTASY_SENTENCES = [
+    [
+        "Rien, en apparence, n'échappait aux lois ordinaires de la nature.",
+    ],
+    [
+        "Il arrivait pourtant que des choses restent inexpliquées : {omen}.",
+        "{name} avait remarqué un détail que personne d'autre ne semblait voir, et ce mystère ne "
+        "{object_pronoun} quittait plus.",
+    ],
+    [
+        "Des phénomènes inexpliqués se multipliaient {place} : {omen}, et les savants ne savaient "
+        "qu'en dire.",
+        "{crowd} avaient fini par accepter ces bizarreries comme on accepte la pluie.",
+        "On racontait aussi que {omen}, mais personne n'osait en parler trop fort.",
+    ],
+    [
+        "La magie était là, discrète mais bien réelle : {wonder}.",
+        "{name} avait découvert que {wonder}, et {pronoun} gardait ce secret avec soin.",
+        "Chacun savait, sans jamais le dire, que {wonder}.",
+    ],
+]
+
+DEVELOPMENT_SENTENCES = [
+    "Les jours passaient, et {name} apprenait à lire les signes de ce monde un peu décalé.",
+    "Un soir, {name} reçut la visite d'un inconnu qui semblait en savoir beaucoup trop sur la ville.",
+    "{crowd} se réunissaient souvent pour discuter des dernières nouvelles, et les conversations "
+    "duraient tard dans la nuit.",
+    "Il fallait parfois choisir entre la prudence et la curiosité ; {name} choisissait presque toujours "
+    "la curiosité.",
+    "Les rumeurs allaient bon train, et chacun y ajoutait un détail de son invention.",
+    "{name} tenait un carnet où {pronoun} notait tout ce qui semblait s'écarter de l'ordinaire.",
+    "Au marché, on parlait de {object} comme d'autres parlent du temps qu'il fait.",
+    "Certains jours, le passé semblait plus proche que jamais, comme si une autre histoire attendait "
+    "son tour.",
+    "{name} comprit peu à peu que chaque détail de sa vie tenait à un équilibre fragile.",
+    "Les anciens secouaient la tête : de leur temps, disaient-ils, les choses ne se passaient pas ainsi.",
+    "Une lettre arriva un matin, scellée d'un cachet que personne ne reconnut.",
+    "{name} se rendit auprès de {institution} pour y chercher des réponses, mais n'en rapporta que de "
+    "nouvelles questions.",
+    "La ville changeait lentement, rue après rue, sans que personne ne puisse dire à quel moment elle "
+    "était devenue différente.",
+    "Entre deux tâches, {name} regardait passer {crowd} et se demandait ce que les générations futures "
+    "retiendraient de cette époque.",
+    "Les saisons se succédaient, fidèles à elles-mêmes, et c'était peut-être la seule chose qui n'avait "
+    "pas changé.",
+    "Un ami de longue date confia à {name} qu'il avait fait le même rêve trois nuits de suite.",
+    "Il y avait dans l'air une forme d'attente, comme avant un orage ou une grande nouvelle.",
+    "{name} décida de suivre cette piste jusqu'au bout, quoi qu'il en coûte.",
+    "Dans les conversations, le mot « {keyword} » revenait sans cesse, chargé d'espoirs nouveaux.",
+    "On ne parlait que de {keyword}, et le mot prenait ici un sens légèrement différent de celui "
+    "des livres.",
+    "Le soir, à la lueur d'une chandelle, {name} relisait ses notes en cherchant le fil qui reliait "
+    "tous ces événements.",
+    "Rien ne pressait, et pourtant chacun sentait que les prochains mois décideraient de bien des choses.",
+    "{name} n'était pas seul{e} à se poser des questions, mais rares étaient ceux qui osaient les "
+    "formuler à voix haute.",
+    "Une dispute éclata un jour entre {crowd}, et {institution} dut intervenir pour ramener le calme.",
+]
+
+# Conclusions, selon le curseur dominant
+CLOSINGS = {
+    None: [
+        "Des siècles plus tard, les historiens ne trouveraient rien d'anormal dans les archives ; seul "
+        "le carnet de {name} racontait une histoire un peu différente.",
+        "{name} referma sa porte ce soir-là avec le sentiment que le monde avait tenu bon, une fois "
+        "encore.",
+    ],
+    "tech": [
+        "Le progrès, pensait {name}, n'était pas une ligne droite mais un chemin qui aurait pu bifurquer "
+        "à chaque instant ; ici, il avait simplement pris une autre route.",
+        "En regardant une dernière fois les machines de la ville, {name} comprit que l'avenir était "
+        "arrivé plus tôt que prévu, et qu'il faudrait apprendre à vivre avec.",
+    ],
+    "social": [
+        "Ce soir-là, en écoutant {crowd} débattre jusqu'à l'aube, {name} sut que cette société nouvelle, "
+        "si fragile fût-elle, valait la peine d'être défendue.",
+        "L'histoire officielle retiendrait d'autres noms, mais {name} savait que le vrai changement "
+        "s'était fait ici, parmi {crowd}.",
+    ],
+    "fantasy": [
+        "Le mystère demeura entier, et {name} finit par comprendre que certaines questions n'attendaient "
+        "pas de réponse, seulement des témoins.",
+        "Au matin, tout semblait normal ; pourtant {name} savait désormais que la réalité n'était qu'une "
+        "version parmi d'autres.",
+    ],
+}
+
+DIMENSIONS = (("tech", TECH_SENTENCES), ("social", SOCIAL_SENTENCES), ("fantasy", FANTASY_SENTENCES))
+
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?…])\s+')
+
+# Phrases qui renvoient à une phrase précédente : inutilisables hors de leur récit
+_DANGLING_START = re.compile(r"^(mais|et|ils|elles|il|elle|ces|cette|ce|cet|leur|leurs|son|sa|ses|puis|alors|"
+                             r"pourtant|ensuite|car|donc)\b", re.IGNORECASE)
+
+# Marqueurs d'une phrase en anglais (raisonnement du modèle resté dans le récit)
+_ENGLISH_MARKERS = re.compile(r"\b(the|and|okay|let me|user|story|should)\b", re.IGNORECASE)
+
+
+def bucket_key(buckets):
+    """Clé d'index du modèle : un caractère par curseur, '*' pour tous les paliers"""
+    return "".join("*" if bucket is None else str(bucket) for bucket in buckets)
+
+
+def _key_matches(key, buckets):
+    return all(k == "*" or int(k) == bucket for k, bucket in zip(key, buckets))
+
+
+def _capitalize(sentence):
+    return sentence[:1].upper() + sentence[1:]
+
+
+class OfflineStoryEngine:
+    """Composition de récits à partir de la grammaire et des phrases du modèle précalculé"""
+
+    def __init__(self, sentences=None):
+        # époque -> clé de paliers -> phrases
+        self.sentences = sentences or {}
+
+    @classmethod
+    def load(cls, path=DEFAULT_MODEL_PATH):
+        """Charge le modèle ; sans fichier lisible, seule la grammaire est utilisée"""
+        try:
+            with open(path, encoding="utf-8") as f:
+                model = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Modèle hors-ligne illisible ({path}): {str(e)}")
+            return cls()
+        if model.get("version") != MODEL_VERSION:
+            logger.warning(f"⚠️ Version du modèle hors-ligne non prise en charge: {model.get('version')}")
+            return cls()
+        return cls(model.get("sentences", {}))
+
+    def corpus_sentences(self, epoch, buckets):
+        """Phrases du modèle compatibles avec l'époque et les paliers, les plus spécifiques d'abord"""
+        by_key = self.sentences.get(epoch, {})
+        keys = sorted((key for key in by_key if _key_matches(key, buckets)), key=lambda key: key.count("*"))
+        return [sentence for key in keys for sentence in by_key[key]]
+
+    def generate(self, epoch, buckets, story_length, rng=None):
+        """Récit de l'époque, fidèle aux paliers (tech, social, fantasy), dans la plage de mots demandée"""
+        rng = rng or random.Random()
+        lexicon = LEXICON[epoch]
+        min_words, max_words = WORD_RANGES[story_length]
+
+        name, role, pronoun = rng.choice(lexicon["characters"])
+        feminine = pronoun == "elle"
+        fixed = {
+            "name": name,
+            "role": role,
+            "pronoun": pronoun,
+            "object_pronoun": "la" if feminine else "le",
+            "e": "e" if feminine else "",
+            "place": rng.choice(lexicon["places"]),
+            "year": rng.randint(*lexicon["years"]),
+            "era": lexicon["era"],
+        }
+        choices = {
+            "object": lexicon["objects"],
+            "invention": lexicon["inventions"],
+            "marvel": lexicon["marvels"],
+            "institution": lexicon["institutions"],
+            "crowd": lexicon["crowds"],
+            "omen": lexicon["omens"],
+            "wonder": lexicon["wonders"],
+            "keyword": EPOCHS[epoch]["keywords"],
+        }
+
+        # Tirage sans remise : une même merveille ne revient qu'une fois toutes les autres utilisées
+        drawn = {slot: [] for slot in choices}
+
+        def draw(slot):
+            if not drawn[slot]:
+                drawn[slot] = list(choices[slot])
+                rng.shuffle(drawn[slot])
+            return drawn[slot].pop()
+
+        def fill(template):
+            slots = dict(fixed)
+            for slot in choices:
+                if "{" + slot + "}" in template:
+                    slots[slot] = draw(slot)
+            return _capitalize(template.format(**slots))
+
+        # Une phrase par curseur actif pour l'exposition, les autres selon l'intensité du palier
+        leading = []
+        extra = []
+        for (dimension, sentences), bucket in zip(DIMENSIONS, buckets):
+            pool = list(sentences[bucket])
+            rng.shuffle(pool)
+            if bucket:
+                leading.append(fill(pool[0]))
+                extra.extend(fill(template) for template in pool[1:bucket])
+            else:
+                extra.append(fill(pool[0]))
+
+        strongest = max(buckets)
+        dominant = None
+        if strongest:
+            dominant = rng.choice([dimension for (dimension, _), bucket in zip(DIMENSIONS, buckets)
+                                   if bucket == strongest])
+
+        opening = fill(rng.choice(OPENINGS))
+        closing = fill(rng.choice(CLOSINGS[dominant]))
+
+        corpus = self.corpus_sentences(epoch, buckets)
+        rng.shuffle(corpus)
+        development = list(DEVELOPMENT_SENTENCES)
+        rng.shuffle(development)
+
+        body = [opening] + leading
+        used = count_words(" ".join(body)) + count_words(closing)
+        target = rng.randint(min_words, (min_words + max_words) // 2)
+
+        def candidates():
+            for sentence in extra:
+                yield sentence
+            for sentence in corpus:
+                yield sentence
+            for template in development:
+                yield fill(template)
+            # Récits longs : gabarits réutilisés, avec d'autres tirages des emplacements
+            while True:
+                yield fill(rng.choice(development))
+
+        middle = []
+        for attempt, sentence in enumerate(candidates()):
+            if used >= target or attempt > 500:
+                break
+            words = count_words(sentence)
+            if used + words <= max_words and sentence not in middle:
+                middle.append(sentence)
+                used += words
+
+        # Phrases des curseurs réparties dans le récit plutôt que regroupées
+        rng.shuffle(middle)
+        sentences = body + middle + [closing]
+        paragraphs = [" ".join(sentences[index:index + PARAGRAPH_SENTENCES])
+                      for index in range(0, len(sentences), PARAGRAPH_SENTENCES)]
+        return "\n\n".join(paragraphs)
+
+    def generate_from_prompt(self, prompt, rng=None):
+        epoch, buckets, story_length = parse_prompt(prompt)
+        with REGISTRY.timer("offline_generation"):
+            return self.generate(epoch, buckets, story_length, rng)
+
+
+_engine = None
+_engine_path = DEFAULT_MODEL_PATH
+_engine_lock = threading.Lock()
+
+
+def configure(path=None):
+    """Charge le modèle de `path` (défaut : data/offline_model.json) et le rend actif pour le processus"""
+    global _engine, _engine_path
+    engine = OfflineStoryEngine.load(path or DEFAULT_MODEL_PATH)
+    with _engine_lock:
+        _engine, _engine_path = engine, path or DEFAULT_MODEL_PATH
+    return engine
+
+
+def get_engine():
+    """Moteur du processus, chargé à la première utilisation s'il n'a pas été configuré"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = OfflineStoryEngine.load(_engine_path)
+        return _engine
+
+
+def split_sentences(story):
+    """Phrases d'un récit utilisables par le modèle"""
+    for paragraph in story.split("\n"):
+        for sentence in _SENTENCE_SPLIT.split(paragraph.strip()):
+            sentence = sentence.strip()
+            words = count_words(sentence)
+            if not MIN_SENTENCE_WORDS <= words <= MAX_SENTENCE_WORDS:
+                continue
+            if not sentence[:1].isupper() or sentence[-1] not in ".!?…" or "<" in sentence:
+                continue
+            if _ENGLISH_MARKERS.search(sentence) or _DANGLING_START.match(sentence):
+                continue
+            yield sentence
+
+
+def build_model(stories, max_per_key=MAX_SENTENCES_PER_KEY, max_per_epoch=MAX_SENTENCES_PER_EPOCH):
+    """Modèle borné à partir de récits (époque, niveaux tech/social/fantasy, texte)
+
+    Chaque élément de `stories` est un tuple (epoch, tech_level, social_change,
+    fantasy_elements, story) ; un niveau None vaut pour tous les paliers.
+    """
+    sentences = {}
+    seen = set()
+    per_epoch = {}
+    for epoch, tech, social, fantasy, story in stories:
+        if epoch not in LEXICON:
+            continue
+        key = bucket_key(None if level is None else divergence_bucket(level) for level in (tech, social, fantasy))
+        bucket = sentences.setdefault(epoch, {}).setdefault(key, [])
+        for sentence in split_sentences(story):
+            if len(bucket) >= max_per_key or per_epoch.get(epoch, 0) >= max_per_epoch:
+                break
+            if sentence in seen:
+                continue
+            seen.add(sentence)
+            bucket.append(sentence)
+            per_epoch[epoch] = per_epoch.get(epoch, 0) + 1
+    return {
+        "version": MODEL_VERSION,
+        "sentences": {epoch: {key: values for key, values in keys.items() if values}
+                      for epoch, keys in sentences.items()},
+    }
+
+
+def seed_stories():
+    """Récits hors-ligne historiques : fantastiques, sans paliers technique ni social précis"""
+    for short_name, story in FALLBACK_STORIES.items():
+        epoch = next(name for name in EPOCHS if name.startswith(short_name))
+        yield epoch, None, None, 100, story
+
+
+def stored_stories(path):
+    """Récits générés par le modèle, lus dans l'historique SQLite"""
+    from story_store import StoryStore
+
+    store = StoryStore(path)
+    page = 0
+    while True:
+        records = store.page(page, 500, is_fallback=False)
+        if not records:
+            return
+        for record in records:
+            yield record.epoch, record.tech_level, record.social_change, record.fantasy_elements, record.story
+        page += 1
+
+
+def batch_stories(path):
+    """Récits générés par le modèle, lus dans un fichier JSONL de batch.py"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get("is_fallback"):
+                continue
+            yield (record["epoch"], record["tech_level"], record["social_change"], record["fantasy_elements"],
+                   record["story"])
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Construit le modèle du moteur hors-ligne")
+    parser.add_argument("--store", nargs="*", default=[], help="historiques SQLite (story_store.py)")
+    parser.add_argument("--batch", nargs="*", default=[], help="fichiers JSONL produits par batch.py")
+    parser.add_argument("--output", default=DEFAULT_MODEL_PATH, help="fichier du modèle")
+    parser.add_argument("--max-per-key", type=int, default=MAX_SENTENCES_PER_KEY,
+                        help="phrases au plus par époque et combinaison de paliers")
+    parser.add_argument("--max-per-epoch", type=int, default=MAX_SENTENCES_PER_EPOCH,
+                        help="phrases au plus par époque")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    def sources():
+        # Récits générés d'abord : le quota de phrases leur revient en priorité
+        for path in args.store:
+            yield from stored_stories(path)
+        for path in args.batch:
+            yield from batch_stories(path)
+        yield from seed_stories()
+
+    model = build_model(sources(), args.max_per_key, args.max_per_epoch)
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(model, f, ensure_ascii=False, indent=1)
+
+    total = sum(len(values) for keys in model["sentences"].values() for values in keys.values())
+    print(f"{total} phrases, {len(model['sentences'])} époques → {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+from metrics import REGISTRY
+from text_analysis import content_frequencies, frequency_table
+
+# Options de rendu par défaut du nuage de mots
+WORDCLOUD_OPTIONS = {
+    "width": 300,
+    "height": 200,
+    "background_color": "white",
+    "colormap": "viridis",
+}
+
+
+class PngCache:
+    """Cache LRU borné d'images PNG, partagé par les sessions du processus"""
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            png = self._entries.get(key)
+            if png is not None:
+                self._entries.move_to_end(key)
+            return png
+
+    def put(self, key, png):
+        with self._lock:
+            self._entries[key] = png
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_wordcloud_cache = PngCache()
+
+
+def wordcloud_cache_key(text, options):
+    """Clé de cache : empreinte du texte et des options de rendu"""
+    digest = hashlib.sha256(text.encode("utf-8"))
+    digest.update(repr(sorted(options.items())).encode("utf-8"))
+    return digest.hexdigest()
+
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+def _load_renderer():
+    """Importe matplotlib et wordcloud au premier rendu seulement (~0,4 s au démarrage)"""
+    global _renderer
+    if _renderer is None:
+        with _renderer_lock:
+            if _renderer is None:
+                import matplotlib
+                matplotlib.use("Agg")
+                import matplotlib.pyplot as plt
+                from wordcloud import WordCloud
+                _renderer = (plt, WordCloud)
+    return _renderer
+
+
+def _render_wordcloud(text, options):
+    plt, WordCloud = _load_renderer()
+    # Même table de fréquences que l'analyse du récit : pas de seconde tokenisation par WordCloud
+    frequencies = content_frequencies(frequency_table(text))
+    wordcloud = WordCloud(**options).generate_from_frequencies(frequencies)
+
+    fig, ax = plt.subplots(figsize=(6, 4))
+    try:
+        ax.imshow(wordcloud, interpolation='bilinear')
+        ax.axis('off')
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format="png", bbox_inches="tight")
+        return buffer.getvalue()
+    finally:
+        # Libère explicitement la figure : pyplot la garderait sinon en mémoire
+        plt.close(fig)
+
+
+def render_wordcloud_png(text, **options):
+    """Renvoie le nuage de mots du texte en PNG, calculé une seule fois par texte et options"""
+    options = dict(WORDCLOUD_OPTIONS, **options)
+    key = wordcloud_cache_key(text, options)
+
+    png = _wordcloud_cache.get(key)
+    if png is None:
+        with REGISTRY.timer("wordcloud_render"):
+            png = _render_wordcloud(text, options)
+        _wordcloud_cache.put(key, png)
+    else:
+        REGISTRY.inc("wordcloud_cache_hits_total")
+    return png
@@ -0,0 +1,158 @@
+import email.utils
+import random
+import threading
+import time
+
+# Catégories d'erreurs renvoyées par l'API
+ERROR_LOADING = "loading"        # 503 : modèle en cours de chargement
+ERROR_RATE_LIMIT = "rate_limit"  # 429 : limite de taux atteinte
+ERROR_SERVER = "server"          # 5xx, timeouts et erreurs réseau
+ERROR_FATAL = "fatal"            # 4xx : inutile de réessayer
+
+RETRYABLE_ERRORS = (ERROR_LOADING, ERROR_RATE_LIMIT, ERROR_SERVER)
+
+
+class ClassifiedError:
+    """Erreur d'appel classée par code HTTP, avec le délai Retry-After éventuel"""
+
+    __slots__ = ("kind", "status", "retry_after")
+
+    def __init__(self, kind, status=None, retry_after=None):
+        self.kind = kind
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self):
+        return self.kind in RETRYABLE_ERRORS
+
+
+def parse_retry_after(value, now=None):
+    """Convertit un en-tête Retry-After (secondes ou date HTTP) en secondes"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_date is None:
+        return None
+    now = time.time() if now is None else now
+    return max(0.0, retry_date.timestamp() - now)
+
+
+def classify_error(error):
+    """Classe une exception d'appel API à partir de son code HTTP"""
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None)
+    headers = getattr(response, "headers", None) or {}
+    retry_after = parse_retry_after(headers.get("Retry-After")) if headers else None
+
+    if status is None:
+        # Pas de réponse HTTP : timeout ou erreur réseau, ou message d'erreur seul
+        message = str(error).lower()
+        if "503" in message or "loading" in message:
+            return ClassifiedError(ERROR_LOADING, 503)
+        if "429" in message or "rate limit" in message:
+            return ClassifiedError(ERROR_RATE_LIMIT, 429)
+        if isinstance(error, (TimeoutError, ConnectionError)) or "timeout" in message or "connection" in message:
+            return ClassifiedError(ERROR_SERVER)
+        return ClassifiedError(ERROR_FATAL)
+
+    if status == 503:
+        return ClassifiedError(ERROR_LOADING, status, retry_after)
+    if status == 429:
+        return ClassifiedError(ERROR_RATE_LIMIT, status, retry_after)
+    if status >= 500 or status == 408:
+        return ClassifiedError(ERROR_SERVER, status, retry_after)
+    return ClassifiedError(ERROR_FATAL, status)
+
+
+class RetryPolicy:
+    """Backoff exponentiel plafonné avec jitter, dans un budget d'attente total par appel"""
+
+    def __init__(self, max_retries=3, base_delay=1.0, max_delay=8.0, max_total_wait=15.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_total_wait = max_total_wait
+
+    def next_delay(self, attempt, classified, waited=0.0):
+        """Délai avant la tentative suivante, ou None s'il vaut mieux abandonner tout de suite"""
+        if not classified.retryable or attempt + 1 >= self.max_retries:
+            return None
+
+        if classified.retry_after is not None:
+            # Le serveur impose son délai : au-delà du plafond, mieux vaut dégrader immédiatement
+            delay = classified.retry_after
+            if delay > self.max_delay:
+                return None
+        else:
+            # "Full jitter" : étale les reprises des sessions concurrentes
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+        if waited + delay > self.max_total_wait:
+            return None
+        return delay
+
+
+class CircuitBreaker:
+    """Disjoncteur partagé par le processus : coupe les appels tant que l'API échoue"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=3, recovery_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """Indique si un appel peut partir ; en demi-ouverture, une seule sonde à la fois"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.recovery_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN:
+                self._open()
+                return
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self._open()
+
+    def release(self):
+        """Libère la sonde sans verdict (appel abandonné avant sa fin)"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probe_in_flight = False
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
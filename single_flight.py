@@ -0,0 +1,164 @@
+"""Regroupement des générations identiques en cours (single-flight)
+
+Quand plusieurs sessions demandent le même prompt au même modèle en même
+temps, un seul appel part vers le backend et toutes reçoivent son résultat,
+ou ses fragments en streaming. L'appel s'exécute dans un thread qui lui est
+propre : une session abandonnée (rerun, onglet fermé) ne bloque pas les
+autres, et chaque abonné attend avec son propre délai maximal.
+"""
+import logging
+import threading
+import time
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+
+class Flight:
+    """Un appel en cours et ses abonnés"""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.subscribers = 1
+        self.finished = False
+        self.cancelled = False
+        self.result = None
+        self.error = None
+        self.chunks = []
+        self.messages = []
+
+    def notify(self, level, message):
+        # Messages destinés à l'interface, relayés dans chaque session abonnée
+        with self.condition:
+            self.messages.append((level, message))
+            self.condition.notify_all()
+
+
+class SingleFlight:
+    """Table des appels en cours, partagée par toutes les sessions du processus"""
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._flights)
+
+    def __contains__(self, key):
+        flight = self._flights.get(key)
+        return flight is not None and not flight.cancelled
+
+    def _join(self, key, mode, target):
+        with self._lock:
+            flight = self._flights.get(key)
+            # Un flux annulé faute d'abonnés ne peut plus être rejoint
+            if flight is not None and not flight.cancelled:
+                flight.subscribers += 1
+                REGISTRY.inc("single_flight_joined_total", mode=mode)
+                return flight
+            flight = self._flights[key] = Flight()
+
+        thread = threading.Thread(target=target, args=(key, flight), name=f"single-flight-{mode}", daemon=True)
+        thread.start()
+        return flight
+
+    def _leave(self, flight, cancel):
+        with self._lock:
+            flight.subscribers -= 1
+            if cancel and not flight.subscribers and not flight.finished:
+                flight.cancelled = True
+
+    def _finish(self, key, flight):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        with flight.condition:
+            flight.finished = True
+            flight.condition.notify_all()
+
+    def do(self, key, fn, timeout=None, notify=None):
+        """Renvoie fn(notify), calculé une seule fois pour tous les appels simultanés de même clé
+
+        fn reçoit une fonction notify(level, message) ; ses messages sont relayés
+        au fil de l'eau dans le notify de chaque appelant, pendant que fn attend
+        ses reprises dans son propre thread. Lève TimeoutError au-delà de timeout
+        secondes, sans interrompre l'appel en cours pour les autres abonnés.
+        """
+        def run(key, flight):
+            try:
+                flight.result = fn(flight.notify)
+            except Exception as e:
+                flight.error = e
+            finally:
+                self._finish(key, flight)
+
+        flight = self._join(key, "complete", run)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        relayed = 0
+        try:
+            while True:
+                with flight.condition:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if not flight.condition.wait_for(
+                            lambda: flight.finished or len(flight.messages) > relayed, remaining):
+                        raise TimeoutError(f"Génération partagée toujours en cours après {timeout}s")
+                    messages = flight.messages[relayed:]
+                    finished = flight.finished
+                relayed += len(messages)
+                if notify is not None:
+                    for level, message in messages:
+                        notify(level, message)
+                if finished:
+                    break
+        finally:
+            # Un appel non-streaming ne peut pas être interrompu : il se termine pour les suivants
+            self._leave(flight, cancel=False)
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def stream(self, key, fn, timeout=None):
+        """Fragments de fn(), produits une seule fois et diffusés à tous les abonnés de même clé
+
+        Un abonné tardif reçoit d'abord les fragments déjà produits. timeout borne
+        l'attente entre deux fragments ; quand le dernier abonné abandonne, le flux
+        amont est fermé.
+        """
+        def pump(key, flight):
+            chunks = fn()
+            try:
+                for chunk in chunks:
+                    if flight.cancelled:
+                        logger.debug("🔌 Plus aucun abonné, flux amont interrompu")
+                        break
+                    with flight.condition:
+                        flight.chunks.append(chunk)
+                        flight.condition.notify_all()
+            except Exception as e:
+                flight.error = e
+            finally:
+                close = getattr(chunks, "close", None)
+                if close is not None:
+                    close()
+                self._finish(key, flight)
+
+        flight = self._join(key, "stream", pump)
+        index = 0
+        try:
+            while True:
+                with flight.condition:
+                    if not flight.condition.wait_for(lambda: index < len(flight.chunks) or flight.finished, timeout):
+                        raise TimeoutError(f"Aucun fragment reçu depuis {timeout}s")
+                    chunks = flight.chunks[index:]
+                    finished = flight.finished
+                index += len(chunks)
+                for chunk in chunks:
+                    yield chunk
+                if finished:
+                    break
+            if flight.error is not None:
+                raise flight.error
+        finally:
+            self._leave(flight, cancel=True)
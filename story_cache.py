@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+
+# Politiques de service du cache
+POLICY_OFF = "off"            # Toujours générer un nouveau récit
+POLICY_CACHE_FIRST = "cache"  # Servir un récit en cache dès qu'il en existe un
+POLICY_FILL = "fill"          # Générer jusqu'à remplir le pool, puis servir depuis le cache
+CACHE_POLICIES = (POLICY_OFF, POLICY_CACHE_FIRST, POLICY_FILL)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_keys (
+    key TEXT PRIMARY KEY,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cache_keys_last_access ON cache_keys (last_access);
+
+CREATE TABLE IF NOT EXISTS cached_stories (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL,
+    story TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cached_stories_key ON cached_stories (key, created_at);
+"""
+
+
+def make_cache_key(prompt, model, params):
+    """Calcule la clé de cache d'un prompt pour un modèle et des paramètres d'échantillonnage"""
+    payload = json.dumps(
+        {"prompt": prompt, "model": model, "params": params},
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class StoryCache:
+    """Cache SQLite (mode WAL) de récits générés, partagé entre sessions et processus"""
+
+    def __init__(self, path, max_stories_per_key=5, max_keys=2000,
+                 ttl_seconds=7 * 24 * 3600, policy=POLICY_FILL):
+        if policy not in CACHE_POLICIES:
+            raise ValueError(f"Politique de cache inconnue : {policy}")
+        self.path = path
+        self.max_stories_per_key = max_stories_per_key
+        self.max_keys = max_keys
+        self.ttl_seconds = ttl_seconds
+        self.policy = policy
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self):
+        # Une connexion par thread : Streamlit exécute chaque session dans son propre thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+        return conn
+
+    def _expiry_threshold(self):
+        return time.time() - self.ttl_seconds if self.ttl_seconds else None
+
+    def pool_size(self, key):
+        """Nombre de récits encore valides pour une clé"""
+        threshold = self._expiry_threshold()
+        row = self._connection().execute(
+            "SELECT COUNT(*) FROM cached_stories WHERE key = ? AND created_at >= ?",
+            (key, threshold if threshold is not None else 0)
+        ).fetchone()
+        return row[0]
+
+    def get(self, key):
+        """Renvoie un récit en cache selon la politique configurée, ou None s'il faut générer"""
+        if self.policy == POLICY_OFF:
+            return None
+
+        threshold = self._expiry_threshold()
+        rows = self._connection().execute(
+            "SELECT story FROM cached_stories WHERE key = ? AND created_at >= ?",
+            (key, threshold if threshold is not None else 0)
+        ).fetchall()
+
+        if not rows:
+            return None
+        if self.policy == POLICY_FILL and len(rows) < self.max_stories_per_key:
+            return None
+
+        self._connection().execute(
+            "UPDATE cache_keys SET last_access = ? WHERE key = ?",
+            (time.time(), key)
+        )
+        # Tirage aléatoire dans le pool pour varier les récits servis
+        return random.choice(rows)[0]
+
+    def put(self, key, story):
+        """Ajoute un récit au pool d'une clé puis applique les évictions"""
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO cache_keys (key, last_access) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET last_access = excluded.last_access",
+                (key, now)
+            )
+            # Un récit déjà présent n'est pas dupliqué (abonnés d'une même génération partagée)
+            conn.execute(
+                "INSERT INTO cached_stories (key, story, created_at) SELECT ?, ?, ? "
+                "WHERE NOT EXISTS (SELECT 1 FROM cached_stories WHERE key = ? AND story = ?)",
+                (key, story, now, key, story)
+            )
+            # Pool borné : on garde les récits les plus récents de la clé
+            conn.execute(
+                "DELETE FROM cached_stories WHERE key = ? AND id NOT IN ("
+                "SELECT id FROM cached_stories WHERE key = ? ORDER BY created_at DESC LIMIT ?)",
+                (key, key, self.max_stories_per_key)
+            )
+            self._evict(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _evict(self, conn):
+        # Expiration TTL
+        threshold = self._expiry_threshold()
+        if threshold is not None:
+            conn.execute("DELETE FROM cached_stories WHERE created_at < ?", (threshold,))
+            conn.execute(
+                "DELETE FROM cache_keys WHERE key NOT IN (SELECT DISTINCT key FROM cached_stories)"
+            )
+
+        # Éviction LRU des clés au-delà de la capacité
+        excess = conn.execute("SELECT COUNT(*) FROM cache_keys").fetchone()[0] - self.max_keys
+        if excess > 0:
+            stale_keys = conn.execute(
+                "SELECT key FROM cache_keys ORDER BY last_access ASC LIMIT ?",
+                (excess,)
+            ).fetchall()
+            conn.executemany("DELETE FROM cached_stories WHERE key = ?", stale_keys)
+            conn.executemany("DELETE FROM cache_keys WHERE key = ?", stale_keys)
+
+    def clear(self):
+        """Vide entièrement le cache"""
+        conn = self._connection()
+        conn.execute("DELETE FROM cached_stories")
+        conn.execute("DELETE FROM cache_keys")
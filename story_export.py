@@ -0,0 +1,247 @@
+"""Export en continu des récits : JSONL, CSV ou Parquet
+
+Les récits sont lus par lots dans l'historique SQLite (story_store.py) ou
+dans un fichier JSONL de batch.py, puis écrits au fil de l'eau : la mémoire
+utilisée dépend de la taille d'un lot, pas de celle de l'export. Chaque
+ligne porte les paramètres, l'analyse et la durée de génération du récit.
+Le format Parquet nécessite pyarrow (installé avec Streamlit).
+
+Usage :
+    python story_export.py --store recits/stories.sqlite3 --output recits/export.csv
+    python story_export.py --batch recits/lot.jsonl --epoch "Belle Époque (1871-1914)" \\
+        --since 2026-01-01 --output recits/lot.parquet
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+# Formats d'export : extension du fichier et type MIME
+FORMATS = {
+    "jsonl": ("jsonl", "application/x-ndjson"),
+    "csv": ("csv", "text/csv"),
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+# Colonnes exportées, dans l'ordre
+FIELDS = (
+    "id", "created_at", "epoch", "tech_level", "social_change", "fantasy_elements", "story_length",
+    "is_fallback", "word_count", "parallel_score", "common_words", "generation_time", "story",
+)
+
+# Lignes écrites par groupe Parquet (et lues par lot dans l'historique)
+CHUNK_SIZE = 500
+
+
+def record_row(record):
+    """Ligne d'export d'un StoryRecord de l'historique"""
+    analysis = record.analysis
+    return {
+        "id": record.id,
+        "created_at": record.created_at,
+        "epoch": record.epoch,
+        "tech_level": record.tech_level,
+        "social_change": record.social_change,
+        "fantasy_elements": record.fantasy_elements,
+        "story_length": record.story_length,
+        "is_fallback": record.is_fallback,
+        "word_count": analysis['word_count'],
+        "parallel_score": analysis['parallel_score'],
+        "common_words": [list(pair) for pair in analysis['common_words']],
+        "generation_time": record.generation_time,
+        "story": record.story,
+    }
+
+
+def store_rows(store, epoch=None, since=None, until=None, owner=None, batch_size=CHUNK_SIZE):
+    """Lignes d'export de l'historique, lues par lots dans l'ordre d'insertion
+
+    owner limite l'export aux récits d'une session ; sans lui, tout l'historique est exporté.
+    """
+    for records in store.iter_records(batch_size, owner=owner, epoch=epoch, since=since, until=until):
+        for record in records:
+            yield record_row(record)
+
+
+def batch_rows(path, epoch=None, since=None, until=None):
+    """Lignes d'export d'un fichier JSONL de batch.py, lu ligne à ligne
+
+    L'identifiant d'un récit est son numéro de ligne dans le fichier.
+    """
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            created_at = record.get("created_at", 0)
+            if epoch is not None and record["epoch"] != epoch:
+                continue
+            if (since is not None and created_at < since) or (until is not None and created_at >= until):
+                continue
+            analysis = record["analysis"]
+            yield {
+                "id": number,
+                "created_at": float(created_at),
+                "epoch": record["epoch"],
+                "tech_level": record["tech_level"],
+                "social_change": record["social_change"],
+                "fantasy_elements": record["fantasy_elements"],
+                "story_length": record["story_length"],
+                "is_fallback": bool(record["is_fallback"]),
+                "word_count": analysis["word_count"],
+                "parallel_score": analysis["parallel_score"],
+                "common_words": [list(pair) for pair in analysis["common_words"]],
+                "generation_time": record.get("timings", {}).get("generation"),
+                "story": record["story"],
+            }
+
+
+def _iso(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+def write_jsonl(rows, out):
+    """Écrit une ligne JSON par récit dans le flux binaire out"""
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="\n")
+    count = 0
+    try:
+        for row in rows:
+            text.write(json.dumps(dict(row, created_at=_iso(row["created_at"])), ensure_ascii=False) + "\n")
+            count += 1
+    finally:
+        text.flush()
+        text.detach()
+    return count
+
+
+def write_csv(rows, out):
+    """Écrit les récits en CSV dans le flux binaire out (mots fréquents en JSON)"""
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="")
+    count = 0
+    try:
+        writer = csv.DictWriter(text, fieldnames=FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(dict(
+                row,
+                created_at=_iso(row["created_at"]),
+                common_words=json.dumps(row["common_words"], ensure_ascii=False),
+            ))
+            count += 1
+    finally:
+        text.flush()
+        text.detach()
+    return count
+
+
+def parquet_schema(pa):
+    return pa.schema([
+        ("id", pa.int64()),
+        ("created_at", pa.timestamp("us", tz="UTC")),
+        ("epoch", pa.string()),
+        ("tech_level", pa.int32()),
+        ("social_change", pa.int32()),
+        ("fantasy_elements", pa.int32()),
+        ("story_length", pa.string()),
+        ("is_fallback", pa.bool_()),
+        ("word_count", pa.int32()),
+        ("parallel_score", pa.float64()),
+        ("common_words", pa.list_(pa.struct([("word", pa.string()), ("count", pa.int32())]))),
+        ("generation_time", pa.float64()),
+        ("story", pa.string()),
+    ])
+
+
+def write_parquet(rows, out, chunk_size=CHUNK_SIZE):
+    """Écrit les récits en Parquet dans le flux binaire out, un groupe de lignes par lot"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("L'export Parquet nécessite pyarrow (pip install pyarrow)")
+
+    schema = parquet_schema(pa)
+    count = 0
+    with pq.ParquetWriter(out, schema, compression="zstd") as writer:
+        chunk = []
+        for row in rows:
+            chunk.append(dict(
+                row,
+                created_at=datetime.fromtimestamp(row["created_at"], timezone.utc),
+                common_words=[{"word": word, "count": word_count} for word, word_count in row["common_words"]],
+            ))
+            if len(chunk) >= chunk_size:
+                writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+                count += len(chunk)
+                chunk = []
+        if chunk or not count:
+            writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+            count += len(chunk)
+    return count
+
+
+WRITERS = {
+    "jsonl": write_jsonl,
+    "csv": write_csv,
+    "parquet": write_parquet,
+}
+
+
+def export_rows(rows, fmt, out):
+    """Écrit les lignes au format demandé dans le flux binaire out et renvoie leur nombre"""
+    if fmt not in WRITERS:
+        raise ValueError(f"Format d'export inconnu : {fmt}")
+    return WRITERS[fmt](rows, out)
+
+
+def format_for_path(path):
+    """Format d'export déduit de l'extension du fichier"""
+    extension = os.path.splitext(path)[1].lstrip(".").lower()
+    for fmt, (fmt_extension, _) in FORMATS.items():
+        if extension == fmt_extension:
+            return fmt
+    raise ValueError(f"Extension d'export inconnue : {path} (formats : {', '.join(FORMATS)})")
+
+
+def parse_date(value):
+    """Horodatage d'une date AAAA-MM-JJ (heure locale)"""
+    return datetime.strptime(value, "%Y-%m-%d").timestamp()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Exporte des récits en JSONL, CSV ou Parquet")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--store", help="historique SQLite (story_store.py)")
+    source.add_argument("--batch", help="fichier JSONL produit par batch.py")
+    parser.add_argument("--output", required=True, help="fichier exporté (.jsonl, .csv ou .parquet)")
+    parser.add_argument("--format", choices=list(FORMATS), help="format, sinon déduit de l'extension")
+    parser.add_argument("--epoch", help="seulement les récits de cette époque")
+    parser.add_argument("--since", type=parse_date, help="récits créés à partir de cette date (AAAA-MM-JJ)")
+    parser.add_argument("--until", type=parse_date, help="récits créés avant cette date (AAAA-MM-JJ)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    fmt = args.format or format_for_path(args.output)
+    filters = {"epoch": args.epoch, "since": args.since, "until": args.until}
+    if args.store:
+        from story_store import StoryStore
+        rows = store_rows(StoryStore(args.store), **filters)
+    else:
+        rows = batch_rows(args.batch, **filters)
+
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.output, "wb") as out:
+        count = export_rows(rows, fmt, out)
+    print(f"{count} récits exportés dans {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""Enregistrement compact d'un récit
+
+Un récit et ses paramètres tiennent dans un objet à __slots__ : l'époque et
+la longueur sont des codes entiers (index dans EPOCHS et WORD_RANGES),
+l'horodatage un flottant (secondes, à la fraction près : il est comparé à la
+date de "Vider l'historique"), et l'analyse est calculée une fois puis partagée
+entre l'historique et l'affichage. La durée de génération (secondes) est
+conservée pour les exports. Les listes de l'historique n'en lisent qu'un
+résumé (StorySummary), sans le texte du récit.
+"""
+import time
+
+from generation import EPOCHS, WORD_RANGES
+
+# Libellés indexés par leur code
+EPOCH_LABELS = tuple(EPOCHS)
+LENGTH_LABELS = tuple(WORD_RANGES)
+
+_EPOCH_CODES = {label: code for code, label in enumerate(EPOCH_LABELS)}
+_LENGTH_CODES = {label: code for code, label in enumerate(LENGTH_LABELS)}
+
+
+def epoch_code(label):
+    try:
+        return _EPOCH_CODES[label]
+    except KeyError:
+        raise ValueError(f"Époque inconnue : {label}")
+
+
+def length_code(label):
+    try:
+        return _LENGTH_CODES[label]
+    except KeyError:
+        raise ValueError(f"Longueur inconnue : {label}")
+
+
+class StoryRecord:
+    """Un récit généré, ses paramètres et son analyse"""
+
+    __slots__ = ("id", "created_at", "epoch_code", "tech_level", "social_change", "fantasy_elements",
+                 "length_code", "is_fallback", "story", "analysis", "generation_time")
+
+    def __init__(self, story, epoch, tech_level, social_change, fantasy_elements, story_length, analysis,
+                 is_fallback=False, created_at=None, id=None, generation_time=None):
+        self.id = id
+        # Horodatage exact (colonne REAL) : comparé à la date de "Vider l'historique", à la fraction de seconde près
+        self.created_at = float(time.time() if created_at is None else created_at)
+        self.epoch_code = epoch_code(epoch)
+        self.tech_level = int(tech_level)
+        self.social_change = int(social_change)
+        self.fantasy_elements = int(fantasy_elements)
+        self.length_code = length_code(story_length)
+        self.is_fallback = bool(is_fallback)
+        self.story = story
+        self.analysis = analysis
+        self.generation_time = generation_time
+
+    @property
+    def epoch(self):
+        return EPOCH_LABELS[self.epoch_code]
+
+    @property
+    def story_length(self):
+        return LENGTH_LABELS[self.length_code]
+
+    def params(self):
+        """Paramètres de divergence, pour comparer deux récits"""
+        return {
+            'tech': self.tech_level,
+            'social': self.social_change,
+            'fantasy': self.fantasy_elements,
+            'length': self.story_length
+        }
+
+    def __repr__(self):
+        return f"StoryRecord(id={self.id}, epoch={self.epoch!r}, words={self.analysis['word_count']})"
+
+
+class StorySummary:
+    """Ligne d'historique : paramètres et analyse d'un récit, sans son texte"""
+
+    __slots__ = ("id", "created_at", "epoch_code", "tech_level", "social_change", "fantasy_elements",
+                 "length_code", "is_fallback", "word_count", "parallel_score")
+
+    def __init__(self, id, created_at, epoch, tech_level, social_change, fantasy_elements, story_length,
+                 is_fallback, word_count, parallel_score):
+        self.id = id
+        self.created_at = float(created_at)
+        self.epoch_code = epoch_code(epoch)
+        self.tech_level = tech_level
+        self.social_change = social_change
+        self.fantasy_elements = fantasy_elements
+        self.length_code = length_code(story_length)
+        self.is_fallback = bool(is_fallback)
+        self.word_count = word_count
+        self.parallel_score = parallel_score
+
+    @property
+    def epoch(self):
+        return EPOCH_LABELS[self.epoch_code]
+
+    @property
+    def story_length(self):
+        return LENGTH_LABELS[self.length_code]
+
+    def __repr__(self):
+        return f"StorySummary(id={self.id}, epoch={self.epoch!r}, score={self.parallel_score:.1f})"
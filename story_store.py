@@ -0,0 +1,270 @@
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from story_record import StoryRecord, StorySummary
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stories (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    epoch TEXT NOT NULL,
+    tech_level INTEGER NOT NULL,
+    social_change INTEGER NOT NULL,
+    fantasy_elements INTEGER NOT NULL,
+    story_length TEXT NOT NULL,
+    is_fallback INTEGER NOT NULL DEFAULT 0,
+    story TEXT NOT NULL,
+    word_count INTEGER NOT NULL,
+    parallel_score REAL NOT NULL,
+    common_words TEXT NOT NULL,
+    generation_time REAL,
+    owner TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_stories_created_at ON stories (created_at);
+CREATE INDEX IF NOT EXISTS idx_stories_epoch ON stories (epoch, created_at);
+CREATE INDEX IF NOT EXISTS idx_stories_params ON stories (tech_level, social_change, fantasy_elements);
+CREATE INDEX IF NOT EXISTS idx_stories_fallback ON stories (is_fallback, created_at);
+CREATE INDEX IF NOT EXISTS idx_stories_score ON stories (parallel_score);
+"""
+
+# Colonnes lues pour un récit complet
+COLUMNS = (
+    "id, created_at, epoch, tech_level, social_change, fantasy_elements, story_length, "
+    "is_fallback, story, word_count, parallel_score, common_words, generation_time"
+)
+
+# Colonnes lues pour une ligne d'historique, sans le texte du récit
+SUMMARY_COLUMNS = (
+    "id, created_at, epoch, tech_level, social_change, fantasy_elements, story_length, "
+    "is_fallback, word_count, parallel_score"
+)
+
+# Filtres acceptés par les requêtes : nom -> clause SQL
+FILTERS = {
+    "owner": "owner = ?",
+    "epoch": "epoch = ?",
+    "is_fallback": "is_fallback = ?",
+    "since": "created_at >= ?",
+    "until": "created_at < ?",
+    "min_tech": "tech_level >= ?",
+    "max_tech": "tech_level <= ?",
+    "min_social": "social_change >= ?",
+    "max_social": "social_change <= ?",
+    "min_fantasy": "fantasy_elements >= ?",
+    "max_fantasy": "fantasy_elements <= ?",
+    "min_score": "parallel_score >= ?",
+    "max_score": "parallel_score <= ?",
+}
+
+# Tris acceptés par les listes de récits : nom -> clause ORDER BY
+ORDERS = {
+    "recent": "id DESC",
+    "oldest": "id ASC",
+    "divergence_desc": "parallel_score DESC, id DESC",
+    "divergence_asc": "parallel_score ASC, id DESC",
+    "tech": "tech_level DESC, id DESC",
+    "social": "social_change DESC, id DESC",
+    "fantasy": "fantasy_elements DESC, id DESC",
+}
+
+
+def _where(filters):
+    clauses = []
+    values = []
+    for name, value in (filters or {}).items():
+        if value is None:
+            continue
+        if name not in FILTERS:
+            raise ValueError(f"Filtre inconnu : {name}")
+        clauses.append(FILTERS[name])
+        values.append(int(value) if name == "is_fallback" else value)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", values
+
+
+def _row_to_record(row):
+    return StoryRecord(
+        id=row[0],
+        created_at=row[1],
+        epoch=row[2],
+        tech_level=row[3],
+        social_change=row[4],
+        fantasy_elements=row[5],
+        story_length=row[6],
+        is_fallback=bool(row[7]),
+        story=row[8],
+        analysis={
+            'word_count': row[9],
+            'parallel_score': row[10],
+            'common_words': [tuple(pair) for pair in json.loads(row[11])],
+        },
+        generation_time=row[12],
+    )
+
+
+class StoryStore:
+    """Historique durable des récits générés (SQLite, en ajout seul)
+
+    Chaque récit est rattaché au visiteur qui l'a généré (owner) : les
+    requêtes de l'interface filtrent sur ce propriétaire. Les derniers récits
+    lus ou écrits sont gardés en mémoire, partagés par toutes les sessions :
+    une session ne conserve que l'identifiant du récit qu'elle affiche.
+    """
+
+    def __init__(self, path, cache_size=256):
+        self.path = path
+        self.cache_size = cache_size
+        self._local = threading.local()
+        self._records = OrderedDict()
+        self._records_lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+        # Historiques créés avant l'ajout de la durée de génération
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(stories)")}
+        if "generation_time" not in columns:
+            conn.execute("ALTER TABLE stories ADD COLUMN generation_time REAL")
+        # Historiques créés avant le rattachement des récits à leur session : anciens récits sans propriétaire
+        if "owner" not in columns:
+            conn.execute("ALTER TABLE stories ADD COLUMN owner TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_stories_owner ON stories (owner, id)")
+
+    def _connection(self):
+        # Une connexion par thread : Streamlit exécute chaque session dans son propre thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, record):
+        with self._records_lock:
+            # Un récit déjà en mémoire est réutilisé : une seule copie par processus
+            record = self._records.setdefault(record.id, record)
+            self._records.move_to_end(record.id)
+            while len(self._records) > self.cache_size:
+                self._records.popitem(last=False)
+        return record
+
+    def append(self, record, owner=None):
+        """Enregistre un récit de la session owner, renseigne son identifiant et le renvoie"""
+        analysis = record.analysis
+        cursor = self._connection().execute(
+            "INSERT INTO stories (created_at, epoch, tech_level, social_change, fantasy_elements, "
+            "story_length, is_fallback, story, word_count, parallel_score, common_words, generation_time, owner) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                record.created_at,
+                record.epoch,
+                record.tech_level,
+                record.social_change,
+                record.fantasy_elements,
+                record.story_length,
+                int(record.is_fallback),
+                record.story,
+                analysis['word_count'],
+                analysis['parallel_score'],
+                json.dumps(analysis['common_words'], ensure_ascii=False),
+                record.generation_time,
+                owner,
+            )
+        )
+        record.id = cursor.lastrowid
+        self._remember(record)
+        return record.id
+
+    def count(self, **filters):
+        """Nombre de récits correspondant aux filtres"""
+        where, values = _where(filters)
+        return self._connection().execute(f"SELECT COUNT(*) FROM stories{where}", values).fetchone()[0]
+
+    def page(self, page=0, page_size=10, **filters):
+        """Une page de récits, du plus récent au plus ancien"""
+        where, values = _where(filters)
+        rows = self._connection().execute(
+            f"SELECT {COLUMNS} FROM stories{where} ORDER BY id DESC LIMIT ? OFFSET ?",
+            values + [page_size, page * page_size]
+        ).fetchall()
+        return [self._remember(_row_to_record(row)) for row in rows]
+
+    def summaries(self, page=0, page_size=20, order="recent", **filters):
+        """Une page de résumés de récits (paramètres et analyse, sans le texte), dans l'ordre demandé"""
+        if order not in ORDERS:
+            raise ValueError(f"Tri inconnu : {order}")
+        where, values = _where(filters)
+        rows = self._connection().execute(
+            f"SELECT {SUMMARY_COLUMNS} FROM stories{where} ORDER BY {ORDERS[order]} LIMIT ? OFFSET ?",
+            values + [page_size, page * page_size]
+        ).fetchall()
+        return [StorySummary(*row) for row in rows]
+
+    def iter_stories(self, batch_size=500):
+        """Lots de (identifiant, récit), dans l'ordre d'insertion, pour les traitements en masse"""
+        last_id = 0
+        while True:
+            rows = self._connection().execute(
+                "SELECT id, story FROM stories WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size)
+            ).fetchall()
+            if not rows:
+                return
+            yield rows
+            last_id = rows[-1][0]
+
+    def iter_records(self, batch_size=500, **filters):
+        """Lots de récits correspondant aux filtres, dans l'ordre d'insertion
+
+        Les récits ne passent pas par le cache partagé : un export ou un
+        traitement en masse n'en évince pas les récits affichés.
+        """
+        where, values = _where(filters)
+        where = (where + " AND" if where else " WHERE") + " id > ?"
+        last_id = 0
+        while True:
+            rows = self._connection().execute(
+                f"SELECT {COLUMNS} FROM stories{where} ORDER BY id LIMIT ?", values + [last_id, batch_size]
+            ).fetchall()
+            if not rows:
+                return
+            yield [_row_to_record(row) for row in rows]
+            last_id = rows[-1][0]
+
+    def update_analyses(self, analyses):
+        """Remplace l'analyse de récits existants : itérable de (identifiant, analyse)"""
+        rows = [
+            (analysis['word_count'], analysis['parallel_score'],
+             json.dumps(analysis['common_words'], ensure_ascii=False), story_id)
+            for story_id, analysis in analyses
+        ]
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "UPDATE stories SET word_count = ?, parallel_score = ?, common_words = ? WHERE id = ?", rows
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        # Les récits gardés en mémoire portent l'ancienne analyse
+        with self._records_lock:
+            for _, _, _, story_id in rows:
+                self._records.pop(story_id, None)
+
+    def get(self, story_id):
+        """Un récit par son identifiant, ou None"""
+        with self._records_lock:
+            record = self._records.get(story_id)
+        if record is not None:
+            return record
+        row = self._connection().execute(
+            f"SELECT {COLUMNS} FROM stories WHERE id = ?", (story_id,)
+        ).fetchone()
+        return self._remember(_row_to_record(row)) if row else None
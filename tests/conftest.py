@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """Application avec stockage temporaire et backend mock, sans file d'admission ni réserve"""
+    # Ressources partagées (stockage, backend) : recréées pour chaque dossier temporaire
+    st.cache_resource.clear()
+
+    def make(**secrets):
+        at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=120)
+        at.secrets["STORY_STORE_PATH"] = str(tmp_path / "stories.sqlite3")
+        at.secrets["STORY_CACHE_PATH"] = str(tmp_path / "cache.sqlite3")
+        at.secrets["STORY_CACHE_POLICY"] = "off"
+        at.secrets["GENERATION_BACKEND"] = "mock"
+        at.secrets["PREGEN_BUDGET_PER_HOUR"] = 0
+        at.secrets["ADMISSION_RATE_PER_MINUTE"] = 0
+        for name, value in secrets.items():
+            at.secrets[name] = value
+        return at
+
+    yield make
+    st.cache_resource.clear()
+
+
+@pytest.fixture
+def stub_server():
+    """Serveur local compatible OpenAI (benchmarks/stub_server.py), sans latence"""
+    from stub_server import StubConfig, StubServer
+
+    with StubServer(StubConfig(latency=0.0, seed=0)) as server:
+        yield server
@@ -0,0 +1,84 @@
+"""File d'admission : seau à jetons, ordre d'arrivée et refus avant la date limite
+
+Usage :
+    python -m pytest tests
+"""
+import threading
+
+import pytest
+
+from admission import AdmissionController, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_bucket_burst_then_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=0.5, capacity=2, clock=clock)
+    assert bucket.try_take() and bucket.try_take()
+    assert not bucket.try_take()
+    assert bucket.delay() == pytest.approx(2.0)
+    assert bucket.delay(position=2) == pytest.approx(6.0)
+
+    clock.now += 2.0
+    assert bucket.try_take()
+    clock.now += 100.0
+    bucket.try_take()
+    # Réserve plafonnée à capacity
+    assert bucket.tokens == pytest.approx(1.0)
+
+
+def test_burst_admitted_immediately():
+    controller = AdmissionController(rate_per_minute=60, burst=3, max_wait=1.0)
+    assert all(controller.admit() for _ in range(3))
+    assert len(controller) == 0
+
+
+def test_rejected_when_wait_exceeds_deadline():
+    controller = AdmissionController(rate_per_minute=6, burst=1, max_wait=2.0)
+    assert controller.admit()
+    # Prochain jeton dans 10 s : refus immédiat, place libérée
+    assert not controller.admit()
+    assert len(controller) == 0
+
+
+def test_waits_for_next_token():
+    controller = AdmissionController(rate_per_minute=600, burst=1, max_wait=2.0, poll_interval=0.05)
+    updates = []
+    assert controller.admit()
+    assert controller.admit(on_update=lambda position, wait: updates.append(position))
+    assert updates == [1]
+
+
+def test_fifo_order():
+    controller = AdmissionController(rate_per_minute=600, burst=1, max_wait=5.0, poll_interval=0.02)
+    assert controller.admit()
+    tickets = [controller.enqueue() for _ in range(3)]
+    admitted = []
+
+    def wait(index):
+        if controller.wait(tickets[index]):
+            admitted.append(index)
+
+    # Les threads démarrent dans l'ordre inverse de la file
+    threads = [threading.Thread(target=wait, args=(index,)) for index in reversed(range(3))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert admitted == [0, 1, 2]
+
+
+def test_abandoned_ticket_frees_its_place():
+    controller = AdmissionController(rate_per_minute=600, burst=1, max_wait=5.0, poll_interval=0.02)
+    assert controller.admit()
+    ahead = controller.enqueue()
+    assert not controller.wait(ahead, timeout=0.0)
+    assert len(controller) == 0
+    assert controller.admit()
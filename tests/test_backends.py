@@ -0,0 +1,94 @@
+"""Backends de génération : construction, emplacements d'appel et clients partagés
+
+Usage :
+    python -m pytest tests
+"""
+import threading
+
+import pytest
+
+from backends import (DEFAULT_MODEL, BackendBusyError, GenerationBackend, HuggingFaceBackend, MockBackend,
+                      OpenAICompatibleBackend, create_backend, read_usage)
+
+MESSAGES = [{"role": "user", "content": "Écris un récit."}]
+
+
+def test_create_backend():
+    hf = create_backend("hf", api_token="secret")
+    assert isinstance(hf, HuggingFaceBackend)
+    assert hf.label == f"hf:{DEFAULT_MODEL}"
+    assert hf.unavailable_reason() is None
+    assert create_backend("hf").unavailable_reason()
+
+    local = create_backend("openai", model="smollm3", base_url="http://localhost:8080/v1/", max_concurrency=2)
+    assert isinstance(local, OpenAICompatibleBackend)
+    assert local.base_url == "http://localhost:8080/v1"
+    assert local.max_concurrency == 2
+
+    assert isinstance(create_backend("mock"), MockBackend)
+    with pytest.raises(ValueError):
+        create_backend("inconnu")
+
+
+def test_read_usage():
+    usage = {}
+    read_usage(usage, None)
+    read_usage(usage, {"completion_tokens": None})
+    assert usage == {}
+    read_usage(usage, {"completion_tokens": 120, "completion_tokens_details": {"reasoning_tokens": 80}})
+    assert usage == {"completion_tokens": 120, "reasoning_tokens": 80}
+
+
+def test_mock_is_deterministic():
+    backend = MockBackend()
+    text = backend.complete(MESSAGES, {})
+    assert text == backend.complete(MESSAGES, {})
+    assert text.startswith("<think>")
+    assert "".join(backend.stream(MESSAGES, {})) == text
+
+
+def test_client_created_once():
+    created = []
+
+    class CountingBackend(GenerationBackend):
+        def _create_client(self):
+            created.append(threading.get_ident())
+            return object()
+
+    backend = CountingBackend()
+    threads = [threading.Thread(target=backend.client) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(created) == 1
+
+
+def test_slots_bound_concurrency():
+    backend = MockBackend(max_concurrency=1, timeout=0.05)
+    with backend.slot():
+        with pytest.raises(BackendBusyError):
+            backend.complete(MESSAGES, {})
+    # Emplacement rendu à la sortie du bloc
+    assert backend.complete(MESSAGES, {})
+
+
+def test_openai_compatible_backend(stub_server):
+    backend = OpenAICompatibleBackend(base_url=stub_server.base_url, model="stub", timeout=5)
+    try:
+        usage = {}
+        text = backend.complete(MESSAGES, {"max_tokens": 50}, usage)
+        assert text and usage["completion_tokens"] > 0
+
+        usage = {}
+        assert "".join(backend.stream(MESSAGES, {"max_tokens": 50}, usage))
+        assert usage["completion_tokens"] > 0
+    finally:
+        backend.close()
+
+
+def test_openai_compatible_connection_error():
+    backend = OpenAICompatibleBackend(base_url="http://127.0.0.1:9/v1", timeout=2)
+    # Exception standard : classée comme erreur réseau par retry_policy.classify_error
+    with pytest.raises(ConnectionError):
+        backend.complete(MESSAGES, {})
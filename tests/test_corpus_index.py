@@ -0,0 +1,108 @@
+"""Index du corpus : indexation incrémentale, agrégats par session et recherche
+
+Usage :
+    python -m pytest tests
+"""
+import pytest
+
+from corpus_index import CorpusIndex, bin_labels, dimension_values
+from generation import EPOCHS
+from story_record import StoryRecord
+from story_store import StoryStore
+from text_analysis import analyze
+
+RENAISSANCE, REVOLUTION = list(EPOCHS)[:2]
+
+STORIES = [
+    ("alice", RENAISSANCE, 10, "Le peintre prépara ses pigments dans l'atelier de Florence."),
+    ("alice", RENAISSANCE, 90, "Une machine étrange copiait les manuscrits du peintre."),
+    ("bob", REVOLUTION, 50, "Les machines mystérieuses imprimaient des pamphlets sur la place."),
+    (None, REVOLUTION, 50, "Le député lut le pamphlet devant la foule de la place."),
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = StoryStore(str(tmp_path / "stories.sqlite3"))
+    for owner, epoch, tech, story in STORIES:
+        store.append(StoryRecord(story, epoch, tech, 20, 20, "Court (100-200 mots)", analyze(story)), owner=owner)
+    return store
+
+
+@pytest.fixture
+def index(store):
+    index = CorpusIndex(store.path)
+    index.sync()
+    return index
+
+
+def test_sync_is_incremental_and_bounded(store):
+    index = CorpusIndex(store.path)
+    assert index.pending() == 4
+    assert index.sync(batch_size=1, max_stories=3) == 3
+    assert index.pending() == 1
+    assert index.sync() == 1
+    assert index.sync() == 0
+
+    story = "Un nouveau récit sur la place."
+    store.append(StoryRecord(story, REVOLUTION, 0, 0, 0, "Court (100-200 mots)", analyze(story)), owner="alice")
+    assert index.pending() == 1
+    assert index.sync() == 1
+    assert index.summary()['stories'] == 5
+
+
+def test_summary_per_owner(index):
+    total = index.summary()
+    assert total['stories'] == 4
+    assert total['words'] == sum(analyze(story)['word_count'] for _, _, _, story in STORIES)
+    assert index.summary("alice")['stories'] == 2
+    assert index.summary("bob")['stories'] == 1
+    assert index.summary("inconnu") == {'stories': 0, 'words': 0, 'content_words': 0, 'vocabulary': 0}
+    assert 0 < index.summary("alice")['vocabulary'] < total['vocabulary']
+
+
+def test_divergence_distribution(index):
+    by_epoch = {entry['value']: entry for entry in index.divergence_distribution("epoch")}
+    assert [by_epoch[epoch]['stories'] for epoch in (RENAISSANCE, REVOLUTION)] == [2, 2]
+    # « étrange » et « mystérieuses » : un indicateur chacun
+    assert by_epoch[RENAISSANCE]['mean'] > 0
+    assert sum(by_epoch[RENAISSANCE]['histogram']) == 2
+    assert len(by_epoch[RENAISSANCE]['histogram']) == len(bin_labels())
+
+    by_tech = index.divergence_distribution("tech", owner="alice")
+    assert [entry['value'] for entry in by_tech] == ["0", "3"]
+    assert [entry['stories'] for entry in by_tech] == [1, 1]
+    assert by_tech[0]['stdev'] == 0.0
+
+
+def test_top_terms_characterize_group(index):
+    terms = [term for term, _ in index.top_terms("epoch", RENAISSANCE, limit=3)]
+    assert terms[0] == "peintre"
+    assert index.top_terms("epoch", RENAISSANCE, owner="bob") == []
+
+
+def test_story_terms(index, store):
+    story_id = store.page(0, 1, owner="bob")[0].id
+    terms = dict(index.story_terms(story_id))
+    assert "imprimaient" in terms and "la" not in terms
+    assert index.story_terms(story_id + 100) == []
+
+
+def test_search_by_stem_and_scope(index, store):
+    ids = {record.story: record.id for record in store.page(0, 10)}
+    machine, machines = ids[STORIES[1][3]], ids[STORIES[2][3]]
+    assert {story_id for story_id, _ in index.search("machine")} == {machine, machines}
+    assert [story_id for story_id, _ in index.search("machines", owner="alice")] == [machine]
+    assert [story_id for story_id, _ in index.search("machines", epoch=REVOLUTION)] == [machines]
+    assert index.search("le la les") == []
+
+
+def test_rebuild_matches_incremental(index):
+    before = index.summary(), index.divergence_distribution("fantasy")
+    assert index.rebuild() == 4
+    assert (index.summary(), index.divergence_distribution("fantasy")) == before
+
+
+def test_unknown_dimension():
+    with pytest.raises(ValueError):
+        dimension_values("auteur")
@@ -0,0 +1,79 @@
+"""Téléchargement de l'export depuis l'interface
+
+Le bouton de téléchargement reçoit une fonction appelée au clic ; Streamlit
+convertit son résultat avec convert_data_to_bytes_and_infer_mime. Le test
+capture cette fonction pendant une exécution AppTest, l'appelle, puis fait
+passer son résultat par la même conversion.
+
+Usage :
+    python -m pytest tests
+"""
+import csv
+import io
+import json
+
+import pytest
+from streamlit.runtime.download_data_util import convert_data_to_bytes_and_infer_mime
+from streamlit.runtime.media_file_manager import MediaFileManager
+
+from story_export import FORMATS
+
+
+@pytest.fixture
+def deferred(monkeypatch):
+    """Fonctions de téléchargement enregistrées pendant l'exécution"""
+    calls = []
+    original = MediaFileManager.add_deferred
+
+    def add_deferred(self, data_callable, mimetype, coordinates, file_name=None):
+        calls.append((data_callable, mimetype, file_name))
+        return original(self, data_callable, mimetype, coordinates, file_name=file_name)
+
+    monkeypatch.setattr(MediaFileManager, "add_deferred", add_deferred)
+    return calls
+
+
+def exported(deferred):
+    """Octets et type MIME du dernier export, convertis comme au clic"""
+    data_callable, mimetype, file_name = deferred[-1]
+    data, inferred = convert_data_to_bytes_and_infer_mime(
+        data_callable(), unsupported_error=TypeError("type de données refusé par Streamlit")
+    )
+    return data, mimetype or inferred, file_name
+
+
+@pytest.mark.parametrize("fmt", list(FORMATS))
+def test_export_download(make_app, deferred, fmt):
+    at = make_app()
+    at.run()
+    at.button[0].click().run()
+    at.selectbox(key="export_format").set_value(fmt).run()
+    assert not at.exception
+
+    data, mimetype, file_name = exported(deferred)
+    assert mimetype == FORMATS[fmt][1]
+    assert file_name.endswith("." + FORMATS[fmt][0])
+    if fmt == "jsonl":
+        rows = [json.loads(line) for line in data.decode("utf-8").splitlines()]
+    elif fmt == "csv":
+        rows = list(csv.DictReader(io.StringIO(data.decode("utf-8"))))
+    else:
+        pq = pytest.importorskip("pyarrow.parquet")
+        rows = pq.read_table(io.BytesIO(data)).to_pylist()
+    assert [int(row["id"]) for row in rows] == [at.session_state["current_story_id"]]
+
+
+def test_export_scoped_to_session(make_app, deferred):
+    first = make_app()
+    first.run()
+    first.button[0].click().run()
+
+    # Une autre session partage l'historique mais n'exporte que ses propres récits
+    second = make_app()
+    second.run()
+    second.button[0].click().run()
+    assert not second.exception
+    data, _, _ = exported(deferred)
+    ids = [json.loads(line)["id"] for line in data.decode("utf-8").splitlines()]
+    assert ids == [second.session_state["current_story_id"]]
+    assert first.session_state["current_story_id"] not in ids
@@ -0,0 +1,77 @@
+"""Panneaux de l'interface exécutés en fragments
+
+AppTest réexécute toujours la page entière : ces tests vérifient que chaque
+fragment chronomètre son exécution et que l'état de chaque panneau survit aux
+interactions des autres.
+
+Usage :
+    python -m pytest tests
+"""
+import pytest
+
+from generation import EPOCHS, analyze_text, generate_fallback_story
+from metrics import REGISTRY
+from story_record import StoryRecord
+from story_store import StoryStore
+
+OWNER = "tests"
+HISTORY_SIZE = 25
+
+
+@pytest.fixture
+def seeded_app(make_app, tmp_path):
+    store = StoryStore(str(tmp_path / "stories.sqlite3"))
+    epochs = list(EPOCHS)
+    for index in range(HISTORY_SIZE):
+        story = generate_fallback_story(f"Récit {index}", seed=index)
+        store.append(StoryRecord(story, epochs[index % len(epochs)], (index * 7) % 100, (index * 13) % 100,
+                                 (index * 17) % 100, "Court (100-200 mots)", analyze_text(story)), owner=OWNER)
+    at = make_app()
+    at.query_params["historique"] = OWNER
+    at.run()
+    return at
+
+
+def history_rows(at):
+    return [button.key for button in at.button if button.key and button.key.startswith("expand_")]
+
+
+def test_each_fragment_is_timed(seeded_app):
+    REGISTRY.reset()
+    seeded_app.button[0].click().run()
+    assert not seeded_app.exception
+    histograms = REGISTRY.snapshot()["histograms"]
+    for stage in ("ui_sidebar", "ui_history", "ui_analysis", "ui_corpus"):
+        assert histograms[stage]["count"] == 1
+
+
+def test_history_page_keeps_generation_settings(seeded_app):
+    at = seeded_app
+    at.slider(key="tech_level").set_value(75).run()
+    first_page = history_rows(at)
+    assert len(first_page) == 20
+
+    at.number_input(key="history_page").set_value(2).run()
+    assert not at.exception
+    assert len(history_rows(at)) == HISTORY_SIZE - 20
+    assert set(history_rows(at)).isdisjoint(first_page)
+    assert at.slider(key="tech_level").value == 75
+
+
+def test_history_filter_returns_to_first_page(seeded_app):
+    at = seeded_app
+    at.number_input(key="history_page").set_value(2).run()
+    at.selectbox(key="history_order").set_value("Divergence décroissante").run()
+    assert at.number_input(key="history_page").value == 1
+
+
+def test_single_expanded_entry(seeded_app):
+    at = seeded_app
+    first, second = history_rows(at)[:2]
+    at.button(key=first).click().run()
+    assert at.session_state["history_expanded"] == int(first.split("_")[1])
+    at.button(key=second).click().run()
+    assert at.session_state["history_expanded"] == int(second.split("_")[1])
+    assert [button.label for button in at.button if button.key in (first, second)] == ["Détails", "Masquer"]
+    at.button(key=second).click().run()
+    assert at.session_state["history_expanded"] is None
@@ -0,0 +1,53 @@
+"""Propriétaire de l'historique : retrouvé d'une session à l'autre
+
+Usage :
+    python -m pytest tests
+"""
+
+
+def history_rows(at):
+    return [button.key for button in at.button if button.key and button.key.startswith("expand_")]
+
+
+def test_token_in_address(make_app):
+    at = make_app()
+    at.run()
+    assert at.query_params["historique"] == at.session_state["owner_id"]
+
+
+def test_reload_keeps_history(make_app):
+    first = make_app()
+    first.run()
+    first.button[0].click().run()
+    token = first.session_state["owner_id"]
+
+    # Rechargement de la page : nouvelle session, même adresse
+    reloaded = make_app()
+    reloaded.query_params["historique"] = token
+    reloaded.run()
+    assert not reloaded.exception
+    assert history_rows(reloaded) == history_rows(first)
+
+    # Autre visiteur : autre jeton, historique vide
+    other = make_app()
+    other.run()
+    assert other.session_state["owner_id"] != token
+    assert history_rows(other) == []
+
+
+def test_invalid_token_replaced(make_app):
+    at = make_app()
+    at.query_params["historique"] = "../../"
+    at.run()
+    assert at.session_state["owner_id"] != "../../"
+    assert at.query_params["historique"] == at.session_state["owner_id"]
+
+
+def test_all_scope_shows_every_story(make_app):
+    first = make_app()
+    first.run()
+    first.button[0].click().run()
+
+    shared = make_app(HISTORY_SCOPE="all")
+    shared.run()
+    assert history_rows(shared) == history_rows(first)
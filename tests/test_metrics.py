@@ -0,0 +1,70 @@
+"""Registre de métriques : histogrammes, compteurs et exports
+
+Usage :
+    python -m pytest tests
+"""
+import json
+import math
+
+import pytest
+
+from metrics import METRIC_PREFIX, Histogram, MetricsRegistry
+
+
+def test_histogram_quantiles():
+    histogram = Histogram(buckets=(0.1, 1.0, math.inf))
+    assert histogram.quantile(0.5) is None
+    for value in (0.05, 0.05, 0.5, 20.0):
+        histogram.observe(value)
+    assert histogram.counts == [2, 1, 1]
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.quantile(0.75) == 1.0
+    assert histogram.quantile(0.99) == math.inf
+    assert histogram.sum == pytest.approx(20.6)
+
+
+def test_counters_by_label_and_fallback_rate():
+    registry = MetricsRegistry()
+    assert registry.fallback_rate() == 0.0
+    registry.inc("stories_total", source="api")
+    registry.inc("stories_total", 3, source="cache")
+    registry.inc("fallback_stories_total")
+    counters = {tuple(c["labels"].items()): c["value"] for c in registry.snapshot()["counters"]
+                if c["name"] == "stories_total"}
+    assert counters == {(("source", "api"),): 1, (("source", "cache"),): 3}
+    assert registry.fallback_rate() == 0.25
+
+
+def test_timer_records_even_on_error():
+    registry = MetricsRegistry()
+    try:
+        with registry.timer("upstream_total"):
+            raise RuntimeError("coupure")
+    except RuntimeError:
+        pass
+    assert registry.snapshot()["histograms"]["upstream_total"]["count"] == 1
+
+
+def test_prometheus_export():
+    registry = MetricsRegistry()
+    registry.observe("clean_thinking", 0.002)
+    registry.inc("api_errors_total", kind="server")
+    text = registry.to_prometheus()
+    metric = f"{METRIC_PREFIX}_clean_thinking_seconds"
+    assert f"# HELP {metric} Nettoyage des thinking tokens" in text
+    assert f'{metric}_bucket{{le="0.005"}} 1' in text
+    assert f'{metric}_bucket{{le="+Inf"}} 1' in text
+    assert f'{METRIC_PREFIX}_api_errors_total{{kind="server"}} 1' in text
+
+
+def test_write_json_and_reset(tmp_path):
+    registry = MetricsRegistry()
+    registry.observe("prompt_build", 0.001)
+    path = tmp_path / "sous-dossier" / "metrics.json"
+    registry.write(str(path))
+    data = json.loads(path.read_text(encoding="utf-8"))
+    assert data["histograms"]["prompt_build"]["buckets"][-1] == ["+Inf", 0]
+    assert [p.name for p in path.parent.iterdir()] == ["metrics.json"]
+
+    registry.reset()
+    assert registry.snapshot() == {"histograms": {}, "counters": []}
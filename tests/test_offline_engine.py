@@ -0,0 +1,86 @@
+"""Moteur hors-ligne : longueur des récits, fidélité aux réglages et bornes du modèle
+
+Usage :
+    python -m pytest tests
+"""
+import itertools
+import json
+import random
+
+import pytest
+
+from generation import EPOCHS, WORD_RANGES, generate_prompt
+from offline_engine import MODEL_VERSION, OfflineStoryEngine, bucket_key, build_model, split_sentences
+from text_analysis import count_words
+
+BUCKETS = [(0, 0, 0), (3, 0, 0), (0, 3, 1), (1, 2, 3), (3, 3, 3)]
+
+
+@pytest.fixture(scope="module", params=["grammaire", "modèle"])
+def engine(request):
+    # Avec et sans le modèle précalculé livré dans data/
+    return OfflineStoryEngine() if request.param == "grammaire" else OfflineStoryEngine.load()
+
+
+@pytest.mark.parametrize("epoch, story_length", list(itertools.product(EPOCHS, WORD_RANGES)))
+def test_story_within_word_range(engine, epoch, story_length):
+    min_words, max_words = WORD_RANGES[story_length]
+    for seed, buckets in enumerate(BUCKETS):
+        story = engine.generate(epoch, buckets, story_length, random.Random(seed))
+        assert min_words <= count_words(story) <= max_words, (buckets, seed)
+        assert "{" not in story and "}" not in story
+
+
+def test_same_seed_same_story(engine):
+    epoch = list(EPOCHS)[0]
+    first = engine.generate(epoch, (1, 2, 3), "Moyen (300-500 mots)", random.Random(7))
+    assert first == engine.generate(epoch, (1, 2, 3), "Moyen (300-500 mots)", random.Random(7))
+
+
+def test_generate_from_prompt_uses_epoch_lexicon(engine):
+    epoch = list(EPOCHS)[1]
+    prompt = generate_prompt(epoch, 90, 10, 10, "Long (600-800 mots)")
+    story = engine.generate_from_prompt(prompt, random.Random(3))
+    assert 600 <= count_words(story) <= 800
+    assert engine.generate(epoch, (3, 0, 0), "Long (600-800 mots)", random.Random(3)) == story
+
+
+def test_load_rejects_missing_or_unknown_model(tmp_path):
+    assert OfflineStoryEngine.load(str(tmp_path / "absent.json")).sentences == {}
+    path = tmp_path / "model.json"
+    path.write_text(json.dumps({"version": MODEL_VERSION + 1, "sentences": {"x": {}}}), encoding="utf-8")
+    assert OfflineStoryEngine.load(str(path)).sentences == {}
+
+
+def test_split_sentences_filters():
+    story = ("Giulia ouvrit la porte de l'atelier au lever du jour. Court. "
+             "Mais elle hésita longtemps devant la presse encore chaude. "
+             "The story should be written in French for the user today. "
+             "<think>Je dois écrire un récit sur la Renaissance.</think>\n"
+             "Les apprentis chantaient en broyant les pigments de la veille !")
+    assert list(split_sentences(story)) == [
+        "Giulia ouvrit la porte de l'atelier au lever du jour.",
+        "Les apprentis chantaient en broyant les pigments de la veille !",
+    ]
+
+
+def test_build_model_bounds():
+    epoch = list(EPOCHS)[0]
+    stories = [(epoch, 90, 10, None, " ".join(f"Le verrier numéro {index} souffla une sphère parfaite {n}."
+                                               for n in range(10)))
+               for index in range(5)]
+    stories.append(("Époque inconnue", 0, 0, 0, "Une phrase assez longue pour être retenue ici."))
+    stories.append((epoch, 90, 10, None, "Le verrier numéro 0 souffla une sphère parfaite 0."))
+    model = build_model(stories, max_per_key=4, max_per_epoch=3)
+    assert model["version"] == MODEL_VERSION
+    assert list(model["sentences"]) == [epoch]
+    key = bucket_key((3, 0, None))
+    assert list(model["sentences"][epoch]) == [key]
+    assert len(model["sentences"][epoch][key]) == 3
+
+
+def test_corpus_sentences_most_specific_first():
+    epoch = list(EPOCHS)[0]
+    engine = OfflineStoryEngine({epoch: {"**3": ["générique"], "003": ["exacte"], "103": ["autre palier"]}})
+    assert engine.corpus_sentences(epoch, (0, 0, 3)) == ["exacte", "générique"]
+    assert engine.corpus_sentences(list(EPOCHS)[1], (0, 0, 3)) == []
@@ -0,0 +1,156 @@
+"""Politique de reprise, disjoncteur et classement des erreurs de l'API
+
+Usage :
+    python -m pytest tests
+"""
+import email.utils
+
+import pytest
+
+import retry_policy
+from backends import BackendBusyError
+from generation import record_api_error
+from retry_policy import (ERROR_FATAL, ERROR_LOADING, ERROR_RATE_LIMIT, ERROR_SERVER, CircuitBreaker,
+                          ClassifiedError, RetryPolicy, classify_error, parse_retry_after)
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.response = FakeResponse(status_code, headers)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(retry_policy.time, "monotonic", clock)
+    return clock
+
+
+def test_parse_retry_after_seconds_and_date():
+    assert parse_retry_after("2.5") == 2.5
+    assert parse_retry_after("-3") == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("demain") is None
+    date = email.utils.formatdate(1010.0, usegmt=True)
+    assert parse_retry_after(date, now=1000.0) == pytest.approx(10.0)
+
+
+@pytest.mark.parametrize("status, kind", [
+    (503, ERROR_LOADING), (429, ERROR_RATE_LIMIT), (500, ERROR_SERVER), (502, ERROR_SERVER),
+    (408, ERROR_SERVER), (400, ERROR_FATAL), (404, ERROR_FATAL),
+])
+def test_classify_http_status(status, kind):
+    classified = classify_error(HTTPError(status))
+    assert classified.kind == kind
+    assert classified.status == status
+
+
+def test_classify_keeps_retry_after():
+    assert classify_error(HTTPError(429, {"Retry-After": "4"})).retry_after == 4.0
+    # Une erreur définitive n'a pas de délai à respecter
+    assert classify_error(HTTPError(400, {"Retry-After": "4"})).retry_after is None
+
+
+@pytest.mark.parametrize("error, kind", [
+    (TimeoutError("lecture"), ERROR_SERVER),
+    (ConnectionError("refusée"), ERROR_SERVER),
+    (RuntimeError("Model is currently loading"), ERROR_LOADING),
+    (RuntimeError("429 Too Many Requests"), ERROR_RATE_LIMIT),
+    (ValueError("réponse illisible"), ERROR_FATAL),
+])
+def test_classify_without_response(error, kind):
+    assert classify_error(error).kind == kind
+
+
+def test_next_delay_full_jitter(monkeypatch):
+    monkeypatch.setattr(retry_policy.random, "uniform", lambda low, high: high)
+    policy = RetryPolicy(max_retries=5, base_delay=1.0, max_delay=3.0, max_total_wait=100.0)
+    server = ClassifiedError(ERROR_SERVER)
+    assert [policy.next_delay(attempt, server) for attempt in range(4)] == [1.0, 2.0, 3.0, 3.0]
+
+
+def test_next_delay_gives_up():
+    policy = RetryPolicy(max_retries=3, base_delay=1.0, max_delay=8.0, max_total_wait=5.0)
+    # Erreur définitive, dernière tentative, Retry-After au-delà du plafond, budget épuisé
+    assert policy.next_delay(0, ClassifiedError(ERROR_FATAL, 400)) is None
+    assert policy.next_delay(2, ClassifiedError(ERROR_SERVER)) is None
+    assert policy.next_delay(0, ClassifiedError(ERROR_RATE_LIMIT, 429, retry_after=9.0)) is None
+    assert policy.next_delay(0, ClassifiedError(ERROR_RATE_LIMIT, 429, retry_after=2.0), waited=4.0) is None
+    assert policy.next_delay(0, ClassifiedError(ERROR_RATE_LIMIT, 429, retry_after=2.0)) == 2.0
+
+
+def test_breaker_opens_after_threshold(clock):
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=30.0)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+
+def test_breaker_single_probe_when_half_open(clock):
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=30.0)
+    breaker.record_failure()
+    clock.now += 31
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow_request()
+
+    breaker.release()
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request() and breaker.allow_request()
+
+
+def test_breaker_failed_probe_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=30.0)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 31
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+
+def test_success_resets_failures():
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.parametrize("error, state, failures", [
+    (HTTPError(503), CircuitBreaker.OPEN, 1),       # panne : compte comme un échec
+    (HTTPError(400), CircuitBreaker.CLOSED, 0),     # l'API a répondu : pas en panne
+    (BackendBusyError("plein"), CircuitBreaker.HALF_OPEN, 1),  # saturation locale : sonde rendue
+    (ValueError("bogue"), CircuitBreaker.HALF_OPEN, 1),        # exception locale : sonde rendue
+])
+def test_record_api_error_verdicts(clock, error, state, failures):
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=30.0)
+    breaker.record_failure()
+    clock.now += 31
+    assert breaker.allow_request()
+
+    record_api_error(error, breaker)
+    assert breaker.state == state
+    assert breaker.failures == failures
+    if state == CircuitBreaker.HALF_OPEN:
+        assert breaker.allow_request()
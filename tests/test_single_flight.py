@@ -0,0 +1,173 @@
+"""Générations partagées : un seul appel par clé, résultat et fragments diffusés
+
+Usage :
+    python -m pytest tests
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition jamais atteinte"
+        time.sleep(0.005)
+
+
+def test_do_runs_once_for_concurrent_callers():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fn(notify):
+        calls.append(1)
+        notify("warning", "Modèle en cours de chargement")
+        release.wait(5)
+        return "récit"
+
+    received = [[], [], []]
+    with ThreadPoolExecutor(3) as pool:
+        futures = [pool.submit(flights.do, "clé", fn, 5, lambda level, message, box=box: box.append(message))
+                   for box in received]
+        wait_until(lambda: len(flights) == 1 and calls)
+        time.sleep(0.05)
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert results == ["récit"] * 3
+    assert calls == [1]
+    assert received == [["Modèle en cours de chargement"]] * 3
+    assert len(flights) == 0
+
+
+def test_do_propagates_errors():
+    flights = SingleFlight()
+
+    def fn(notify):
+        raise RuntimeError("panne")
+
+    with pytest.raises(RuntimeError, match="panne"):
+        flights.do("clé", fn)
+    assert "clé" not in flights
+
+
+def test_do_timeout_leaves_call_running():
+    flights = SingleFlight()
+    release = threading.Event()
+
+    def fn(notify):
+        release.wait(5)
+        return "récit"
+
+    with pytest.raises(TimeoutError):
+        flights.do("clé", fn, timeout=0.05)
+    # L'appel continue : un abonné suivant obtient son résultat
+    assert "clé" in flights
+    release.set()
+    assert flights.do("clé", fn, timeout=5) == "récit"
+
+
+def gated_chunks(gate, produced, closed):
+    try:
+        for chunk in ("Il ", "était ", "une ", "fois"):
+            gate.wait(5)
+            produced.append(chunk)
+            yield chunk
+    finally:
+        closed.set()
+
+
+def test_stream_shared_by_subscribers():
+    flights = SingleFlight()
+    gate = threading.Event()
+    produced, closed = [], threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        return gated_chunks(gate, produced, closed)
+
+    with ThreadPoolExecutor(2) as pool:
+        first = pool.submit(lambda: "".join(flights.stream("clé", fn, timeout=5)))
+        wait_until(lambda: "clé" in flights)
+        second = pool.submit(lambda: "".join(flights.stream("clé", fn, timeout=5)))
+        gate.set()
+        assert first.result() == second.result() == "Il était une fois"
+
+    assert calls == [1]
+    assert produced == ["Il ", "était ", "une ", "fois"]
+    assert closed.is_set()
+
+
+def test_stream_late_subscriber_gets_earlier_chunks():
+    flights = SingleFlight()
+    more = threading.Event()
+
+    def fn():
+        yield "Il "
+        yield "était "
+        more.wait(5)
+        yield "une "
+        yield "fois"
+
+    first = flights.stream("clé", fn, timeout=5)
+    assert next(first) == "Il "
+    assert next(first) == "était "
+
+    late = flights.stream("clé", fn, timeout=5)
+    assert next(late) == "Il "
+    more.set()
+    assert "".join(first) == "une fois"
+    assert "".join(late) == "était une fois"
+
+
+def test_stream_closed_when_last_subscriber_leaves():
+    flights = SingleFlight()
+    more = threading.Event()
+    produced, closed = [], threading.Event()
+
+    def fn():
+        try:
+            for chunk in ("Il ", "était ", "une ", "fois"):
+                produced.append(chunk)
+                yield chunk
+                more.wait(5)
+        finally:
+            closed.set()
+
+    subscriber = flights.stream("clé", fn, timeout=5)
+    assert next(subscriber) == "Il "
+    subscriber.close()
+    more.set()
+
+    assert closed.wait(5)
+    assert produced == ["Il ", "était "]
+    wait_until(lambda: len(flights) == 0)
+
+
+def test_stream_propagates_errors():
+    flights = SingleFlight()
+
+    def fn():
+        yield "Il "
+        raise ConnectionError("coupure")
+
+    subscriber = flights.stream("clé", fn, timeout=5)
+    with pytest.raises(ConnectionError):
+        list(subscriber)
+
+
+def test_stream_timeout_between_chunks():
+    flights = SingleFlight()
+    gate = threading.Event()
+    closed = threading.Event()
+
+    with pytest.raises(TimeoutError):
+        list(flights.stream("clé", lambda: gated_chunks(gate, [], closed), timeout=0.05))
+    gate.set()
+    assert closed.wait(5)
@@ -0,0 +1,103 @@
+"""Cache de récits : politiques de service, pools bornés et évictions
+
+Usage :
+    python -m pytest tests
+"""
+import pytest
+
+import story_cache
+from story_cache import POLICY_CACHE_FIRST, POLICY_FILL, POLICY_OFF, StoryCache, make_cache_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        # Chaque lecture avance d'une seconde : les récits ont des dates distinctes
+        self.now += 1
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(story_cache.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def make_cache(tmp_path, clock):
+    def make(**options):
+        return StoryCache(str(tmp_path / "cache" / "stories.sqlite3"), **options)
+    return make
+
+
+def test_cache_key_depends_on_model_and_params():
+    key = make_cache_key("prompt", "modèle", {"temperature": 0.7, "max_tokens": 300})
+    assert key == make_cache_key("prompt", "modèle", {"max_tokens": 300, "temperature": 0.7})
+    assert key != make_cache_key("prompt", "autre", {"temperature": 0.7, "max_tokens": 300})
+    assert key != make_cache_key("prompt", "modèle", {"temperature": 0.9, "max_tokens": 300})
+
+
+def test_unknown_policy(make_cache):
+    with pytest.raises(ValueError):
+        make_cache(policy="toujours")
+
+
+def test_policy_off_never_serves(make_cache):
+    cache = make_cache(policy=POLICY_OFF)
+    cache.put("k", "récit")
+    assert cache.get("k") is None
+
+
+def test_policy_cache_first_serves_any_story(make_cache):
+    cache = make_cache(policy=POLICY_CACHE_FIRST)
+    assert cache.get("k") is None
+    cache.put("k", "récit")
+    assert cache.get("k") == "récit"
+
+
+def test_policy_fill_waits_for_a_full_pool(make_cache):
+    cache = make_cache(policy=POLICY_FILL, max_stories_per_key=3)
+    cache.put("k", "un")
+    cache.put("k", "deux")
+    assert cache.get("k") is None
+    cache.put("k", "trois")
+    assert cache.get("k") in {"un", "deux", "trois"}
+
+
+def test_pool_keeps_newest_without_duplicates(make_cache):
+    cache = make_cache(policy=POLICY_CACHE_FIRST, max_stories_per_key=2)
+    for story in ("un", "deux", "deux", "trois"):
+        cache.put("k", story)
+    assert cache.pool_size("k") == 2
+    assert {cache.get("k") for _ in range(20)} == {"deux", "trois"}
+
+
+def test_ttl_expiry(make_cache, clock):
+    cache = make_cache(policy=POLICY_CACHE_FIRST, ttl_seconds=100)
+    cache.put("ancien", "récit")
+    clock.now += 200
+    assert cache.get("ancien") is None
+    cache.put("nouveau", "récit")
+    assert cache.pool_size("ancien") == 0
+    assert cache.get("nouveau") == "récit"
+
+
+def test_lru_eviction_of_keys(make_cache):
+    cache = make_cache(policy=POLICY_CACHE_FIRST, max_keys=2)
+    cache.put("a", "récit a")
+    cache.put("b", "récit b")
+    assert cache.get("a") == "récit a"  # "a" redevient la clé la plus récente
+    cache.put("c", "récit c")
+    assert cache.get("b") is None
+    assert cache.get("a") == "récit a"
+    assert cache.get("c") == "récit c"
+
+
+def test_clear(make_cache):
+    cache = make_cache(policy=POLICY_CACHE_FIRST)
+    cache.put("k", "récit")
+    cache.clear()
+    assert cache.pool_size("k") == 0
@@ -0,0 +1,132 @@
+"""Historique SQLite : ajout, filtres, propriétaires et parcours par lots
+
+Usage :
+    python -m pytest tests
+"""
+import sqlite3
+
+import pytest
+
+from generation import EPOCHS
+from story_record import StoryRecord
+from story_store import StoryStore
+
+RENAISSANCE, REVOLUTION = list(EPOCHS)[:2]
+
+
+def make_record(epoch=RENAISSANCE, tech=50, social=50, fantasy=50, score=10.0, created_at=1000.0,
+                is_fallback=False, story="Il était une fois."):
+    analysis = {'word_count': len(story.split()), 'parallel_score': score, 'common_words': [("fois", 1)]}
+    return StoryRecord(story, epoch, tech, social, fantasy, "Court (100-200 mots)", analysis,
+                       is_fallback=is_fallback, created_at=created_at)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return StoryStore(str(tmp_path / "recits" / "stories.sqlite3"))
+
+
+def test_append_and_get(store):
+    record = make_record(created_at=1000.25)
+    story_id = store.append(record, owner="alice")
+    assert record.id == story_id
+    # Relu depuis le disque : même contenu, horodatage à la fraction près
+    fresh = StoryStore(store.path).get(story_id)
+    assert fresh.story == record.story
+    assert fresh.created_at == 1000.25
+    assert fresh.analysis['common_words'] == [("fois", 1)]
+    assert store.get(story_id + 1) is None
+
+
+def test_filters(store):
+    store.append(make_record(RENAISSANCE, tech=10, score=5.0, created_at=100.0), owner="alice")
+    store.append(make_record(REVOLUTION, tech=80, score=20.0, created_at=200.0, is_fallback=True), owner="alice")
+    store.append(make_record(REVOLUTION, tech=60, fantasy=90, score=15.0, created_at=300.0), owner="bob")
+
+    assert store.count() == 3
+    assert store.count(owner="alice") == 2
+    # None : filtre ignoré, tous les propriétaires
+    assert store.count(owner=None) == 3
+    assert store.count(epoch=REVOLUTION) == 2
+    assert store.count(is_fallback=False) == 2
+    assert store.count(since=200.0) == 2
+    assert store.count(until=200.0) == 1
+    assert store.count(min_tech=50, max_tech=70) == 1
+    assert store.count(min_fantasy=60) == 1
+    assert store.count(min_score=10.0, max_score=18.0) == 1
+    assert store.count(owner="alice", epoch=REVOLUTION, is_fallback=True) == 1
+    with pytest.raises(ValueError):
+        store.count(auteur="alice")
+
+
+def test_page_most_recent_first(store):
+    ids = [store.append(make_record(story=f"Récit {index}."), owner="alice") for index in range(5)]
+    assert [record.id for record in store.page(0, 2, owner="alice")] == ids[::-1][:2]
+    assert [record.id for record in store.page(2, 2, owner="alice")] == ids[:1]
+
+
+def test_batches_in_insertion_order(store):
+    ids = [store.append(make_record(epoch=(RENAISSANCE, REVOLUTION)[index % 2])) for index in range(5)]
+    assert [[story_id for story_id, _ in batch] for batch in store.iter_stories(2)] == [ids[:2], ids[2:4], ids[4:]]
+    batches = list(store.iter_records(2, epoch=RENAISSANCE))
+    assert [[record.id for record in batch] for batch in batches] == [[ids[0], ids[2]], [ids[4]]]
+
+
+def test_update_analyses_refreshes_cached_records(store):
+    story_id = store.append(make_record(score=1.0))
+    assert store.get(story_id).analysis['parallel_score'] == 1.0
+    store.update_analyses([(story_id, {'word_count': 4, 'parallel_score': 25.0, 'common_words': []})])
+    assert store.get(story_id).analysis['parallel_score'] == 25.0
+
+
+def test_shared_records_bounded(tmp_path):
+    store = StoryStore(str(tmp_path / "stories.sqlite3"), cache_size=2)
+    ids = [store.append(make_record()) for _ in range(3)]
+    assert list(store._records) == ids[1:]
+    # Un même récit n'existe qu'une fois en mémoire
+    assert store.get(ids[2]) is store.get(ids[2])
+
+
+def test_migrates_history_without_owner(tmp_path):
+    path = str(tmp_path / "ancien.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE stories (id INTEGER PRIMARY KEY AUTOINCREMENT, created_at REAL NOT NULL, "
+                 "epoch TEXT NOT NULL, tech_level INTEGER NOT NULL, social_change INTEGER NOT NULL, "
+                 "fantasy_elements INTEGER NOT NULL, story_length TEXT NOT NULL, "
+                 "is_fallback INTEGER NOT NULL DEFAULT 0, story TEXT NOT NULL, word_count INTEGER NOT NULL, "
+                 "parallel_score REAL NOT NULL, common_words TEXT NOT NULL)")
+    conn.execute("INSERT INTO stories (created_at, epoch, tech_level, social_change, fantasy_elements, "
+                 "story_length, story, word_count, parallel_score, common_words) "
+                 "VALUES (1, ?, 1, 1, 1, 'Court (100-200 mots)', 'Ancien récit.', 2, 0, '[]')", (RENAISSANCE,))
+    conn.commit()
+    conn.close()
+
+    store = StoryStore(path)
+    assert store.count() == 1
+    assert store.count(owner="alice") == 0
+    assert store.page(0, 1)[0].generation_time is None
+
+
+@pytest.mark.parametrize("order, expected", [
+    ("recent", [2, 1, 0]),
+    ("oldest", [0, 1, 2]),
+    ("divergence_desc", [1, 2, 0]),
+    ("divergence_asc", [0, 2, 1]),
+    ("tech", [2, 0, 1]),
+])
+def test_summaries_order(store, order, expected):
+    params = [(50, 5.0), (10, 30.0), (90, 15.0)]
+    ids = [store.append(make_record(tech=tech, score=score)) for tech, score in params]
+    summaries = store.summaries(0, 10, order)
+    assert [summary.id for summary in summaries] == [ids[index] for index in expected]
+    assert not hasattr(summaries[0], "story")
+
+
+def test_summaries_filtered_page(store):
+    for index in range(5):
+        store.append(make_record(tech=index * 20), owner="alice")
+    store.append(make_record(tech=100), owner="bob")
+    summaries = store.summaries(1, 2, "tech", owner="alice", min_tech=20)
+    assert [summary.tech_level for summary in summaries] == [40, 20]
+    with pytest.raises(ValueError):
+        store.summaries(order="auteur")
@@ -0,0 +1,37 @@
+"""Indicateurs de divergence : toutes les formes fléchies comptent
+
+Usage :
+    python -m pytest tests
+"""
+import pytest
+
+from text_analysis import PARALLEL_STEMS, analyze, divergence_score, stem, word_frequencies
+
+
+@pytest.mark.parametrize("word", [
+    "alternative", "alternatifs", "différentes", "inhabituelle", "étranges", "mystérieuse",
+    "inexpliquées", "nouveau", "nouveaux", "nouvel", "nouvelle", "nouvelles",
+    "révolutionnaires", "impossibles", "magiques",
+])
+def test_inflected_indicator_matches(word):
+    assert stem(word) in PARALLEL_STEMS
+
+
+@pytest.mark.parametrize("word", ["ville", "maison", "nous", "ordinaire", "nouer"])
+def test_plain_word_does_not_match(word):
+    assert stem(word) not in PARALLEL_STEMS
+
+
+def test_divergence_score_counts_feminine_forms():
+    frequencies = word_frequencies("Une nouvelle ville et de nouvelles routes")
+    assert divergence_score(frequencies) == pytest.approx(2 / 7 * 100)
+
+
+def test_divergence_score_empty_text():
+    assert divergence_score(word_frequencies("")) == 0
+
+
+def test_analyze_skips_stopwords():
+    analysis = analyze("La ville, la ville et la mer.")
+    assert analysis["word_count"] == 7
+    assert analysis["common_words"] == [("ville", 2), ("mer", 1)]
@@ -0,0 +1,100 @@
+"""Réserve de récits pré-générés : remplissage, priorités, budget et péremption
+
+Usage :
+    python -m pytest tests
+"""
+import threading
+import time
+from collections import deque
+
+import pytest
+
+import warm_pool
+from warm_pool import WarmPool
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition jamais atteinte"
+        time.sleep(0.005)
+
+
+class Generator:
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, key):
+        with self.lock:
+            self.calls.append(key)
+            return f"récit {key} n°{len(self.calls)}"
+
+
+@pytest.fixture
+def pools():
+    started = []
+    yield started
+    for pool in started:
+        pool.stop()
+
+
+def test_fills_seed_keys_and_refills_after_take(pools):
+    generate = Generator()
+    pool = WarmPool(generate, stories_per_key=2, budget_per_hour=3600 * 100, seed_keys=["a", "b"])
+    pools.append(pool.start())
+    wait_until(lambda: pool.size() == 4)
+
+    story = pool.take("a")
+    assert story.startswith("récit a")
+    wait_until(lambda: pool.size("a") == 2)
+    assert generate.calls.count("a") == 3
+
+
+def test_miss_on_unknown_key():
+    pool = WarmPool(Generator())
+    assert pool.take("inconnu") is None
+
+
+def test_priority_follows_demand():
+    pool = WarmPool(Generator(), stories_per_key=1, max_keys=2, seed_keys=["a", "b"])
+    assert pool._next_key() == "a"
+    for _ in range(3):
+        pool.take("c")
+    assert pool._next_key() == "c"
+    # Seuls les max_keys réglages les plus demandés gardent une réserve
+    assert set(pool._pools) == {"c", "a"}
+
+
+def test_budget_limits_pregeneration(pools):
+    generate = Generator()
+    pool = WarmPool(generate, stories_per_key=2, budget_per_hour=1, seed_keys=["a", "b"])
+    pools.append(pool.start())
+    # Réserve initiale du seau : stories_per_key générations, puis un jeton par heure
+    wait_until(lambda: pool.size() == 2)
+    time.sleep(0.1)
+    assert len(generate.calls) == 2
+
+
+def test_failed_generation_waits_before_retrying(pools):
+    calls = []
+
+    def generate(key):
+        calls.append(key)
+        raise RuntimeError("quota")
+
+    pool = WarmPool(generate, budget_per_hour=3600 * 100, retry_interval=60, seed_keys=["a"])
+    pools.append(pool.start())
+    wait_until(lambda: calls)
+    time.sleep(0.1)
+    assert calls == ["a"]
+    assert pool.size() == 0
+
+
+def test_expired_stories_are_not_served(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(warm_pool.time, "time", lambda: now[0])
+    pool = WarmPool(Generator(), max_age=60)
+    pool._pools["a"] = deque([(now[0], "ancien")])
+    now[0] += 120
+    assert pool.take("a") is None
@@ -0,0 +1,150 @@
+"""Analyse de texte : une seule tokenisation par récit
+
+Le texte est découpé une fois en table de fréquences (mots en minuscules).
+Cette table alimente le comptage des mots, les mots les plus fréquents (hors
+mots vides), le score de divergence et le nuage de mots
+(WordCloud.generate_from_frequencies). Les indicateurs de divergence sont
+comparés par racine : « étranges » ou « mystérieuse » comptent comme
+« étrange » et « mystérieux ».
+
+Recalculer les analyses d'un historique existant :
+    python text_analysis.py --store recits/stories.sqlite3
+"""
+import argparse
+import functools
+import re
+import sys
+from collections import Counter
+
+WORD_PATTERN = re.compile(r'\b\w+\b')
+
+# Mots vides du français, écartés des mots fréquents et du nuage de mots
+STOPWORDS = frozenset("""
+a à ai aie aient aies ait alors as au aucun aucune aussi autre autres aux avait avaient avais avant avec
+avez aviez avions avoir avons ayant c ça car ce ceci cela celle celles celui ces cet cette ceux chaque
+chez ci comme comment d dans de des deux donc dont du elle elles en encore entre es est et étaient étais
+était étant été êtes étiez étions être eu eue eues eurent eus eut eux fait faire fois font furent fut
+ici il ils j je jusqu l la là le les leur leurs lui m ma mais me même mêmes mes moi mon n ne ni nos
+notre nous on ont ou où par parce pas peu peut plus pour pourquoi qu quand que quel quelle quelles
+quels qui quoi s sa sans se sera serait ses si sien son sont sous sur t ta te tes toi ton tous tout
+toute toutes très tu un une vers voici voilà vos votre vous y
+""".split())
+
+# Indicateurs d'éléments "parallèles" vs réalistes (toutes leurs formes fléchies comptent).
+# « nouvelle » n'a pas la racine de « nouveau » : elle est listée à part (nouvel, nouvelles).
+PARALLEL_INDICATORS = frozenset([
+    'alternative', 'différent', 'inhabituel', 'étrange', 'mystérieux',
+    'inexpliqué', 'nouveau', 'nouvelle', 'révolutionnaire', 'impossible', 'magique'
+])
+
+# Terminaisons retirées par la racinisation, les plus longues d'abord
+_SUFFIXES = (
+    "issements", "issement", "ements", "ement", "euses", "euse", "eux", "iennes", "ienne", "iens", "ien",
+    "elles", "elle", "els", "el", "ives", "ive", "ifs", "if", "ées", "ée", "és", "é", "es", "e", "s", "x",
+)
+_MIN_STEM = 3
+
+# Mots fréquents retenus dans l'analyse
+COMMON_WORDS = 10
+
+
+@functools.lru_cache(maxsize=65536)
+def stem(word):
+    """Racine approximative d'un mot français en minuscules (retrait d'une terminaison)"""
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= _MIN_STEM:
+            return word[:-len(suffix)]
+    return word
+
+
+PARALLEL_STEMS = frozenset(stem(word) for word in PARALLEL_INDICATORS)
+
+
+def count_words(text):
+    """Nombre de mots du texte"""
+    return len(WORD_PATTERN.findall(text))
+
+
+def word_frequencies(text):
+    """Table de fréquences des mots du texte, en une passe"""
+    return Counter(WORD_PATTERN.findall(text.lower()))
+
+
+@functools.lru_cache(maxsize=128)
+def frequency_table(text):
+    """Table de fréquences mémorisée : l'analyse et le nuage de mots d'un même récit la partagent
+
+    La table renvoyée est partagée : elle ne doit pas être modifiée.
+    """
+    return word_frequencies(text)
+
+
+def content_frequencies(frequencies):
+    """Fréquences des mots porteurs de sens : sans mots vides ni nombres"""
+    return {word: count for word, count in frequencies.items()
+            if word not in STOPWORDS and not word.isdigit() and len(word) > 1}
+
+
+def divergence_score(frequencies, word_count=None):
+    """Part (%) des mots qui sont des indicateurs de divergence, toutes formes fléchies comprises"""
+    if word_count is None:
+        word_count = sum(frequencies.values())
+    if not word_count:
+        return 0
+    matches = sum(count for word, count in frequencies.items() if stem(word) in PARALLEL_STEMS)
+    return (matches / word_count) * 100
+
+
+def summarize(frequencies):
+    """Analyse d'un texte à partir de sa table de fréquences"""
+    word_count = sum(frequencies.values())
+    content = Counter(content_frequencies(frequencies))
+    return {
+        'word_count': word_count,
+        'common_words': content.most_common(COMMON_WORDS),
+        'parallel_score': divergence_score(frequencies, word_count)
+    }
+
+
+def analyze(text):
+    """Analyse d'un récit : nombre de mots, mots fréquents et score de divergence"""
+    return summarize(frequency_table(text))
+
+
+def analyze_many(texts):
+    """Analyse de plusieurs textes, sans passer par la table mémorisée des récits affichés
+
+    Les racines déjà calculées sont réutilisées d'un texte à l'autre : un mot
+    n'est raciné qu'une fois par processus.
+    """
+    return [summarize(word_frequencies(text)) for text in texts]
+
+
+def rescore_store(store, batch_size=500, log=print):
+    """Recalcule l'analyse de tous les récits d'un historique, par lots"""
+    total = 0
+    for batch in store.iter_stories(batch_size):
+        analyses = analyze_many(story for _, story in batch)
+        store.update_analyses((story_id, analysis) for (story_id, _), analysis in zip(batch, analyses))
+        total += len(batch)
+        log(f"{total} récits analysés")
+    return total
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Recalcule l'analyse des récits d'un historique")
+    parser.add_argument("--store", required=True, help="historique SQLite (story_store.py)")
+    parser.add_argument("--batch-size", type=int, default=500, help="récits analysés par lot")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from story_store import StoryStore
+
+    args = parse_args(argv)
+    rescore_store(StoryStore(args.store), args.batch_size)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+import re
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+
+# Débuts de phrase signalant le démarrage du récit français dans un bloc <think>
+FRENCH_START_PREFIXES = ('À ', 'En ', 'Dans ', 'Le ', 'La ', 'Les ', 'Un ', 'Une ')
+
+# Phrases d'analyse anglaise qui invalident un début de récit
+ENGLISH_START_MARKERS = ('in florence', 'check the word', 'technical aspect', 'that seems', 'need to make')
+
+# Phrases qui marquent le retour à l'analyse anglaise (fin du récit)
+ANALYSIS_STOP_MARKERS = ('check the word', 'word count', 'technical aspect', 'that seems', 'need to make', 'fits the time')
+
+# Mots indiquant une ligne de narration française
+FRENCH_MARKERS_OUTSIDE = ('dans', 'était', 'sur', 'avec', 'pour', 'une', 'le', 'la', 'les', 'des', 'du', 'de')
+FRENCH_MARKERS = FRENCH_MARKERS_OUTSIDE + ('mais', 'alors')
+
+# Tournures de raisonnement anglais à exclure
+ENGLISH_REASONING_MARKERS = ('i need', 'i should', 'let me', 'maybe', 'perhaps', 'i think', 'okay')
+
+
+def _phrase_matcher(phrases):
+    # Une alternative précompilée par ensemble de phrases : un seul search() par ligne
+    return re.compile('|'.join(re.escape(phrase) for phrase in phrases))
+
+
+_START_MATCHER = _phrase_matcher(ENGLISH_START_MARKERS)
+_STOP_MATCHER = _phrase_matcher(ANALYSIS_STOP_MARKERS)
+_FRENCH_MATCHER = _phrase_matcher(FRENCH_MARKERS)
+_FRENCH_OUTSIDE_MATCHER = _phrase_matcher(FRENCH_MARKERS_OUTSIDE)
+_ENGLISH_MATCHER = _phrase_matcher(ENGLISH_REASONING_MARKERS)
+_MULTIPLE_SPACES = re.compile(r'  +')
+
+
+def split_thinking(text):
+    """Découpe le texte en une passe : contenus des blocs <think> fermés, bloc ouvert final, texte extérieur"""
+    closed_blocks = []
+    outside_parts = []
+    open_block = None
+    position = 0
+
+    while True:
+        start = text.find(THINK_OPEN, position)
+        if start == -1:
+            outside_parts.append(text[position:])
+            break
+        outside_parts.append(text[position:start])
+        end = text.find(THINK_CLOSE, start + len(THINK_OPEN))
+        if end == -1:
+            # Balise jamais fermée : tout le reste du texte est du raisonnement
+            open_block = text[start + len(THINK_OPEN):]
+            break
+        closed_blocks.append(text[start + len(THINK_OPEN):end])
+        position = end + len(THINK_CLOSE)
+
+    outside = ''.join(outside_parts)
+    # Le retrait des blocs peut recoller une balise ouvrante : tout ce qui suit est ignoré
+    cut = outside.find(THINK_OPEN)
+    if cut != -1:
+        outside = outside[:cut]
+
+    return closed_blocks, open_block, outside
+
+
+def _extract_from_think(block, story_parts):
+    french_started = False
+
+    for line in block.split('\n'):
+        line = line.strip()
+
+        # Détecter le début du récit français (souvent après des analyses en anglais)
+        if not french_started:
+            if (len(line) > 20 and line.startswith(FRENCH_START_PREFIXES)
+                    and not _START_MATCHER.search(line.lower())):
+                french_started = True
+                story_parts.append(line)
+            continue
+
+        lowered = line.lower()
+        # Arrêter si on retombe sur de l'anglais d'analyse
+        if _STOP_MATCHER.search(lowered):
+            break
+
+        # Continuer si c'est du français narratif
+        if (len(line) > 10 and _FRENCH_MATCHER.search(lowered)
+                and not _ENGLISH_MATCHER.search(lowered)):
+            story_parts.append(line)
+        elif line == '':
+            story_parts.append('')
+
+
+def clean_thinking_tokens(text):
+    """Extrait le contenu narratif français des thinking tokens"""
+    if not text:
+        return text
+
+    closed_blocks, open_block, outside = split_thinking(text)
+
+    # Sans bloc fermé, on analyse le bloc resté ouvert
+    think_blocks = closed_blocks if closed_blocks else ([open_block] if open_block is not None else [])
+
+    story_parts = []
+    for block in think_blocks:
+        _extract_from_think(block, story_parts)
+
+    # Aussi chercher du contenu français en dehors des balises
+    for line in outside.split('\n'):
+        line = line.strip()
+        if len(line) > 30:
+            lowered = line.lower()
+            if _FRENCH_OUTSIDE_MATCHER.search(lowered) and not _ENGLISH_MATCHER.search(lowered):
+                story_parts.append(line)
+
+    # Assembler le récit
+    if story_parts:
+        return _MULTIPLE_SPACES.sub(' ', '\n\n'.join(story_parts)).strip()
+
+    # Si rien trouvé, on garde le texte hors balises
+    return outside.strip()
+
+
+class ThinkingStreamFilter:
+    """Retire au fil de l'eau les blocs <think> d'un flux de fragments"""
+
+    OPEN_TAG = THINK_OPEN
+    CLOSE_TAG = THINK_CLOSE
+
+    def __init__(self):
+        self.raw_parts = []
+        self.visible = ""
+        self.in_think = False
+        self._pending = ""
+
+    @staticmethod
+    def _partial_tag_length(text, tag):
+        # Longueur du début de balise éventuellement coupé en fin de fragment
+        for size in range(min(len(tag) - 1, len(text)), 0, -1):
+            if text.endswith(tag[:size]):
+                return size
+        return 0
+
+    def feed(self, chunk):
+        """Ajoute un fragment et renvoie le texte narratif nouvellement visible"""
+        if not chunk:
+            return ""
+        self.raw_parts.append(chunk)
+        self._pending += chunk
+        emitted = []
+
+        while self._pending:
+            if self.in_think:
+                end = self._pending.find(self.CLOSE_TAG)
+                if end == -1:
+                    # Le contenu du raisonnement n'est jamais affiché
+                    keep = self._partial_tag_length(self._pending, self.CLOSE_TAG)
+                    self._pending = self._pending[len(self._pending) - keep:] if keep else ""
+                    break
+                self._pending = self._pending[end + len(self.CLOSE_TAG):]
+                self.in_think = False
+            else:
+                start = self._pending.find(self.OPEN_TAG)
+                if start == -1:
+                    keep = self._partial_tag_length(self._pending, self.OPEN_TAG)
+                    cut = len(self._pending) - keep
+                    emitted.append(self._pending[:cut])
+                    self._pending = self._pending[cut:]
+                    break
+                emitted.append(self._pending[:start])
+                self._pending = self._pending[start + len(self.OPEN_TAG):]
+                self.in_think = True
+
+        new_text = "".join(emitted)
+        if not self.visible:
+            new_text = new_text.lstrip()
+        self.visible += new_text
+        return new_text
+
+    @property
+    def raw_text(self):
+        return "".join(self.raw_parts)
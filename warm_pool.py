@@ -0,0 +1,138 @@
+"""Réserve de récits pré-générés pour les réglages les plus demandés
+
+generate_prompt ramène les curseurs à quelques paliers : les combinaisons
+populaires sont donc connues d'avance. Un thread d'arrière-plan garde pour
+chacune quelques récits frais, consommés par les clics et reconstitués au fur
+et à mesure, dans un budget horaire de générations. Les réglages sont servis
+par ordre de fréquence des demandes, avec décroissance exponentielle.
+"""
+import logging
+import math
+import threading
+import time
+from collections import deque
+
+from admission import TokenBucket
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+
+class WarmPool:
+    """Récits prêts à servir, par clé de réglage, reconstitués par un thread d'arrière-plan
+
+    generate(key) renvoie un récit, ou None si la génération n'a pas abouti
+    (quota, backend indisponible) : le thread patiente alors avant de réessayer.
+    """
+
+    def __init__(self, generate, stories_per_key=2, max_keys=8, budget_per_hour=60, max_age=24 * 3600,
+                 half_life=3600.0, retry_interval=30.0, seed_keys=()):
+        self.generate = generate
+        self.stories_per_key = stories_per_key
+        self.max_keys = max_keys
+        self.max_age = max_age
+        self.half_life = half_life
+        self.retry_interval = retry_interval
+        self.budget = TokenBucket(budget_per_hour / 3600.0, max(1, stories_per_key))
+        self._pools = {}
+        self._scores = {}
+        self._updated = time.time()
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = None
+
+        # Réglages par défaut de l'interface : priorité initiale décroissante
+        for rank, key in enumerate(seed_keys):
+            self._scores[key] = 1.0 / (rank + 2)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="warm-pool", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    def _decay(self, now):
+        # Décroissance des fréquences : les goûts du moment l'emportent sur l'historique
+        factor = math.pow(0.5, (now - self._updated) / self.half_life)
+        if factor < 1.0:
+            for key in self._scores:
+                self._scores[key] *= factor
+        self._updated = now
+
+    def take(self, key):
+        """Enregistre la demande et renvoie un récit de la réserve, ou None"""
+        now = time.time()
+        with self._condition:
+            self._decay(now)
+            self._scores[key] = self._scores.get(key, 0.0) + 1.0
+
+            pool = self._pools.get(key)
+            story = None
+            while pool:
+                created_at, candidate = pool.popleft()
+                if now - created_at <= self.max_age:
+                    story = candidate
+                    break
+            # Réveille le thread : un récit à remplacer ou une nouvelle priorité
+            self._condition.notify_all()
+
+        REGISTRY.inc("warm_pool_hits_total" if story is not None else "warm_pool_misses_total")
+        return story
+
+    def size(self, key=None):
+        with self._condition:
+            if key is not None:
+                return len(self._pools.get(key, ()))
+            return sum(len(pool) for pool in self._pools.values())
+
+    def _next_key(self):
+        """Réglage le plus demandé dont la réserve n'est pas pleine"""
+        popular = sorted(self._scores, key=self._scores.get, reverse=True)[:self.max_keys]
+
+        # Réserves des réglages sortis du classement : libérées
+        for key in list(self._pools):
+            if key not in popular:
+                del self._pools[key]
+
+        now = time.time()
+        for key in popular:
+            pool = self._pools.setdefault(key, deque())
+            while pool and now - pool[0][0] > self.max_age:
+                pool.popleft()
+            if len(pool) < self.stories_per_key:
+                return key
+        return None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if self._stopped:
+                    return
+                key = self._next_key()
+                if key is None:
+                    self._condition.wait()
+                    continue
+                if not self.budget.try_take():
+                    # Budget horaire épuisé : attente du prochain jeton
+                    self._condition.wait(self.budget.delay())
+                    continue
+
+            try:
+                with REGISTRY.timer("pregeneration"):
+                    story = self.generate(key)
+            except Exception as e:
+                logger.warning(f"⚠️ Pré-génération échouée: {str(e)}")
+                story = None
+
+            with self._condition:
+                if story:
+                    pool = self._pools.get(key)
+                    if pool is not None and len(pool) < self.stories_per_key:
+                        pool.append((time.time(), story))
+                        REGISTRY.inc("pregenerated_stories_total")
+                    continue
+                self._condition.wait(self.retry_interval)